@@ -0,0 +1,347 @@
+"""Command line runner for the complete analysis pipeline.
+
+```
+avoidable-admissions run --dataset admitted --input admitted_care.csv --output ../data/processed/admitted_care
+```
+
+The extract is read in chunks and each chunk is harmonised, validated, used to build
+features, validated again and written to the output directory. Chunks are processed
+in parallel by a pool of worker processes. A summary of time and memory used by each
+stage is printed at the end.
+
+Output directory layout:
+
+- `features/part-NNNNN.parquet`: Features that passed both validation steps
+- `errors/episodes/part-NNNNN.parquet`: Rows that failed the first validation step, see
+    [avoidable_admissions.data.error_sink][]
+- `errors/features/part-NNNNN.parquet`: Rows that failed validation of the features
+
+Writing Parquet requires `pyarrow`. Use `--format csv` otherwise.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional
+
+import pandas as pd
+
+from avoidable_admissions.data import error_sink, harmonise, make_dataset
+from avoidable_admissions.data.validate import (
+    AdmittedCareEpisodeSchema,
+    AdmittedCareFeatureSchema,
+    EmergencyCareEpisodeSchema,
+    EmergencyCareFeatureSchema,
+    validate_dataframe,
+)
+from avoidable_admissions.features import build_features
+
+datasets = {
+    "admitted": (
+        AdmittedCareEpisodeSchema,
+        AdmittedCareFeatureSchema,
+        build_features.build_admitted_care_features,
+    ),
+    "emergency": (
+        EmergencyCareEpisodeSchema,
+        EmergencyCareFeatureSchema,
+        build_features.build_emergency_care_features,
+    ),
+}
+
+stages = ["read", "harmonise", "validate", "build", "validate_features", "write"]
+
+
+def _memory_mb() -> float:
+    # Resident memory of this process. Peak resident memory if psutil is not installed.
+
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Reported in bytes on macOS and kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+@contextmanager
+def _stage(timings: List[dict], stage: str, chunk: int):
+    start = time.perf_counter()
+    yield
+    timings.append(
+        {
+            "stage": stage,
+            "chunk": chunk,
+            "seconds": time.perf_counter() - start,
+            "memory_mb": _memory_mb(),
+        }
+    )
+
+
+def _write(df: pd.DataFrame, path: str, format: str) -> None:
+    if format == "parquet":
+        df.to_parquet(path + ".parquet", index=False)
+    else:
+        df.to_csv(path + ".csv", index=False)
+
+
+def _process_chunk(chunk: int, df: pd.DataFrame, options: dict) -> dict:
+    # Every stage after reading for a single chunk. Runs in a worker process.
+
+    episode_schema, feature_schema, build = datasets[options["dataset"]]
+    validate_kwargs = options["validate_kwargs"]
+    output = options["output"]
+
+    timings = []
+
+    with _stage(timings, "harmonise", chunk):
+        df, changes = harmonise._apply_plan(
+            df, options["plan"], options["date_format"], options["dayfirst"]
+        )
+        harmonise._print_errors(changes)
+        df = make_dataset._add_visit_id(df, episode_schema, df.index.start)
+
+    # Failure cases of each step have different columns so are written to separate files
+    errors_path = {
+        step: os.path.join(
+            output, "errors", step, f"part-{chunk:05d}.{options['format']}"
+        )
+        for step in ["episodes", "features"]
+    }
+
+    with error_sink.error_sink(errors_path["episodes"]) as sink:
+        with _stage(timings, "validate", chunk):
+            good, _ = validate_dataframe(
+                df, episode_schema, error_sink=sink, **validate_kwargs
+            )
+
+    with _stage(timings, "build", chunk):
+        features = build(good)
+
+    with error_sink.error_sink(errors_path["features"]) as sink_f:
+        with _stage(timings, "validate_features", chunk):
+            good_f, _ = validate_dataframe(
+                features,
+                feature_schema,
+                error_sink=sink_f,
+                validation_token=good.attrs["validation_token"],
+                **validate_kwargs,
+            )
+
+    with _stage(timings, "write", chunk):
+        _write(
+            good_f,
+            os.path.join(output, "features", f"part-{chunk:05d}"),
+            options["format"],
+        )
+
+    return {
+        "timings": timings,
+        "n_rows": len(df),
+        "n_good": len(good_f),
+        "errors": pd.concat([sink.summary(), sink_f.summary()], ignore_index=True),
+    }
+
+
+def _summary(results: List[dict], read_timings: List[dict], wall: float) -> str:
+    timings = pd.DataFrame(read_timings + [t for r in results for t in r["timings"]])
+
+    by_stage = (
+        timings.groupby("stage")
+        .agg(seconds=("seconds", "sum"), max_memory_mb=("memory_mb", "max"))
+        .reindex(stages)
+        .dropna(how="all")
+    )
+
+    n_rows = sum(r["n_rows"] for r in results)
+    n_good = sum(r["n_good"] for r in results)
+
+    errors = pd.concat([r["errors"] for r in results], ignore_index=True)
+    if not errors.empty:
+        errors = (
+            errors.groupby(["schema_context", "column", "check"])
+            .n_failure_cases.sum()
+            .reset_index()
+        )
+
+    lines = [
+        "",
+        f"Rows read: {n_rows}. Rows written: {n_good}. Rows failed: {n_rows - n_good}.",
+        f"Chunks: {len(results)}. Elapsed time: {wall:.1f} seconds.",
+        "",
+        "Time and memory by stage. Seconds are summed over all chunks and workers.",
+        by_stage.round(2).to_string(),
+    ]
+
+    if not errors.empty:
+        lines += ["", "Failure cases", errors.to_string(index=False)]
+
+    return "\n".join(lines)
+
+
+def run(
+    dataset: str,
+    input: str,
+    output: str,
+    chunksize: int = 100_000,
+    workers: int = 1,
+    format: str = "parquet",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    date_format: Optional[str] = None,
+    dayfirst: bool = False,
+) -> str:
+    """Run the complete pipeline on an extract, streaming it in chunks.
+
+    Args:
+        dataset (str): `"admitted"` or `"emergency"`
+        input (str): CSV or Parquet extract
+        output (str): Output directory. See module documentation for the layout.
+        chunksize (int, optional): Rows per chunk. Defaults to 100,000.
+        workers (int, optional): Number of worker processes. Defaults to 1 which
+            processes chunks in the current process.
+        format (str, optional): `"parquet"` or `"csv"`. Defaults to `"parquet"`.
+        start_date (datetime, optional): Study start date (inclusive)
+        end_date (datetime, optional): Study end date (excluded)
+        date_format (str, optional): `strftime` format of date columns
+        dayfirst (bool, optional): Passed to `pd.to_datetime` if `date_format` is not set.
+
+    Returns:
+        str: Summary of rows, time and memory by stage, and failure cases
+    """
+
+    start = time.perf_counter()
+
+    episode_schema = datasets[dataset][0]
+
+    columns = make_dataset._read_columns(input)
+    plan = harmonise._plan(episode_schema, columns)
+
+    skipped = [c for c in columns if c not in plan]
+    if skipped:
+        print("Columns not in schema will not be read:", ", ".join(skipped))
+
+    for directory in [["features"], ["errors", "episodes"], ["errors", "features"]]:
+        os.makedirs(os.path.join(output, *directory), exist_ok=True)
+
+    validate_kwargs = {}
+    if start_date is not None:
+        validate_kwargs["start_date"] = start_date
+    if end_date is not None:
+        validate_kwargs["end_date"] = end_date
+
+    options = {
+        "dataset": dataset,
+        "plan": plan,
+        "output": output,
+        "format": format,
+        "date_format": date_format,
+        "dayfirst": dayfirst,
+        "validate_kwargs": validate_kwargs,
+    }
+
+    chunks = make_dataset._iter_raw_chunks(input, plan, chunksize)
+
+    read_timings = []
+    results = []
+
+    def read_chunks():
+        chunk = 0
+        while True:
+            with _stage(read_timings, "read", chunk):
+                df = next(chunks, None)
+            if df is None:
+                return
+            yield chunk, df
+            chunk += 1
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for chunk, df in read_chunks():
+                pending.append(pool.submit(_process_chunk, chunk, df, options))
+
+                # Read ahead no more than two chunks per worker to bound memory
+                if len(pending) >= 2 * workers:
+                    results.append(pending.pop(0).result())
+
+            results.extend(future.result() for future in pending)
+    else:
+        results = [_process_chunk(chunk, df, options) for chunk, df in read_chunks()]
+
+    return _summary(results, read_timings, time.perf_counter() - start)
+
+
+def _date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="avoidable-admissions",
+        description="HDRUK Collaboration on Avoidable Admissions in the NHS",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser(
+        "run",
+        help="Read, harmonise, validate, build features, validate and write an extract",
+    )
+    run_parser.add_argument("--dataset", choices=list(datasets), required=True)
+    run_parser.add_argument(
+        "--input", required=True, help="CSV or Parquet (.parquet) extract"
+    )
+    run_parser.add_argument("--output", required=True, help="Output directory")
+    run_parser.add_argument("--chunksize", type=int, default=100_000)
+    run_parser.add_argument(
+        "--workers", type=int, default=1, help="Number of worker processes"
+    )
+    run_parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    run_parser.add_argument(
+        "--start-date", type=_date, help="Study start date YYYY-MM-DD (inclusive)"
+    )
+    run_parser.add_argument(
+        "--end-date", type=_date, help="Study end date YYYY-MM-DD (excluded)"
+    )
+    run_parser.add_argument(
+        "--date-format", help="strftime format of dates in the extract e.g. %%d/%%m/%%Y"
+    )
+    run_parser.add_argument(
+        "--dayfirst", action="store_true", help="Parse dates as day first"
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        summary = run(
+            dataset=args.dataset,
+            input=args.input,
+            output=args.output,
+            chunksize=args.chunksize,
+            workers=args.workers,
+            format=args.format,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            date_format=args.date_format,
+            dayfirst=args.dayfirst,
+        )
+        print(summary)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
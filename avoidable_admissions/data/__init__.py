@@ -1,3 +1,29 @@
-from avoidable_admissions.data import make_dataset, nhsdd, validate
+from avoidable_admissions.data import (
+    batch,
+    error_sink,
+    harmonise,
+    icd10,
+    make_dataset,
+    nhsdd,
+    opcs4,
+    pseudonymise,
+    snomed_hierarchy,
+    snomed_refsets,
+    synthetic,
+    validate,
+)
 
-__all__ = ["make_dataset", "nhsdd", "validate"]
+__all__ = [
+    "batch",
+    "error_sink",
+    "harmonise",
+    "icd10",
+    "make_dataset",
+    "nhsdd",
+    "opcs4",
+    "pseudonymise",
+    "snomed_hierarchy",
+    "snomed_refsets",
+    "synthetic",
+    "validate",
+]
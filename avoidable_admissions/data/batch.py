@@ -0,0 +1,376 @@
+"""Validate extracts from many sites in one run.
+
+The lead site receives an admitted care and an emergency care extract from every
+participating trust. `validate_sites` reads and validates each extract against
+the schema for its dataset in a pool of worker processes, writes the _good_ and _bad_
+rows of each site to its own directory, and returns a single summary of pass rates
+and failure cases by `procodet` across all sites.
+
+Output directory layout:
+
+- `<site>/<dataset>/good.parquet`: Rows that passed validation
+- `<site>/<dataset>/bad.parquet`: Failure cases, see [avoidable_admissions.data.error_sink][]
+- `summary.csv`: Rows read and passed, and pass rate by site and `procodet`
+- `checks.csv`: Failure cases by site, `procodet`, column and check
+
+Writing Parquet requires `pyarrow`. Use `format="csv"` otherwise.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional, Tuple, Union
+
+import pandas as pd
+
+from avoidable_admissions.data import error_sink, make_dataset
+from avoidable_admissions.data.validate import (
+    AdmittedCareEpisodeSchema,
+    EmergencyCareEpisodeSchema,
+    validate_dataframe,
+)
+
+schemas = {
+    "admitted": AdmittedCareEpisodeSchema,
+    "emergency": EmergencyCareEpisodeSchema,
+}
+
+extract_suffixes = {".csv", ".parquet", ".pq"}
+
+summary_columns = [
+    "site",
+    "dataset",
+    "procodet",
+    "n_rows",
+    "n_passed",
+    "n_failed",
+    "pass_rate",
+    "seconds",
+    "error",
+]
+
+check_columns = [
+    "site",
+    "dataset",
+    "procodet",
+    "schema_context",
+    "column",
+    "check",
+    "n_failure_cases",
+]
+
+
+def _infer_dataset(name: str) -> Optional[str]:
+    # Dataset from a file name such as trust_a_admitted_care.csv
+
+    name = name.lower()
+    matches = [dataset for dataset in schemas if dataset in name]
+
+    return matches[0] if len(matches) == 1 else None
+
+
+def read_manifest(
+    source: Union[str, pd.DataFrame], dataset: Optional[str] = None
+) -> pd.DataFrame:
+    """List the extracts to validate with the options for each site.
+
+    The manifest has one row per extract with the columns:
+
+    - `site`: Name of the site, used as the output directory name e.g. `procodet`
+    - `path`: CSV or Parquet extract. Relative paths are relative to the manifest file.
+    - `dataset`: `"admitted"` or `"emergency"`
+    - `start_date`, `end_date` (optional): Study dates for the site
+    - `date_format`, `dayfirst` (optional): How dates are written in the extract
+
+    Args:
+        source (str | pd.DataFrame): Manifest CSV file, manifest dataframe, or a
+            directory of extracts. A directory may hold one subdirectory per site,
+            or extracts named after their site. The dataset is taken from the file
+            name if it contains `admitted` or `emergency`.
+        dataset (str, optional): Dataset of extracts that do not specify one
+
+    Returns:
+        pd.DataFrame: Manifest with one row per extract
+    """
+
+    if isinstance(source, pd.DataFrame):
+        manifest = source.copy()
+
+    elif os.path.isdir(source):
+        records = []
+        for entry in sorted(os.listdir(source)):
+            path = os.path.join(source, entry)
+            if os.path.isdir(path):
+                # One subdirectory per site
+                files = [os.path.join(path, f) for f in sorted(os.listdir(path))]
+                site = entry
+            else:
+                files = [path]
+                site = None
+
+            for f in files:
+                name = os.path.basename(f)
+                stem, suffix = os.path.splitext(name)
+                if os.path.isfile(f) and suffix.lower() in extract_suffixes:
+                    records.append(
+                        {
+                            "site": site or stem,
+                            "path": f,
+                            "dataset": _infer_dataset(name),
+                        }
+                    )
+
+        manifest = pd.DataFrame(records, columns=["site", "path", "dataset"])
+
+    else:
+        manifest = pd.read_csv(source, dtype={"site": str, "path": str})
+        root = os.path.dirname(os.path.abspath(source))
+        manifest["path"] = [
+            p if os.path.isabs(p) else os.path.join(root, p) for p in manifest.path
+        ]
+
+    missing = {"site", "path"} - set(manifest.columns)
+    if missing:
+        raise ValueError(f"Manifest is missing columns: {sorted(missing)}")
+
+    if "dataset" not in manifest.columns:
+        manifest["dataset"] = None
+    if dataset is not None:
+        manifest["dataset"] = manifest["dataset"].fillna(dataset)
+
+    unknown = manifest[~manifest.dataset.isin(list(schemas))]
+    if not unknown.empty:
+        raise ValueError(
+            f"Unknown dataset for sites {unknown.site.tolist()}. "
+            f"Set `dataset` to one of {list(schemas)}."
+        )
+
+    if manifest.duplicated(["site", "dataset"]).any():
+        raise ValueError("Each site may have only one extract per dataset.")
+
+    for col in ["start_date", "end_date"]:
+        if col in manifest.columns:
+            manifest[col] = pd.to_datetime(manifest[col])
+
+    return manifest.reset_index(drop=True)
+
+
+def _site_options(row: dict, **defaults) -> dict:
+    # Options in the manifest take precedence over those passed to validate_sites
+
+    options = {k: v for k, v in defaults.items() if v is not None}
+
+    for key, value in row.items():
+        if key in {"start_date", "end_date", "date_format", "dayfirst"} and pd.notna(
+            value
+        ):
+            options[key] = value
+
+    return options
+
+
+def _write(df: pd.DataFrame, path: str, format: str) -> None:
+    if format == "parquet":
+        df.to_parquet(path + ".parquet", index=False)
+    else:
+        df.to_csv(path + ".csv", index=False)
+
+
+def _site_summary(
+    site: str, dataset: str, df: pd.DataFrame, good: pd.DataFrame
+) -> pd.DataFrame:
+    # Rows read and passed by procodet
+
+    key = "procodet" if "procodet" in df.columns else None
+    n_rows = df.groupby(key, dropna=False).size() if key else pd.Series([len(df)])
+    n_passed = good.groupby(key, dropna=False).size() if key else pd.Series([len(good)])
+
+    summary = pd.DataFrame({"n_rows": n_rows, "n_passed": n_passed}).fillna(0)
+    summary = summary.astype(int).rename_axis("procodet").reset_index()
+    if not key:
+        summary["procodet"] = None
+
+    summary.insert(0, "site", site)
+    summary.insert(1, "dataset", dataset)
+    summary["n_failed"] = summary.n_rows - summary.n_passed
+    summary["pass_rate"] = summary.n_passed / summary.n_rows
+
+    return summary
+
+
+def _site_checks(site: str, dataset: str, bad: pd.DataFrame) -> pd.DataFrame:
+    # Failure cases by procodet, column and check
+
+    keys = ["schema_context", "column", "check"]
+
+    if bad.empty or not set(keys).issubset(bad.columns):
+        return pd.DataFrame(columns=check_columns)
+
+    procodet = bad["procodet"] if "procodet" in bad.columns else None
+    checks = (
+        bad[keys]
+        .astype(str)
+        .assign(procodet=procodet)
+        .value_counts(["procodet", *keys], dropna=False, sort=False)
+        .rename("n_failure_cases")
+        .reset_index()
+    )
+
+    checks.insert(0, "site", site)
+    checks.insert(1, "dataset", dataset)
+
+    return checks[check_columns]
+
+
+def _validate_site(row: dict, output: str, format: str, defaults: dict) -> dict:
+    # Read, validate and write one extract. Runs in a worker process.
+
+    site, dataset = row["site"], row["dataset"]
+    schema = schemas[dataset]
+    options = _site_options(row, **defaults)
+
+    directory = os.path.join(output, str(site), dataset)
+    os.makedirs(directory, exist_ok=True)
+
+    start = time.perf_counter()
+
+    print(f"Validating {dataset} care data from site {site}")
+
+    try:
+        df = make_dataset.read_dataset(
+            row["path"],
+            schema,
+            date_format=options.pop("date_format", None),
+            dayfirst=bool(options.pop("dayfirst", False)),
+        )
+
+        with error_sink.error_sink(os.path.join(directory, f"bad.{format}")) as sink:
+            # Keep the failure cases to count them by procodet before they are written
+            good, bad = validate_dataframe(df, schema, **options)
+            sink.write(bad)
+
+        _write(good, os.path.join(directory, "good"), format)
+
+    except Exception as ex:
+        # A site that cannot be read is reported without stopping the other sites
+        print(f"Site {site} could not be validated:", ex)
+
+        summary = pd.DataFrame(
+            [
+                {
+                    "site": site,
+                    "dataset": dataset,
+                    "n_rows": 0,
+                    "n_passed": 0,
+                    "n_failed": 0,
+                }
+            ]
+        )
+        summary["error"] = str(ex)
+        checks = pd.DataFrame(columns=check_columns)
+
+    else:
+        summary = _site_summary(site, dataset, df, good)
+        summary["error"] = None
+        checks = _site_checks(site, dataset, bad)
+
+    summary["seconds"] = time.perf_counter() - start
+
+    return {"summary": summary.reindex(columns=summary_columns), "checks": checks}
+
+
+def validate_sites(
+    source: Union[str, pd.DataFrame],
+    output: str,
+    dataset: Optional[str] = None,
+    workers: int = 1,
+    format: str = "parquet",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    date_format: Optional[str] = None,
+    dayfirst: bool = False,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Validate extracts from many sites in parallel and summarise the results.
+
+    Each extract is read with [avoidable_admissions.data.make_dataset.read_dataset][]
+    and validated with [avoidable_admissions.data.validate.validate_dataframe][]
+    against the Episode schema for its dataset. See the module documentation for
+    the files written to `output`.
+
+    Dates and date formats in the manifest apply to that site only and take
+    precedence over the arguments below. An extract that cannot be read is
+    reported in the `error` column of the summary and the other sites are still validated.
+
+    Args:
+        source (str | pd.DataFrame): Manifest or directory of extracts.
+            See [avoidable_admissions.data.batch.read_manifest][].
+        output (str): Output directory
+        dataset (str, optional): `"admitted"` or `"emergency"` for extracts that
+            do not specify one
+        workers (int, optional): Number of worker processes. Defaults to 1 which
+            validates sites in the current process.
+        format (str, optional): `"parquet"` or `"csv"`. Defaults to `"parquet"`.
+        start_date (datetime, optional): Study start date (inclusive)
+        end_date (datetime, optional): Study end date (excluded)
+        date_format (str, optional): `strftime` format of date columns
+        dayfirst (bool, optional): Passed to `pd.to_datetime` if `date_format` is not set.
+
+    Returns:
+        Summary of rows read and passed, and pass rate, by site and `procodet`,
+            and failure cases by site, `procodet`, column and check.
+
+    ## Example
+
+    `manifest.csv`:
+
+    ```
+    site,path,dataset,start_date,end_date
+    RXN,lancs/admitted_care.csv,admitted,2021-11-01,2022-11-01
+    RXN,lancs/emergency_care.csv,emergency,2021-11-01,2022-11-01
+    RTX,morecambe/apc.parquet,admitted,2021-10-01,2022-10-01
+    ```
+
+    ```python
+    from avoidable_admissions.data.batch import validate_sites
+
+    summary, checks = validate_sites(
+        "../data/raw/manifest.csv", "../data/interim/sites", workers=4
+    )
+
+    summary.groupby(["site", "dataset"])[["n_rows", "n_passed"]].sum()
+    ```
+    """
+
+    manifest = read_manifest(source, dataset)
+    rows = manifest.to_dict("records")
+
+    os.makedirs(output, exist_ok=True)
+
+    defaults = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "date_format": date_format,
+        "dayfirst": dayfirst or None,
+    }
+
+    if workers > 1 and len(rows) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_validate_site, row, output, format, defaults)
+                for row in rows
+            ]
+            results = [future.result() for future in futures]
+    else:
+        results = [_validate_site(row, output, format, defaults) for row in rows]
+
+    summary = pd.concat([r["summary"] for r in results], ignore_index=True)
+    checks = pd.concat(
+        [r["checks"] for r in results] + [pd.DataFrame(columns=check_columns)],
+        ignore_index=True,
+    )
+
+    summary.to_csv(os.path.join(output, "summary.csv"), index=False)
+    checks.to_csv(os.path.join(output, "checks.csv"), index=False)
+
+    return summary, checks
@@ -0,0 +1,239 @@
+"""Write rows that fail validation to disk instead of keeping them in memory.
+
+On poor quality extracts the _bad_ dataframe returned by `validate_dataframe` can be
+larger than the _good_ one. An error sink passed to `validate_dataframe`, or to
+`validate_chunks` to validate an extract chunk by chunk, receives the failure cases
+as each call finishes and appends them to a file. Only the number of failure cases
+per column and check is kept in memory.
+
+Every chunk written to a sink is given the same columns: those passed as `columns`,
+or those of the first chunk, followed by the failure case columns. Chunks without some
+of these columns are written with missing values. Write the failure cases of each
+schema, for instance Episode and Feature validation, to separate sinks, as a chunk
+with a column that is not in the sink raises a `ValueError`.
+
+Parquet output requires `pyarrow`. Install with `pip install avoidable_admissions[arrow]`.
+"""
+
+import abc
+import os
+from collections import Counter
+from typing import Iterable, Optional
+
+import pandas as pd
+
+#: Columns added by pandera to each failure case
+failure_columns = [
+    "schema_context",
+    "column",
+    "check",
+    "check_number",
+    "failure_case",
+    "index",
+]
+
+
+class ErrorSink(abc.ABC):
+    """Base class for error sinks. Subclasses implement `_write`, and `close` if
+    they keep the file open.
+
+    Sinks can be used as context managers to close the file when validation is complete.
+
+    Args:
+        path (str): Path of the file to write. Any existing file is replaced.
+        columns (Iterable[str], optional): Data columns of the failure cases.
+            Defaults to the columns of the first chunk written.
+    """
+
+    def __init__(self, path: str, columns: Optional[Iterable[str]] = None):
+        self.path = str(path)
+        self.counts = Counter()
+        self.n_rows = 0
+        self.columns = None if columns is None else self._with_failure_columns(columns)
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def write(self, df_errors: pd.DataFrame) -> pd.DataFrame:
+        """Append failure cases to the file and update the counts.
+
+        Args:
+            df_errors (pd.DataFrame): _Bad_ dataframe from a single validation call
+
+        Returns:
+            pd.DataFrame: Failure case counts for `df_errors` only. See `summary`.
+        """
+
+        counts = _count(df_errors)
+
+        if not df_errors.empty:
+            self._write(self._conform(df_errors))
+
+        for *key, n in counts.itertuples(index=False):
+            self.counts[tuple(key)] += n
+        self.n_rows += len(df_errors)
+
+        return counts
+
+    def summary(self) -> pd.DataFrame:
+        """Failure case counts for everything written to the sink.
+
+        Returns:
+            pd.DataFrame: One row per `schema_context`, `column` and `check` with `n_failure_cases`
+        """
+
+        return _counts_frame(self.counts)
+
+    @staticmethod
+    def _with_failure_columns(columns: Iterable[str]) -> list:
+        columns = [str(c) for c in columns]
+        return columns + [c for c in failure_columns if c not in columns]
+
+    def _conform(self, df_errors: pd.DataFrame) -> pd.DataFrame:
+        # Failure cases with the columns of the file, in the same order
+
+        columns = [str(c) for c in df_errors.columns]
+
+        if self.columns is None:
+            self.columns = self._with_failure_columns(columns)
+
+        unexpected = [c for c in columns if c not in self.columns]
+        if unexpected:
+            raise ValueError(
+                f"Columns {unexpected} are not in the error sink {self.path}. "
+                "Write failure cases of each schema to a separate sink."
+            )
+
+        return df_errors.set_axis(columns, axis=1).reindex(columns=self.columns)
+
+    @abc.abstractmethod
+    def _write(self, df_errors: pd.DataFrame) -> None:
+        # Append failure cases, already given the columns of the sink, to the file
+        ...
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CSVErrorSink(ErrorSink):
+    """Append failure cases to a CSV file."""
+
+    def _write(self, df_errors: pd.DataFrame) -> None:
+        df_errors.to_csv(
+            self.path, mode="a", header=not os.path.exists(self.path), index=False
+        )
+
+
+class JSONLErrorSink(ErrorSink):
+    """Append failure cases to a file with one JSON object per line."""
+
+    def _write(self, df_errors: pd.DataFrame) -> None:
+        lines = df_errors.to_json(orient="records", lines=True, date_format="iso")
+
+        with open(self.path, "at") as f:
+            # Older versions of pandas do not end the last line with a newline
+            f.write(lines if lines.endswith("\n") else lines + "\n")
+
+
+class ParquetErrorSink(ErrorSink):
+    """Append failure cases as row groups of a Parquet file.
+
+    All values are written as strings so that chunks with different inferred types,
+    for instance a column that is entirely missing in one chunk, share one file schema.
+    """
+
+    def __init__(self, path: str, columns: Optional[Iterable[str]] = None):
+        super().__init__(path, columns)
+        self._writer = None
+
+    def _write(self, df_errors: pd.DataFrame) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            schema = pa.schema([(c, pa.string()) for c in self.columns])
+            self._writer = pq.ParquetWriter(self.path, schema)
+
+        df_errors = df_errors.astype(str).where(df_errors.notna(), None)
+
+        self._writer.write_table(
+            pa.Table.from_pandas(
+                df_errors, schema=self._writer.schema, preserve_index=False
+            )
+        )
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def error_sink(path: str, columns: Optional[Iterable[str]] = None) -> ErrorSink:
+    """Create an error sink for `path` based on its suffix.
+
+    Args:
+        path (str): File path ending in `.parquet`, `.csv` or `.jsonl`
+        columns (Iterable[str], optional): Data columns of the failure cases.
+            Defaults to the columns of the first chunk written.
+
+    Returns:
+        ErrorSink: Sink to pass to `validate_dataframe` or `validate_chunks`
+
+    ## Example
+
+    ```python
+    from avoidable_admissions.data.error_sink import error_sink
+
+    with error_sink("../data/interim/admitted_care_errors.parquet") as sink:
+        good, counts = validate_dataframe(df, AdmittedCareEpisodeSchema, error_sink=sink)
+    ```
+    """
+
+    suffix = os.path.splitext(str(path))[1].lower()
+
+    sinks = {
+        ".parquet": ParquetErrorSink,
+        ".pq": ParquetErrorSink,
+        ".csv": CSVErrorSink,
+        ".jsonl": JSONLErrorSink,
+    }
+
+    if suffix not in sinks:
+        raise ValueError(
+            f"Unsupported error sink file type '{suffix}'. Use one of {list(sinks)}."
+        )
+
+    return sinks[suffix](path, columns)
+
+
+def _count(df_errors: pd.DataFrame) -> pd.DataFrame:
+    # Failure cases by column and check. Errors that are not from pandera are counted once.
+
+    keys = ["schema_context", "column", "check"]
+
+    if df_errors.empty:
+        return _counts_frame(Counter())
+
+    if not set(keys).issubset(df_errors.columns):
+        return _counts_frame(Counter({("-", "-", "-"): len(df_errors)}))
+
+    return (
+        df_errors[keys]
+        .astype(str)
+        .value_counts(sort=False)
+        .rename("n_failure_cases")
+        .reset_index()
+    )
+
+
+def _counts_frame(counts: Counter) -> pd.DataFrame:
+    return pd.DataFrame(
+        [(*key, n) for key, n in counts.items()],
+        columns=["schema_context", "column", "check", "n_failure_cases"],
+    )
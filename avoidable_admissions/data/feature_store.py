@@ -0,0 +1,208 @@
+"""Store validated feature datasets as Parquet partitioned by month and provider.
+
+Analyses typically need a date range, a few providers and a handful of columns.
+Partitioning by month of `admidate` or `edarrivaldatetime` and by `procodet`
+means only the matching files are opened, and Parquet column statistics allow
+row groups outside the requested dates to be skipped without being read.
+
+Requires `pyarrow`. Install with `pip install avoidable_admissions[arrow]`.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Partition names are always strings so that provider codes such as "123" are not read as numbers
+partitioning = ds.partitioning(
+    pa.schema([("period", pa.string()), ("procodet", pa.string())]), flavor="hive"
+)
+
+
+def _cohort_date_col(columns) -> str:
+    # Same cohort date columns that are used for the study window in validation
+
+    if "admidate" in columns:
+        return "admidate"
+    elif "edarrivaldatetime" in columns:
+        return "edarrivaldatetime"
+
+    raise KeyError("Dataframe has neither admidate nor edarrivaldatetime column.")
+
+
+def _period(dates: pd.Series) -> np.ndarray:
+    # Month as "YYYY-MM". Format distinct months only instead of every row.
+
+    months = (dates.dt.year * 100 + dates.dt.month).to_numpy(
+        dtype=float, na_value=np.nan
+    )
+    positions, uniques = pd.factorize(months)
+
+    labels = np.array(
+        [f"{int(m) // 100:04d}-{int(m) % 100:02d}" for m in uniques] + [None],
+        dtype=object,
+    )
+
+    return labels[positions]
+
+
+def write_features(
+    df: pd.DataFrame,
+    path: str,
+    existing_data_behavior: str = "delete_matching",
+    max_rows_per_group: int = 1_000_000,
+) -> None:
+    """Write a feature dataset to Parquet partitioned by month and `procodet`.
+
+    Files are written to `path/period=YYYY-MM/procodet=XXX/`.
+    Rows are sorted by date within each partition so that column statistics
+    allow date filters to skip row groups.
+
+    Args:
+        df (pd.DataFrame): Validated admitted care or emergency care features
+        path (str): Root directory of the feature store
+        existing_data_behavior (str, optional): By default, partitions (month and provider)
+            present in `df` replace any existing data for the same partitions and other
+            partitions are left untouched. See `pyarrow.dataset.write_dataset`.
+        max_rows_per_group (int, optional): Maximum rows in each Parquet row group.
+
+    ## Example
+
+    ```python
+    from avoidable_admissions.data.feature_store import read_features, write_features
+
+    write_features(good_f, "../data/processed/admitted_care")
+    ```
+    """
+
+    date_col = _cohort_date_col(df.columns)
+
+    df = df.assign(period=_period(df[date_col])).sort_values(date_col)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=partitioning,
+        existing_data_behavior=existing_data_behavior,
+        max_rows_per_group=max_rows_per_group,
+        file_options=ds.ParquetFileFormat().make_write_options(
+            write_statistics=True, compression="snappy"
+        ),
+    )
+
+
+def _dataset(path: str) -> ds.Dataset:
+    return ds.dataset(path, format="parquet", partitioning=partitioning)
+
+
+def read_features(
+    path: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    sites: Optional[List[str]] = None,
+    columns: Optional[List[str]] = None,
+    filter: Optional[ds.Expression] = None,
+) -> pd.DataFrame:
+    """Read features from the store, loading only the partitions, row groups and columns needed.
+
+    Args:
+        path (str): Root directory of the feature store
+        start_date (datetime, optional): Earliest date (inclusive)
+        end_date (datetime, optional): Latest date (excluded), as in validation
+        sites (List[str], optional): Provider codes (`procodet`) to read
+        columns (List[str], optional): Columns to read. Defaults to all columns.
+        filter (pyarrow.dataset.Expression, optional): Additional filter
+            e.g. `ds.field("diag_01_acsc") != "-"`
+
+    Returns:
+        pd.DataFrame: Features matching all filters
+
+    ## Example
+
+    ```python
+    from datetime import datetime
+
+    df = read_features(
+        "../data/processed/admitted_care",
+        start_date=datetime(2021, 12, 1),
+        end_date=datetime(2022, 3, 1),
+        sites=["RXN"],
+        columns=["visit_id", "admidate", "admiage_cat", "diag_01_acsc"],
+    )
+    ```
+    """
+
+    dataset = _dataset(path)
+    date_col = _cohort_date_col(dataset.schema.names)
+
+    expression = ds.scalar(True)
+
+    if start_date is not None:
+        start_date = pd.Timestamp(start_date)
+        expression &= ds.field("period") >= start_date.strftime("%Y-%m")
+        expression &= ds.field(date_col) >= start_date.to_pydatetime()
+
+    if end_date is not None:
+        end_date = pd.Timestamp(end_date)
+        last_period = (end_date - pd.Timedelta(1, "ns")).strftime("%Y-%m")
+        expression &= ds.field("period") <= last_period
+        expression &= ds.field(date_col) < end_date.to_pydatetime()
+
+    if sites is not None:
+        expression &= ds.field("procodet").isin(list(sites))
+
+    if filter is not None:
+        expression &= filter
+
+    if columns is None:
+        columns = [c for c in dataset.schema.names if c != "period"]
+
+    table = dataset.to_table(columns=list(columns), filter=expression)
+
+    return table.to_pandas()
+
+
+def describe_features(path: str) -> pd.DataFrame:
+    """Column statistics of every row group in the store, read from Parquet metadata only.
+
+    Args:
+        path (str): Root directory of the feature store
+
+    Returns:
+        pd.DataFrame: One row per file, row group and column with
+            `num_rows`, `null_count`, `min` and `max`
+    """
+
+    rows = []
+
+    for file in _dataset(path).files:
+        metadata = pq.ParquetFile(file).metadata
+
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+
+            for j in range(row_group.num_columns):
+                column = row_group.column(j)
+                stats = column.statistics
+                has_min_max = stats is not None and stats.has_min_max
+
+                rows.append(
+                    {
+                        "file": file,
+                        "row_group": i,
+                        "column": column.path_in_schema,
+                        "num_rows": row_group.num_rows,
+                        "null_count": stats.null_count if stats is not None else None,
+                        "min": stats.min if has_min_max else None,
+                        "max": stats.max if has_min_max else None,
+                    }
+                )
+
+    return pd.DataFrame(rows)
@@ -0,0 +1,116 @@
+"""Hand off dataframes between pipeline stages as memory-mapped Arrow IPC files.
+
+Keeping the output of every stage in memory, or copying it before the next stage,
+holds several copies of the same data at once. Writing each stage output once as an
+uncompressed Arrow IPC (Feather V2) file and opening it memory-mapped lets later stages
+and parallel workers share the same pages on disk instead of deserialising
+or duplicating the data.
+
+Requires `pyarrow`. Install with `pip install avoidable_admissions[arrow]`.
+"""
+
+import json
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+# Key in the Arrow schema metadata used to keep df.attrs e.g. validation_token
+_ATTRS_KEY = b"avoidable_admissions.attrs"
+
+
+def write_stage(df: pd.DataFrame, path: str) -> None:
+    """Write the output of a pipeline stage to an Arrow IPC file.
+
+    The file is not compressed so that it can be memory-mapped by
+    [avoidable_admissions.data.handoff.read_stage][].
+    `df.attrs`, for instance the `validation_token` set by `validate_dataframe`,
+    is kept with the data.
+
+    Args:
+        df (pd.DataFrame): Output of a pipeline stage e.g. _good_ or _good_f_
+        path (str): Path of the file to write, conventionally with an `.arrow` suffix
+    """
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    metadata = dict(table.schema.metadata or {})
+    metadata[_ATTRS_KEY] = json.dumps(df.attrs, default=str).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def open_stage(path: str) -> pa.Table:
+    """Open a stage file memory-mapped as an Arrow table without reading it into memory.
+
+    Slices and column selections of the table refer to the same memory-mapped buffers,
+    so worker processes can each open the file and work on a range of rows
+    without the data being copied between them.
+
+    Args:
+        path (str): File written by [avoidable_admissions.data.handoff.write_stage][]
+
+    Returns:
+        pa.Table: Memory-mapped table
+    """
+
+    source = pa.memory_map(str(path), "r")
+
+    return pa.ipc.open_file(source).read_all()
+
+
+def read_stage(
+    path: str,
+    columns: Optional[List[str]] = None,
+    string_storage: Optional[str] = None,
+) -> pd.DataFrame:
+    """Read a stage file into a dataframe, sharing memory with the file where possible.
+
+    Numeric columns without missing values are not copied. Set `string_storage="pyarrow"`
+    to keep string columns as `string[pyarrow]` backed by the memory-mapped file
+    instead of converting them to Python strings.
+    These columns are validated with identical results, see
+    [avoidable_admissions.data.validate.validate_dataframe][].
+
+    Args:
+        path (str): File written by [avoidable_admissions.data.handoff.write_stage][]
+        columns (List[str], optional): Columns to read. Defaults to all columns.
+        string_storage (str, optional): Set to `"pyarrow"` to keep strings as Arrow strings.
+            Defaults to None which uses Python strings.
+
+    Returns:
+        pd.DataFrame: Stage output with `attrs` restored
+
+    ## Example
+
+    ```python
+    from avoidable_admissions.data.handoff import read_stage, write_stage
+
+    good, bad = validate_dataframe(df, AdmittedCareEpisodeSchema)
+    write_stage(good, "../data/interim/admitted_care_good.arrow")
+
+    # Later, or in another process
+    good = read_stage("../data/interim/admitted_care_good.arrow")
+    df_features = build_admitted_care_features(good)
+    ```
+    """
+
+    table = open_stage(path)
+
+    if columns is not None:
+        table = table.select(list(columns))
+
+    types_mapper = None
+    if string_storage == "pyarrow":
+        types_mapper = {pa.string(): pd.StringDtype("pyarrow")}.get
+
+    df = table.to_pandas(split_blocks=True, types_mapper=types_mapper)
+
+    attrs = (table.schema.metadata or {}).get(_ATTRS_KEY)
+    if attrs is not None:
+        df.attrs.update(json.loads(attrs))
+
+    return df
@@ -0,0 +1,253 @@
+"""Coerce data to the types expected by a validation schema before validation.
+
+Extracts rarely arrive with the exact types the schema expects. SNOMED codes with
+missing values are read as floats, codes such as `eddepttype` are read as numbers
+and dates are read as strings. `harmonise` derives the target type and missing
+value handling of every column from the schema and applies them in one
+vectorised pass per column, instead of a series of casts in user code.
+
+The same rules are used by [avoidable_admissions.data.make_dataset.read_dataset][].
+"""
+
+import re
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pandera as pa
+
+from avoidable_admissions.features import kernels
+
+
+def _match_columns(schema: pa.DataFrameSchema, columns) -> Dict[str, pa.Column]:
+    # Map each column in the data to its schema column.
+    # Named columns e.g. diag_01 take precedence over regex columns e.g. diag_[0-9]{2}$
+
+    matched = {}
+
+    for col in columns:
+        column = schema.columns.get(col)
+        if column is not None and not column.regex:
+            matched[col] = column
+            continue
+
+        for key, column in schema.columns.items():
+            if column.regex and re.match(key, col):
+                matched[col] = column
+                break
+
+    return matched
+
+
+def _accepts_zero(column: pa.Column) -> bool:
+    # Missing values are filled with 0 where 0 passes all checks on the column
+    # e.g. SNOMED codes and townsend_score_quintile but not admiage.
+    # This is the 0 "ERROR:Missing Data" convention used by the SNOMED mappings.
+
+    zero = pd.Series([0], dtype=np.int64)
+
+    return all(check(zero).check_passed for check in column.checks)
+
+
+def _plan(
+    schema: pa.DataFrameSchema, columns, string_storage: Optional[str] = None
+) -> Dict[str, dict]:
+    # Type and missing value handling for each column, derived once per dataset
+
+    plan = {}
+
+    string_dtype = pd.StringDtype(string_storage) if string_storage else str
+
+    for col, column in _match_columns(schema, columns).items():
+        dtype = str(column.dtype) if column.dtype is not None else None
+
+        if dtype == "str":
+            plan[col] = {"kind": "str", "read_dtype": string_dtype}
+        elif dtype == "int64":
+            plan[col] = {
+                "kind": "int",
+                # Nullable integers avoid loss of precision of long SNOMED codes through float
+                "read_dtype": "Int64",
+                "fill_zero": _accepts_zero(column),
+            }
+        elif dtype == "float64":
+            plan[col] = {"kind": "float", "read_dtype": "float64"}
+        elif dtype is not None and dtype.startswith("datetime64"):
+            plan[col] = {"kind": "datetime", "read_dtype": str}
+        else:
+            plan[col] = {"kind": None, "read_dtype": None}
+
+    return plan
+
+
+def _normalise_string(value) -> str:
+    # Codes read as floats because of missing values e.g. 1.0 are written as "1"
+
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return str(value).strip()
+
+
+def _strings(values: pd.Series) -> Tuple[pd.Series, int]:
+    # Convert to strings with surrounding spaces removed. Each distinct value is
+    # converted once and the result broadcast back. Missing values stay missing.
+
+    if isinstance(values.dtype, pd.StringDtype):
+        stripped = values.str.strip()
+        n_changed = int((stripped != values).sum())
+        return stripped, n_changed
+
+    positions, uniques = pd.factorize(values)
+
+    normalised = np.array(
+        [_normalise_string(u) for u in uniques] + [np.nan], dtype=object
+    )
+
+    is_changed = np.array(
+        [not (isinstance(u, str) and u == n) for u, n in zip(uniques, normalised)],
+        dtype=bool,
+    )
+    counts = np.bincount(positions[positions >= 0], minlength=len(uniques))
+    n_changed = int(counts[is_changed].sum())
+
+    result = pd.Series(normalised[positions], index=values.index, name=values.name)
+
+    return result, n_changed
+
+
+def _apply_plan(
+    df: pd.DataFrame,
+    plan: Dict[str, dict],
+    date_format: Optional[str] = None,
+    dayfirst: bool = False,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # Cast each column in the plan to the type expected by the schema in place.
+    # Columns that cannot be converted are left unchanged for validation to report.
+
+    changes = []
+
+    for col, props in plan.items():
+        kind = props["kind"]
+
+        if kind is None:
+            continue
+
+        values = df[col]
+        change = {
+            "column": col,
+            "dtype_before": str(values.dtype),
+            "n_filled": 0,
+            "n_normalised": 0,
+            "error": None,
+        }
+
+        try:
+            if kind == "str":
+                values, change["n_normalised"] = _strings(values)
+                if props["read_dtype"] is not str:
+                    values = values.astype(props["read_dtype"])
+
+            elif kind == "int":
+                if not pd.api.types.is_integer_dtype(values):
+                    values = pd.to_numeric(values).astype("Int64")
+                if props["fill_zero"]:
+                    change["n_filled"] = int(values.isna().sum())
+                    values = values.fillna(0)
+                if not values.hasnans:
+                    values = values.astype(np.int64)
+
+            elif kind == "float":
+                values = pd.to_numeric(values).astype(np.float64)
+
+            elif kind == "datetime":
+                values = kernels.parse_datetime(
+                    values, format=date_format, dayfirst=dayfirst
+                )
+
+        except (ValueError, TypeError) as ex:
+            change["error"] = str(ex)
+            values = df[col]
+
+        df[col] = values
+
+        change["dtype_after"] = str(values.dtype)
+        changes.append(change)
+
+    changes = pd.DataFrame(
+        changes,
+        columns=[
+            "column",
+            "dtype_before",
+            "dtype_after",
+            "n_filled",
+            "n_normalised",
+            "error",
+        ],
+    )
+
+    return df, changes
+
+
+def _print_errors(changes: pd.DataFrame) -> None:
+    for change in changes.itertuples():
+        if change.error is not None:
+            print(f"Column {change.column} could not be converted:", change.error)
+
+
+def harmonise(
+    df: pd.DataFrame,
+    schema: pa.DataFrameSchema,
+    date_format: Optional[str] = None,
+    dayfirst: bool = False,
+    string_storage: Optional[str] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Coerce every column in `df` to the type expected by `schema` in a single pass per column.
+
+    - String columns e.g. `gender`, `eddepttype` and `edattendcat` are converted to strings
+        with surrounding spaces removed. Numbers read as floats are written without
+        a decimal point e.g. `1.0` becomes `"1"`.
+    - Integer columns are converted to `int64`. Missing values are filled with 0 where
+        the schema accepts 0, for instance SNOMED codes and `townsend_score_quintile`.
+    - Float columns are converted to `float64`.
+    - Date columns are parsed once per distinct value.
+
+    Columns that are not in the schema are not changed. Columns that cannot be
+    converted, for instance text in a numeric column, are left unchanged so that
+    validation reports the values that need to be fixed.
+
+    Args:
+        df (pd.DataFrame): Admitted care or emergency care data
+        schema (pa.DataFrameSchema): Schema the data will be validated against
+        date_format (str, optional): `strftime` format of date columns e.g. `"%d/%m/%Y"`.
+        dayfirst (bool, optional): Passed to `pd.to_datetime` if `date_format` is not set.
+        string_storage (str, optional): Set to `"pyarrow"` to hold string columns as
+            `string[pyarrow]`. Defaults to None which uses Python strings.
+
+    Returns:
+        Harmonised dataframe, and a dataframe describing the changes to each column with
+            `dtype_before`, `dtype_after`, `n_filled` (missing values filled with 0),
+            `n_normalised` (values rewritten as strings) and `error`.
+
+    ## Example
+
+    ```python
+    from avoidable_admissions.data.harmonise import harmonise
+    from avoidable_admissions.data.validate import (
+        validate_dataframe,
+        EmergencyCareEpisodeSchema
+    )
+
+    df, changes = harmonise(df, EmergencyCareEpisodeSchema, dayfirst=True)
+    good, bad = validate_dataframe(df, EmergencyCareEpisodeSchema)
+    ```
+    """
+
+    plan = _plan(schema, df.columns, string_storage)
+
+    # Columns are replaced rather than modified so the input is not changed
+    df, changes = _apply_plan(df.copy(deep=False), plan, date_format, dayfirst)
+
+    _print_errors(changes)
+
+    return df, changes
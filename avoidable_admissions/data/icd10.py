@@ -0,0 +1,147 @@
+"""ICD-10 code reference used for validation and feature engineering.
+
+Diagnosis codes are validated against a list of ICD-10 codes. The list bundled in
+`reference/icd10_codes.txt` holds every category and subcategory of WHO ICD-10 2019,
+the COVID-19 codes added since, and 4 character codes padded with `X` as recorded
+in the NHS for categories without subdivisions e.g. `I10X`. It is generated with
+`avoidable_admissions.data.make_icd10_codes` from the WHO ICD-10 2019 classification
+in the `simple_icd_10` package, version 2.1.1, and its header records the SHA-1 of
+the source file.
+
+Sites with the NHS ICD-10 5th Edition from TRUD can validate against it instead.
+Generate a list with `make_icd10_codes --nhs` and set the `ICD10_CODES_PATH`
+environment variable, or in a `.env` file, to its path.
+
+Codes are validated by looking up each distinct code in the list, which is faster
+than matching a regex against every cell and rejects codes that do not exist.
+The regex `code_pattern` is kept to validate the format of codes only.
+See [avoidable_admissions.data.icd10.code_check][].
+"""
+
+import os
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pandera as pa
+from dotenv import find_dotenv, load_dotenv
+
+# Modified from https://medium.com/@manabu.torii/regex-pattern-for-icd-10-cm-codes-5763bd66e26d and includes string match for 'nan'
+code_pattern = r"^(?i:[A-Z][0-9][0-9AB](?:[0-9A-KXZ](?:[0-9A-EXYZ](?:[0-9A-HX][0-59A-HJKMNP-S]?)?)?)?|^\bnan\b$)$"
+
+reference_path = os.path.join(os.path.dirname(__file__), "reference", "icd10_codes.txt")
+
+codes_env_var = "ICD10_CODES_PATH"
+
+
+def _normalise(codes: pd.Series) -> pd.Series:
+    # Codes may be recorded with a dot and in lower case e.g. j45.0
+    return codes.str.strip().str.upper().str.replace(".", "", regex=False)
+
+
+@lru_cache(maxsize=None)
+def _read_codes(path: str) -> pd.Index:
+    codes = pd.read_csv(path, header=None, names=["code"], dtype=str, comment="#")
+    codes = _normalise(codes.code.dropna())
+
+    return pd.Index(codes.unique()).sort_values()
+
+
+def load_codes(path: Optional[str] = None) -> pd.Index:
+    """Load the list of valid ICD-10 codes as a sorted, hashed index.
+
+    Args:
+        path (str, optional): Text file with one code per line. Defaults to the file
+            in the `ICD10_CODES_PATH` environment variable if set, otherwise the
+            bundled reference.
+
+    Returns:
+        pd.Index: Codes in upper case without dots
+    """
+
+    if path is None:
+        load_dotenv(find_dotenv(usecwd=True))
+        path = os.environ.get(codes_env_var) or reference_path
+
+    return _read_codes(path)
+
+
+def is_valid(codes: pd.Series, reference: Optional[pd.Index] = None) -> pd.Series:
+    """Check which codes are in the ICD-10 reference.
+
+    Each distinct code is looked up once. Codes are normalised to upper case
+    without dots. Codes with 5 or 6 characters are also valid if their first
+    4 characters are in the reference and the extra characters are in the format
+    of `code_pattern`, as with the 5th character extensions and dagger and asterisk
+    suffixes of the NHS ICD-10 5th Edition. The text `nan` is valid as it is with
+    `code_pattern`.
+
+    Args:
+        codes (pd.Series): ICD-10 codes
+        reference (pd.Index, optional): Valid codes. Defaults to `load_codes()`.
+
+    Returns:
+        pd.Series: True for valid codes, False for invalid and missing codes
+    """
+
+    if reference is None:
+        reference = load_codes()
+
+    positions, uniques = pd.factorize(codes)
+
+    distinct = _normalise(pd.Series(uniques, dtype=object).astype(str))
+
+    valid = distinct.isin(reference)
+
+    extended = ~valid & (distinct.str.len() > 4)
+    valid[extended] = distinct[extended].str[:4].isin(reference) & distinct[
+        extended
+    ].str.match(code_pattern)
+
+    valid |= distinct.str.lower() == "nan"
+
+    result = np.append(valid.to_numpy(dtype=bool), False)[positions]
+
+    return pd.Series(result, index=codes.index, name=codes.name)
+
+
+def code_check(mode: str = "reference") -> pa.Check:
+    """Pandera check for ICD-10 diagnosis codes.
+
+    Args:
+        mode (str, optional): `"reference"` to check that codes are in the ICD-10
+            reference with [avoidable_admissions.data.icd10.is_valid][], or `"regex"`
+            to check the format of codes with `code_pattern` only.
+            Defaults to `"reference"`.
+
+    Returns:
+        pa.Check: Check to apply to `diag_NN` columns
+
+    ## Example
+
+    Validate the format of diagnosis codes only, for instance to compare with
+    results from an earlier version of this package.
+
+    ```python
+    from avoidable_admissions.data import icd10
+    from avoidable_admissions.data.validate import (
+        AdmittedCareEpisodeSchema,
+        validate_dataframe,
+    )
+
+    good, bad = validate_dataframe(
+        df,
+        AdmittedCareEpisodeSchema,
+        update_cols={"diag_[0-9]{2}$": {"checks": [icd10.code_check("regex")]}},
+    )
+    ```
+    """
+
+    if mode == "regex":
+        return pa.Check.str_matches(code_pattern)
+
+    if mode != "reference":
+        raise ValueError(f"mode must be 'reference' or 'regex', not {mode!r}")
+
+    return pa.Check(is_valid, name="icd10_code", error="icd10_code")
@@ -0,0 +1,191 @@
+"""Read data extracts with column types derived from the validation schema.
+
+Reading an extract with a bare `pd.read_csv` relies on type inference and
+requires several manual casts before the data will pass validation.
+The functions in this module derive the column types, the columns to read,
+date columns and missing value handling from the Episode schema instead.
+"""
+
+import os
+from typing import Dict, Iterator, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pandera as pa
+
+from avoidable_admissions.data import harmonise
+from avoidable_admissions.data.validate import (
+    AdmittedCareEpisodeSchema,
+    EmergencyCareEpisodeSchema,
+)
+
+
+def _add_visit_id(
+    df: pd.DataFrame, schema: pa.DataFrameSchema, offset: int
+) -> pd.DataFrame:
+    # visit_id is not part of the data spec but is required as a unique row identifier
+
+    if "visit_id" in schema.columns and "visit_id" not in df.columns:
+        df.insert(0, "visit_id", np.arange(offset, offset + len(df)).astype(str))
+
+    return df
+
+
+def _is_parquet(path: str) -> bool:
+    return os.path.splitext(str(path))[1].lower() in {".parquet", ".pq"}
+
+
+def _read_columns(path: str, **kwargs) -> list:
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(path).names
+
+    return list(pd.read_csv(path, nrows=0, **kwargs).columns)
+
+
+def _iter_raw_chunks(
+    path: str, plan: Dict[str, dict], chunksize: Optional[int], **kwargs
+) -> Iterator[pd.DataFrame]:
+    # Chunks as read from the file with types from the plan, before harmonisation
+
+    usecols = list(plan)
+
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        if chunksize:
+            batches = (
+                batch.to_pandas()
+                for batch in pq.ParquetFile(path).iter_batches(
+                    batch_size=chunksize, columns=usecols
+                )
+            )
+        else:
+            batches = [pd.read_parquet(path, columns=usecols)]
+    else:
+        batches = pd.read_csv(
+            path,
+            usecols=usecols,
+            dtype={c: p["read_dtype"] for c, p in plan.items() if p["read_dtype"]},
+            chunksize=chunksize,
+            **kwargs,
+        )
+        if not chunksize:
+            batches = [batches]
+
+    offset = 0
+    for df in batches:
+        df.index = pd.RangeIndex(offset, offset + len(df))
+        offset += len(df)
+        yield df
+
+
+def _iter_chunks(
+    path: str,
+    schema: pa.DataFrameSchema,
+    plan: Dict[str, dict],
+    chunksize: Optional[int],
+    date_format: Optional[str],
+    dayfirst: bool,
+    **kwargs,
+) -> Iterator[pd.DataFrame]:
+
+    for df in _iter_raw_chunks(path, plan, chunksize, **kwargs):
+        df, changes = harmonise._apply_plan(df, plan, date_format, dayfirst)
+        harmonise._print_errors(changes)
+        df = _add_visit_id(df, schema, df.index.start)
+        yield df
+
+
+def read_dataset(
+    path: str,
+    schema: pa.DataFrameSchema,
+    chunksize: Optional[int] = None,
+    date_format: Optional[str] = None,
+    dayfirst: bool = False,
+    string_storage: Optional[str] = None,
+    **kwargs,
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """Read a CSV or Parquet extract in a single typed pass using types from a validation schema.
+
+    - Only columns defined in the schema are read. Other columns are reported and skipped.
+    - String columns such as `gender`, `admisorc` and `patient_id` are read as strings
+        with surrounding spaces removed.
+    - Integer columns are read as nullable integers. Missing values are filled with 0
+        where the schema accepts 0, for instance SNOMED codes and `townsend_score_quintile`.
+        Columns with no missing values are returned as `int64`.
+    - Date columns are parsed once per distinct value.
+    - `visit_id` is created from the row number if it is not in the extract.
+
+    Types are converted using the same rules as
+    [avoidable_admissions.data.harmonise.harmonise][].
+
+    Args:
+        path (str): Path to a CSV file, or a Parquet file with a `.parquet` or `.pq` suffix
+        schema (pa.DataFrameSchema): `AdmittedCareEpisodeSchema` or `EmergencyCareEpisodeSchema`
+        chunksize (int, optional): Return an iterator of dataframes with this many rows.
+            Defaults to None which reads the whole file.
+        date_format (str, optional): `strftime` format of date columns e.g. `"%d/%m/%Y"`.
+        dayfirst (bool, optional): Passed to `pd.to_datetime` if `date_format` is not set.
+        string_storage (str, optional): Set to `"pyarrow"` to hold string columns as
+            `string[pyarrow]` which uses much less memory than Python strings.
+            Defaults to None which uses Python strings.
+        kwargs: Other keyword arguments passed to `pd.read_csv` e.g. `sep` or `encoding`
+
+    Returns:
+        A dataframe, or an iterator of dataframes if `chunksize` is set.
+
+    ## Example
+
+    ```python
+    from avoidable_admissions.data.make_dataset import read_dataset
+    from avoidable_admissions.data.validate import (
+        validate_dataframe,
+        AdmittedCareEpisodeSchema
+    )
+
+    df = read_dataset(
+        "../data/raw/admitted_care.csv", AdmittedCareEpisodeSchema, dayfirst=True
+    )
+    good, bad = validate_dataframe(df, AdmittedCareEpisodeSchema)
+    ```
+    """
+
+    columns = _read_columns(path, **kwargs)
+    plan = harmonise._plan(schema, columns, string_storage)
+
+    skipped = [c for c in columns if c not in plan]
+    if skipped:
+        print("Columns not in schema will not be read:", ", ".join(skipped))
+
+    chunks = _iter_chunks(
+        path, schema, plan, chunksize, date_format, dayfirst, **kwargs
+    )
+
+    if chunksize:
+        return chunks
+
+    return next(chunks)
+
+
+def read_admitted_care_data(
+    path: str, **kwargs
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """Convenience wrapper for `read_dataset(path, AdmittedCareEpisodeSchema)`
+
+    See [avoidable_admissions.data.make_dataset.read_dataset][] for usage.
+    """
+
+    return read_dataset(path, AdmittedCareEpisodeSchema, **kwargs)
+
+
+def read_emergency_care_data(
+    path: str, **kwargs
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """Convenience wrapper for `read_dataset(path, EmergencyCareEpisodeSchema)`
+
+    See [avoidable_admissions.data.make_dataset.read_dataset][] for usage.
+    """
+
+    return read_dataset(path, EmergencyCareEpisodeSchema, **kwargs)
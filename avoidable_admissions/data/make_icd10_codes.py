@@ -0,0 +1,159 @@
+"""Generate the list of ICD-10 codes used by [avoidable_admissions.data.icd10][].
+
+    python -m avoidable_admissions.data.make_icd10_codes --claml icdClaML2019ens.xml
+    python -m avoidable_admissions.data.make_icd10_codes --simple-icd-10 icd_10_v2019.xml
+    python -m avoidable_admissions.data.make_icd10_codes --nhs ICD10_Edition5_CodesAndTitlesAndMetadata_GB_20160401.txt
+
+With `--claml`, codes are read from the WHO ICD-10 2019 classification in ClaML format,
+from the WHO classifications download area. With `--simple-icd-10`, they are read
+from `data/icd_10_v2019.xml` of the CC0 licensed `simple_icd_10` package on PyPI,
+which holds the WHO ICD-10 2019 classification as published in the WHO ICD-10
+browser. With either, every category and subcategory is written, categories without
+subcategories are also written padded with `X` as they are recorded in the NHS e.g.
+`I10X`, and the COVID-19 codes added by WHO after 2019 are added. With `--nhs`,
+the codes of the NHS ICD-10 5th Edition from TRUD are written as they are, as they
+already include codes padded with `X`.
+
+Codes are written without dots, one per line, after a header with the name and SHA-1
+of the source file and the command used, so that the list can be traced and
+regenerated. The output defaults to the bundled `reference/icd10_codes.txt`.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import List
+
+import pandas as pd
+
+from avoidable_admissions.data.icd10 import reference_path
+
+#: Codes added by WHO updates after the 2019 release
+additions = ["U10", "U109", "U11", "U119", "U12", "U129"]
+
+
+def _code(code: str) -> str:
+    # Dots, and dagger and asterisk marks, are not part of recorded codes
+    return re.sub(r"[^0-9A-Z]", "", code.upper())
+
+
+def read_claml(path: str) -> List[str]:
+    """Read the categories and subcategories of a WHO ICD-10 ClaML file.
+
+    Args:
+        path (str): ClaML XML file e.g. `icdClaML2019ens.xml`
+
+    Returns:
+        List[str]: Codes without dots, with `X` padded codes for categories
+            without subcategories, and `additions`
+    """
+
+    codes = []
+
+    for _, element in ET.iterparse(path):
+        if element.tag != "Class" or element.get("kind") != "category":
+            continue
+
+        code = _code(element.get("code"))
+        codes.append(code)
+
+        if len(code) == 3 and element.find("SubClass") is None:
+            codes.append(code + "X")
+
+        element.clear()
+
+    return sorted(set(codes + additions))
+
+
+def read_simple_icd_10(path: str) -> List[str]:
+    """Read the categories and subcategories of the `simple_icd_10` XML file.
+
+    Args:
+        path (str): `icd_10_v2019.xml` from the `data` folder of `simple_icd_10`
+
+    Returns:
+        List[str]: Codes without dots, with `X` padded codes for categories
+            without subcategories, and `additions`
+    """
+
+    codes = []
+
+    for item in ET.parse(path).getroot().iter("item"):
+        if item.get("type") not in ("category", "subcategory"):
+            continue
+
+        code = _code(item.findtext("name"))
+        codes.append(code)
+
+        if item.get("type") == "category" and item.find("item") is None:
+            codes.append(code + "X")
+
+    return sorted(set(codes + additions))
+
+
+def read_nhs(path: str) -> List[str]:
+    """Read the codes of the NHS ICD-10 5th Edition codes and titles file from TRUD.
+
+    Args:
+        path (str): Tab separated file with an `ALT_CODE` column e.g.
+            `ICD10_Edition5_CodesAndTitlesAndMetadata_GB_20160401.txt`
+
+    Returns:
+        List[str]: Codes without dots
+    """
+
+    nhs = pd.read_csv(path, sep="\t", usecols=["ALT_CODE"], dtype=str)
+
+    return sorted(set(nhs.ALT_CODE.dropna().map(_code)))
+
+
+def write_codes(codes: List[str], path: str, source: str, command: str) -> None:
+    """Write codes one per line after a header recording their source.
+
+    Args:
+        codes (List[str]): ICD-10 codes
+        path (str): Output text file
+        source (str): File the codes were read from
+        command (str): Command used to generate the file
+    """
+
+    with open(source, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+
+    with open(path, "w") as f:
+        f.write("# ICD-10 codes for avoidable_admissions.data.icd10\n")
+        f.write(f"# Source: {os.path.basename(source)} (SHA-1 {digest})\n")
+        f.write(f"# Generated with: {command}\n")
+        f.writelines(code + "\n" for code in codes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--claml", help="WHO ICD-10 ClaML XML file")
+    source.add_argument(
+        "--simple-icd-10", help="icd_10_v2019.xml from the simple_icd_10 package"
+    )
+    source.add_argument("--nhs", help="NHS ICD-10 5th Edition codes and titles file")
+    parser.add_argument("--output", default=reference_path)
+    args = parser.parse_args()
+
+    if args.claml:
+        path, codes = args.claml, read_claml(args.claml)
+        option = "--claml"
+    elif args.simple_icd_10:
+        path, codes = args.simple_icd_10, read_simple_icd_10(args.simple_icd_10)
+        option = "--simple-icd-10"
+    else:
+        path, codes = args.nhs, read_nhs(args.nhs)
+        option = "--nhs"
+
+    command = (
+        "python -m avoidable_admissions.data.make_icd10_codes "
+        f"{option} {os.path.basename(path)}"
+    )
+    write_codes(codes, args.output, path, command)
+
+    print(f"Wrote {len(codes)} codes from {path} to {args.output}.")
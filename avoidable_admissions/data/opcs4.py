@@ -0,0 +1,174 @@
+"""OPCS-4 procedure code reference used for validation and feature engineering.
+
+The table of OPCS-4 chapters bundled in `reference/opcs4_chapters.csv` gives the title
+of each chapter and whether its codes count as procedures in `opertn_count`.
+Codes in the O, Y and Z chapters qualify another procedure with its site or method
+and are not counted, nor are `X998` and `X999` which record that no procedure was
+carried out or coded.
+
+Without a full code list, a code is valid if it has the format of an OPCS-4 code
+and its chapter is in the table. The full OPCS-4 code list is distributed under
+licence through TRUD. Sites that have it can set the `OPCS4_CODES_PATH` environment
+variable, or in a `.env` file, to a text file with one code per line, and codes
+must then also be in that list.
+
+Each distinct code in a block of `opertn_NN` columns is validated and classified
+once with [avoidable_admissions.data.opcs4.lookup][], which is used by both the
+schema check and [avoidable_admissions.features.classifiers.OPCS4Classifier][].
+"""
+
+import os
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+import pandera as pa
+from dotenv import find_dotenv, load_dotenv
+
+# Chapter letter (not I), 2 digits and an optional dot and 4th digit, or `-` or `&`
+code_pattern = r"^\s*(?i:[A-HJ-Z][0-9]{2}\.?[0-9]?|-|&)\s*$"
+
+#: No procedure carried out (`-`) or not known (`&`). Valid but not procedures.
+no_procedure_values = ["-", "&"]
+
+#: Valid codes that are not counted as procedures
+excluded_codes = ["X998", "X999"]
+
+#: Text of missing values in columns cast with `astype(str)`, valid as with ICD-10 codes
+missing_text = "NAN"
+
+chapters_path = os.path.join(
+    os.path.dirname(__file__), "reference", "opcs4_chapters.csv"
+)
+
+codes_env_var = "OPCS4_CODES_PATH"
+
+
+def _normalise(codes: pd.Series) -> pd.Series:
+    # Codes may be recorded with a dot and in lower case e.g. w40.1
+    return codes.str.strip().str.upper().str.replace(".", "", regex=False)
+
+
+@lru_cache(maxsize=1)
+def load_chapters() -> pd.DataFrame:
+    """Load the bundled table of OPCS-4 chapters.
+
+    Returns:
+        pd.DataFrame: `title` and `procedure` (whether codes in the chapter count
+            as procedures) indexed by `chapter`
+    """
+
+    return pd.read_csv(chapters_path, dtype={"chapter": str}).set_index("chapter")
+
+
+@lru_cache(maxsize=None)
+def _read_codes(path: str) -> pd.Index:
+    codes = pd.read_csv(path, header=None, names=["code"], dtype=str, comment="#")
+    codes = _normalise(codes.code.dropna())
+
+    return pd.Index(codes.unique()).sort_values()
+
+
+def load_codes(path: Optional[str] = None) -> Optional[pd.Index]:
+    """Load a full list of valid OPCS-4 codes as a sorted, hashed index.
+
+    Args:
+        path (str, optional): Text file with one code per line. Defaults to the file
+            in the `OPCS4_CODES_PATH` environment variable.
+
+    Returns:
+        pd.Index: Codes in upper case without dots, or None if no list is set
+    """
+
+    if path is None:
+        load_dotenv(find_dotenv(usecwd=True))
+        path = os.environ.get(codes_env_var)
+
+    return _read_codes(path) if path else None
+
+
+def lookup(codes: Iterable, reference: Optional[pd.Index] = None) -> pd.DataFrame:
+    """Validate and classify distinct OPCS-4 codes in one pass.
+
+    Args:
+        codes (Iterable): Distinct, non-missing codes e.g. from `pd.factorize`
+        reference (pd.Index, optional): Full list of valid codes.
+            Defaults to `load_codes()`.
+
+    Returns:
+        pd.DataFrame: One row per code in the same order with the columns `code`
+            (normalised), `valid`, `chapter` (None for invalid codes, `-`, `&`
+            and `nan`) and `procedure` (whether the code counts as a procedure)
+    """
+
+    if reference is None:
+        reference = load_codes()
+
+    chapters = load_chapters()
+
+    code = _normalise(pd.Series(list(codes), dtype=object).astype(str))
+
+    # `-` and `&` match the pattern but are not in a chapter
+    chapter = code.str[:1].where(code.str.match(code_pattern))
+    chapter = chapter.where(chapter.isin(chapters.index))
+
+    valid = chapter.notna()
+    if reference is not None:
+        valid &= code.isin(reference)
+    chapter = chapter.where(valid, None)
+
+    procedure = (
+        valid
+        & chapter.map(chapters.procedure).fillna(False).astype(bool)
+        & ~code.isin(excluded_codes)
+    )
+
+    valid |= code.isin(no_procedure_values) | (code == missing_text)
+
+    return pd.DataFrame(
+        {"code": code, "valid": valid, "chapter": chapter, "procedure": procedure}
+    )
+
+
+def is_valid(codes: pd.Series, reference: Optional[pd.Index] = None) -> pd.Series:
+    """Check which codes are valid OPCS-4 codes, `-`, `&` or the text `nan`.
+
+    Args:
+        codes (pd.Series): OPCS-4 codes
+        reference (pd.Index, optional): Full list of valid codes.
+            Defaults to `load_codes()`.
+
+    Returns:
+        pd.Series: True for valid codes, False for invalid and missing codes
+    """
+
+    positions, uniques = pd.factorize(codes)
+
+    valid = lookup(uniques, reference)["valid"].to_numpy(dtype=bool)
+
+    # factorize sets missing values to -1 which picks False from the end
+    result = np.append(valid, False)[positions]
+
+    return pd.Series(result, index=codes.index, name=codes.name)
+
+
+def code_check(mode: str = "reference") -> pa.Check:
+    """Pandera check for OPCS-4 procedure codes.
+
+    Args:
+        mode (str, optional): `"reference"` to check codes with
+            [avoidable_admissions.data.opcs4.is_valid][], or `"regex"` to check
+            the format of codes with `code_pattern` only. Defaults to `"reference"`.
+
+    Returns:
+        pa.Check: Check to apply to `opertn_NN` columns
+    """
+
+    if mode == "regex":
+        return pa.Check.str_matches(code_pattern)
+
+    if mode != "reference":
+        raise ValueError(f"mode must be 'reference' or 'regex', not {mode!r}")
+
+    return pa.Check(is_valid, name="opcs4_code", error="opcs4_code")
@@ -0,0 +1,171 @@
+"""Pseudonymise identifiers such as `patient_id` with a keyed cryptographic hash.
+
+Identifiers are replaced with a keyed BLAKE2b digest. The same identifier and key
+always give the same pseudonym, so admitted care and emergency care data
+pseudonymised with the same key can still be linked. Without the key,
+pseudonyms cannot be reversed or recreated from a list of identifiers.
+
+Each distinct identifier is hashed only once and large extracts are hashed
+in batches across several processes.
+
+The key is read from the `PSEUDONYMISATION_KEY` environment variable or `.env` file
+unless passed explicitly. Keep the key secret and use the same key for all datasets
+that need to be linked.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from dotenv import find_dotenv, load_dotenv
+
+key_env_var = "PSEUDONYMISATION_KEY"
+
+# 128 bit digests, written as 32 hexadecimal characters
+digest_size = 16
+
+
+def load_key(key: Optional[Union[str, bytes]] = None) -> bytes:
+    """Key to use for pseudonymisation.
+
+    Args:
+        key (str | bytes, optional): Key to use. Defaults to the `PSEUDONYMISATION_KEY`
+            environment variable, which can be set in a `.env` file.
+
+    Returns:
+        bytes: Key of at most 64 bytes
+    """
+
+    if key is None:
+        load_dotenv(find_dotenv(usecwd=True))
+
+        try:
+            key = os.environ[key_env_var]
+        except KeyError as exc:
+            raise KeyError(
+                f"Environment variable {key_env_var} not set for pseudonymisation key.",
+                *exc.args,
+            )
+
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+
+    if not key:
+        raise ValueError("Pseudonymisation key must not be empty.")
+
+    if len(key) > hashlib.blake2b.MAX_KEY_SIZE:
+        raise ValueError(
+            f"Pseudonymisation key must be at most {hashlib.blake2b.MAX_KEY_SIZE} bytes."
+        )
+
+    return key
+
+
+def _hash_batch(values: List[str], key: bytes) -> List[str]:
+    # The keyed state is created once and copied for each value
+    # which avoids processing the key block for every identifier.
+
+    keyed = hashlib.blake2b(key=key, digest_size=digest_size)
+
+    digests = []
+    for value in values:
+        h = keyed.copy()
+        h.update(value.encode("utf-8"))
+        digests.append(h.hexdigest())
+
+    return digests
+
+
+def _identifier_strings(values: pd.Series) -> pd.Series:
+    # Identifiers read as floats because of missing values e.g. 1234.0 are
+    # hashed as "1234" so that they match the same identifier read as a string.
+
+    if pd.api.types.is_float_dtype(values):
+        whole = values.dropna()
+        if (whole == np.floor(whole)).all():
+            values = values.astype("Int64")
+
+    return values.astype(str).str.strip().where(values.notna())
+
+
+def pseudonymise(
+    values: pd.Series,
+    key: Optional[Union[str, bytes]] = None,
+    n_jobs: int = 1,
+    batch_size: int = 100_000,
+) -> pd.Series:
+    """Replace identifiers with keyed BLAKE2b pseudonyms.
+
+    Identifiers are compared as strings after removing leading and trailing spaces.
+    Missing values remain missing.
+
+    Args:
+        values (pd.Series): Identifiers e.g. `df.patient_id`
+        key (str | bytes, optional): Key to use. Defaults to the `PSEUDONYMISATION_KEY`
+            environment variable.
+        n_jobs (int, optional): Number of processes used to hash distinct identifiers.
+            Defaults to 1. Only worth increasing for millions of distinct identifiers.
+        batch_size (int, optional): Distinct identifiers hashed by each task.
+
+    Returns:
+        pd.Series: Pseudonyms of 32 hexadecimal characters with the same index as `values`
+
+    ## Example
+
+    ```python
+    from avoidable_admissions.data.pseudonymise import pseudonymise
+
+    df["patient_id"] = pseudonymise(df["patient_id"])
+    ```
+    """
+
+    key = load_key(key)
+
+    # Normalise distinct values only, then merge values that are equal after normalising
+    positions, uniques = pd.factorize(values)
+    codes, distinct = pd.factorize(_identifier_strings(pd.Series(uniques)))
+    distinct = list(distinct)
+
+    batches = [
+        distinct[i : i + batch_size] for i in range(0, len(distinct), batch_size)
+    ]
+
+    if n_jobs > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = pool.map(_hash_batch, batches, [key] * len(batches))
+            digests = [d for batch in results for d in batch]
+    else:
+        digests = [d for batch in batches for d in _hash_batch(batch, key)]
+
+    # Position -1 for missing identifiers picks the last item which is missing
+    digests = np.array(digests + [np.nan], dtype=object)[codes]
+    digests = np.append(digests, np.nan)
+
+    return pd.Series(digests[positions], index=values.index, name=values.name)
+
+
+def pseudonymise_columns(
+    df: pd.DataFrame,
+    columns: List[str] = ["patient_id"],
+    key: Optional[Union[str, bytes]] = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """Pseudonymise identifier columns of a dataframe.
+
+    Args:
+        df (pd.DataFrame): Admitted care or emergency care data
+        columns (List[str], optional): Columns to pseudonymise. Defaults to `["patient_id"]`.
+        key (str | bytes, optional): Key to use. Defaults to the `PSEUDONYMISATION_KEY`
+            environment variable.
+        kwargs: Passed to [avoidable_admissions.data.pseudonymise.pseudonymise][]
+
+    Returns:
+        pd.DataFrame: Dataframe with `columns` replaced by pseudonyms
+    """
+
+    key = load_key(key)
+
+    return df.assign(**{col: pseudonymise(df[col], key, **kwargs) for col in columns})
@@ -0,0 +1,257 @@
+"""SNOMED CT subsumption index built from a local RF2 relationship snapshot.
+
+The maps in `feature_maps` list SNOMED codes exactly, so a more specific concept
+below a mapped code is reported as unmapped. With the SNOMED CT hierarchy, such
+descendants are given the category of their mapped ancestor without a request to
+a terminology server for each code.
+
+Set the `SNOMED_RELATIONSHIPS_PATH` environment variable, or in a `.env` file, to the
+RF2 relationship snapshot from TRUD, such as
+`sct2_Relationship_Snapshot_GB1000000_20230412.txt`. The active `116680003 |Is a|`
+relationships are read into an index of the children of each concept. The transitive
+closure below a set of ancestors is found one level at a time for all ancestors at once,
+and each descendant is assigned to its nearest ancestor. Columns of codes are then
+looked up with one binary search per distinct code.
+
+Without a relationship snapshot, maps are used as they are.
+"""
+
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import find_dotenv, load_dotenv
+
+from avoidable_admissions.data.snomed_refsets import _as_int64
+
+relationships_env_var = "SNOMED_RELATIONSHIPS_PATH"
+
+#: typeId of `116680003 |Is a|` relationships
+is_a = 116680003
+
+
+class ClosureIndex:
+    """Nearest ancestor of each concept below a set of ancestors, including the
+    ancestors themselves.
+
+    Build with [avoidable_admissions.data.snomed_hierarchy.Hierarchy.closure][].
+    """
+
+    def __init__(self, codes: np.ndarray, ancestors: np.ndarray):
+        order = np.argsort(codes, kind="stable")
+        self.codes = codes[order]
+        self.ancestors = ancestors[order]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def ancestor_of(self, codes: pd.Series) -> np.ndarray:
+        """Nearest ancestor of each code. Each distinct code is looked up once.
+
+        Args:
+            codes (pd.Series): SNOMED codes
+
+        Returns:
+            np.ndarray: int64 ancestor, the code itself for ancestors, and -1 for
+                codes that are not below any ancestor and missing codes
+        """
+
+        positions, uniques = pd.factorize(pd.Series(codes))
+        values = _as_int64(uniques)
+
+        index = np.searchsorted(self.codes, values)
+        index = np.clip(index, 0, max(len(self.codes) - 1, 0))
+
+        ancestors = np.full(len(values), -1, dtype=np.int64)
+        if len(self.codes):
+            found = self.codes[index] == values
+            ancestors[found] = self.ancestors[index[found]]
+
+        # factorize sets missing values to -1 which picks -1 from the end
+        return np.append(ancestors, -1)[positions]
+
+    def is_descendant(self, codes: pd.Series) -> np.ndarray:
+        """Check whether codes are an ancestor or below one.
+
+        Args:
+            codes (pd.Series): SNOMED codes
+
+        Returns:
+            np.ndarray: True for codes subsumed by an ancestor
+        """
+
+        return self.ancestor_of(codes) >= 0
+
+
+class Hierarchy:
+    """Children of each SNOMED CT concept, from `Is a` relationships.
+
+    ## Example
+
+    ```python
+    hierarchy = load_hierarchy()
+
+    # Asthma and Chronic obstructive lung disease
+    index = hierarchy.closure([195967001, 13645005])
+
+    df["eddiag_01_asthma_copd"] = index.is_descendant(df.eddiag_01)
+    ```
+    """
+
+    def __init__(self, children: np.ndarray, parents: np.ndarray):
+        order = np.argsort(parents, kind="stable")
+        parents, self._children = parents[order], children[order]
+
+        # Children of self._parents[i] are self._children[offsets[i]:offsets[i + 1]]
+        self._parents, first = np.unique(parents, return_index=True)
+        self._offsets = np.append(first, len(parents))
+
+    def _children_of(
+        self, codes: np.ndarray, owners: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Children of each code, with the owner of their parent
+
+        if not len(self._parents):
+            return codes[:0], owners[:0]
+
+        index = np.searchsorted(self._parents, codes)
+        index = np.clip(index, 0, len(self._parents) - 1)
+        found = self._parents[index] == codes
+        index, owners = index[found], owners[found]
+
+        starts = self._offsets[index]
+        counts = self._offsets[index + 1] - starts
+
+        # Positions of all children of all codes in self._children
+        offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        children = self._children[np.arange(counts.sum()) + offsets]
+
+        return children, np.repeat(owners, counts)
+
+    def closure(self, ancestors: Iterable[int]) -> ClosureIndex:
+        """Index of every concept below a set of ancestors.
+
+        A concept below several ancestors is assigned to the nearest one, and at the
+        same distance to the ancestor that comes first in `ancestors`.
+
+        Args:
+            ancestors (Iterable[int]): SNOMED codes
+
+        Returns:
+            ClosureIndex: Nearest ancestor of each concept
+        """
+
+        ancestors = _as_int64(list(dict.fromkeys(ancestors)))
+        ancestors = ancestors[ancestors >= 0]
+
+        frontier = ancestors
+        owners = np.arange(len(ancestors))
+        seen = np.sort(ancestors)
+
+        codes, code_owners = [frontier], [owners]
+
+        while len(frontier):
+            children, child_owners = self._children_of(frontier, owners)
+
+            new = ~np.isin(children, seen)
+            children, child_owners = children[new], child_owners[new]
+
+            # Sorted by owner within each child so the first owner is kept
+            order = np.lexsort((child_owners, children))
+            frontier, first = np.unique(children[order], return_index=True)
+            owners = child_owners[order][first]
+
+            seen = np.union1d(seen, frontier)
+            codes.append(frontier)
+            code_owners.append(owners)
+
+        return ClosureIndex(
+            np.concatenate(codes), ancestors[np.concatenate(code_owners)]
+        )
+
+
+def read_rf2_relationships(path: str) -> Hierarchy:
+    """Read the active `Is a` relationships of an RF2 relationship snapshot file.
+
+    Args:
+        path (str): Tab separated RF2 file with `active`, `sourceId`, `destinationId`
+            and `typeId` columns
+
+    Returns:
+        Hierarchy: Children of each concept
+    """
+
+    rf2 = pd.read_csv(
+        path,
+        sep="\t",
+        usecols=["active", "sourceId", "destinationId", "typeId"],
+        dtype={
+            "active": np.int8,
+            "sourceId": np.int64,
+            "destinationId": np.int64,
+            "typeId": np.int64,
+        },
+    )
+
+    rf2 = rf2[(rf2.active == 1) & (rf2.typeId == is_a)]
+
+    return Hierarchy(rf2.sourceId.to_numpy(), rf2.destinationId.to_numpy())
+
+
+@lru_cache(maxsize=None)
+def _read_hierarchy(path: str) -> Hierarchy:
+    return read_rf2_relationships(path)
+
+
+def load_hierarchy(path: Optional[str] = None) -> Optional[Hierarchy]:
+    """Load the SNOMED CT hierarchy from an RF2 relationship snapshot.
+
+    Args:
+        path (str, optional): RF2 relationship snapshot file. Defaults to the file
+            in the `SNOMED_RELATIONSHIPS_PATH` environment variable.
+
+    Returns:
+        Hierarchy: Children of each concept, or None if no snapshot is set
+    """
+
+    if path is None:
+        load_dotenv(find_dotenv(usecwd=True))
+        path = os.environ.get(relationships_env_var)
+
+    return _read_hierarchy(path) if path else None
+
+
+def extend_map(mapping: Dict, hierarchy: Optional[Hierarchy] = None) -> Dict:
+    """Add the descendants of mapped codes to a map of SNOMED codes to categories.
+
+    Descendants take the category of their nearest mapped ancestor.
+    Codes in `mapping` keep their category.
+
+    Args:
+        mapping (Dict): Map of SNOMED codes to categories
+        hierarchy (Hierarchy, optional): Defaults to `load_hierarchy()`
+
+    Returns:
+        Dict: Map including descendants, or `mapping` if there is no hierarchy
+    """
+
+    if hierarchy is None:
+        hierarchy = load_hierarchy()
+
+    if hierarchy is None:
+        return mapping
+
+    index = hierarchy.closure(mapping)
+
+    # Codes may be read from a spreadsheet as floats
+    codes = _as_int64(list(mapping)).tolist()
+    categories = {code: category for code, category in zip(codes, mapping.values())}
+
+    extended = dict(mapping)
+    for code, ancestor in zip(index.codes.tolist(), index.ancestors.tolist()):
+        if code not in extended:
+            extended[code] = categories[ancestor]
+
+    return extended
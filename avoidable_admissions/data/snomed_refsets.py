@@ -0,0 +1,388 @@
+"""SNOMED CT refset members for several releases side by side.
+
+Codes join and leave refsets between releases of SNOMED CT. An attendance should be
+validated and mapped with the refsets in force on its activity date, otherwise codes
+added after the release in `nhsdd_snomed` are reported as not in the refset.
+
+The store holds the members of every refset as one sorted array of the codes that are
+a member in any release, with a bitmask per code of the releases it is a member of.
+The release of each row is found by binary search on its date, and membership is a
+binary search on the code and a bit test, so adding a release does not slow lookups.
+
+The members in `nhsdd_snomed` are the release of 2019-10-01 and are always included.
+To add releases, set the `SNOMED_REFSETS_PATH` environment variable, or in a `.env`
+file, to a directory of RF2 simple refset snapshot files from TRUD, such as
+`der2_Refset_SimpleSnapshot_GB1000000_20230412.txt`. The release date is taken from
+the end of the file name, and files with the same date are one release.
+Refsets that are not in a release keep their members from the previous release.
+"""
+
+import glob
+import hashlib
+import os
+import re
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pandera as pa
+from dotenv import find_dotenv, load_dotenv
+
+from avoidable_admissions.data import nhsdd_snomed
+
+#: Release of SNOMED-GB the members in `nhsdd_snomed` were taken from
+bundled_release = "2019-10-01"
+
+releases_env_var = "SNOMED_REFSETS_PATH"
+
+# The bitmask of each code has one bit per release
+max_releases = 64
+
+
+def _as_int64(values) -> np.ndarray:
+    # SNOMED codes as int64, and -1 for values that are not integers.
+    # Codes have up to 18 digits so objects and strings are not converted through
+    # float. Float columns are converted as they are, as they hold codes exactly
+    # only up to 2**53.
+
+    values = np.asarray(values)
+
+    if values.dtype.kind in "iu":
+        return values.astype(np.int64)
+
+    if values.dtype.kind == "f":
+        integers = np.isfinite(values) & (values == np.round(values))
+        integers &= np.abs(np.where(integers, values, 0)) < 2**63
+        return np.where(integers, values, -1).astype(np.int64)
+
+    # Objects and strings are parsed from their text, which is exact
+    codes = np.full(len(values), -1, dtype=np.int64)
+    for i, value in enumerate(values):
+        try:
+            code = Decimal(str(value).strip())
+        except InvalidOperation:
+            continue
+        if (
+            code.is_finite()
+            and code == code.to_integral_value()
+            and 0 <= code < 2**63
+        ):
+            codes[i] = int(code)
+
+    return codes
+
+
+class RefsetStore:
+    """Members of SNOMED CT refsets in several releases.
+
+    ## Example
+
+    ```python
+    store = RefsetStore()
+    store.add_release("2019-10-01", {"edacuity": [1064891000000107, 1064911000000105]})
+    store.add_release("2022-04-13", {"edacuity": [1064891000000107, 1077241000000103]})
+
+    release = store.release_index(df.edarrivaldatetime)
+    df["is_member"] = store.is_member("edacuity", df.edacuity, release)
+    ```
+    """
+
+    def __init__(self):
+        self.release_dates: List[pd.Timestamp] = []
+        self._codes: Dict[str, np.ndarray] = {}
+        self._masks: Dict[str, np.ndarray] = {}
+        self._sorted_dates = np.empty(0, dtype="datetime64[ns]")
+        self._sorted_releases = np.empty(0, dtype=np.int64)
+
+    @property
+    def n_releases(self) -> int:
+        return len(self.release_dates)
+
+    @property
+    def refsets(self) -> List[str]:
+        return list(self._codes)
+
+    def add_release(self, release_date, refsets: Dict[str, Iterable[int]]) -> int:
+        """Add the members of refsets in a release.
+
+        Refsets that are already in the store but not in `refsets` keep their members
+        from the release in force on `release_date`.
+
+        Args:
+            release_date (str | datetime): Effective date of the release
+            refsets (Dict[str, Iterable[int]]): Members of each refset by name e.g. `edacuity`
+
+        Returns:
+            int: Index of the release, as returned by `release_index`
+        """
+
+        release_date = pd.Timestamp(release_date)
+
+        if release_date in self.release_dates:
+            raise ValueError(f"Release {release_date.date()} is already in the store.")
+        if self.n_releases >= max_releases:
+            raise ValueError(f"The store holds up to {max_releases} releases.")
+
+        release = self.n_releases
+        bit = np.uint64(1) << np.uint64(release)
+
+        previous = (
+            self.release_index(pd.Series([release_date]))[0]
+            if self.n_releases
+            else None
+        )
+
+        for name in self.refsets:
+            if name not in refsets and previous is not None:
+                masks = self._masks[name]
+                is_member = (masks >> np.uint64(previous)) & np.uint64(1)
+                masks |= is_member << np.uint64(release)
+
+        for name, members in refsets.items():
+            members = np.unique(_as_int64(list(members)))
+            codes = self._codes.get(name, np.empty(0, dtype=np.int64))
+            masks = self._masks.get(name, np.empty(0, dtype=np.uint64))
+
+            union = np.union1d(codes, members)
+            union_masks = np.zeros(len(union), dtype=np.uint64)
+            union_masks[np.searchsorted(union, codes)] = masks
+            union_masks[np.searchsorted(union, members)] |= bit
+
+            self._codes[name] = union
+            self._masks[name] = union_masks
+
+        self.release_dates.append(release_date)
+
+        dates = np.array(self.release_dates, dtype="datetime64[ns]")
+        order = np.argsort(dates, kind="stable")
+        self._sorted_dates = dates[order]
+        self._sorted_releases = order.astype(np.int64)
+
+        return release
+
+    def fingerprint(self) -> str:
+        """Hash of the release dates and the members of every refset in each release.
+
+        Returns:
+            str: Hex digest
+        """
+
+        digest = hashlib.sha1(
+            ",".join(str(d.date()) for d in self.release_dates).encode()
+        )
+
+        for name in sorted(self.refsets):
+            digest.update(name.encode())
+            digest.update(self._codes[name].tobytes())
+            digest.update(self._masks[name].tobytes())
+
+        return digest.hexdigest()
+
+    def release_index(self, dates: pd.Series) -> np.ndarray:
+        """Release in force on each date.
+
+        Dates before the first release use the first release.
+        Missing dates use the latest release.
+
+        Args:
+            dates (pd.Series): Activity dates e.g. `edarrivaldatetime`
+
+        Returns:
+            np.ndarray: int64 index of the release for each date
+        """
+
+        dates = pd.Series(dates)
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, errors="coerce")
+        if getattr(dates.dt, "tz", None) is not None:
+            dates = dates.dt.tz_localize(None)
+
+        values = dates.to_numpy(dtype="datetime64[ns]")
+
+        positions = np.searchsorted(self._sorted_dates, values, side="right") - 1
+        positions = np.clip(positions, 0, None)
+        positions[np.isnat(values)] = self.n_releases - 1
+
+        return self._sorted_releases[positions]
+
+    def members(self, name: str, release: Optional[int] = None) -> np.ndarray:
+        """Sorted members of a refset.
+
+        Args:
+            name (str): Refset name e.g. `edacuity`
+            release (int, optional): Index of the release. Defaults to None which
+                returns codes that are a member in any release.
+
+        Returns:
+            np.ndarray: int64 codes
+        """
+
+        codes, masks = self._codes[name], self._masks[name]
+
+        if release is None:
+            return codes
+
+        return codes[(masks >> np.uint64(release)) & np.uint64(1) == 1]
+
+    def is_member(
+        self, name: str, codes: pd.Series, release: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Check whether codes are members of a refset in the release of each row.
+
+        Each distinct code is looked up once.
+
+        Args:
+            name (str): Refset name e.g. `edacuity`
+            codes (pd.Series): SNOMED codes
+            release (np.ndarray, optional): Release of each row from `release_index`.
+                Defaults to None which checks membership in any release.
+
+        Returns:
+            np.ndarray: True for members. False for other and missing codes.
+        """
+
+        refset_codes, refset_masks = self._codes[name], self._masks[name]
+
+        positions, uniques = pd.factorize(pd.Series(codes))
+        values = _as_int64(uniques)
+
+        index = np.searchsorted(refset_codes, values)
+        index = np.clip(index, 0, max(len(refset_codes) - 1, 0))
+
+        masks = np.zeros(len(values), dtype=np.uint64)
+        if len(refset_codes):
+            found = refset_codes[index] == values
+            masks[found] = refset_masks[index[found]]
+
+        # factorize sets missing values to -1 which picks 0 from the end
+        masks = np.append(masks, np.uint64(0))[positions]
+
+        if release is None:
+            return masks != 0
+
+        release = np.asarray(release).astype(np.uint64)
+
+        return (masks >> release) & np.uint64(1) == 1
+
+
+def _bundled_refsets() -> Dict[str, dict]:
+    return {
+        name: refset
+        for name, refset in vars(nhsdd_snomed).items()
+        if isinstance(refset, dict) and {"refset_id", "members"} <= set(refset)
+    }
+
+
+def read_rf2_refset(path: str, refset_ids: Dict[int, str]) -> Dict[str, np.ndarray]:
+    """Read the active members of refsets from an RF2 simple refset snapshot file.
+
+    Args:
+        path (str): Tab separated RF2 file with `active`, `refsetId` and
+            `referencedComponentId` columns
+        refset_ids (Dict[int, str]): Name of each refset to read by refset ID
+
+    Returns:
+        Dict[str, np.ndarray]: Members of each refset in the file
+    """
+
+    rf2 = pd.read_csv(
+        path,
+        sep="\t",
+        usecols=["active", "refsetId", "referencedComponentId"],
+        dtype={
+            "active": np.int8,
+            "refsetId": np.int64,
+            "referencedComponentId": np.int64,
+        },
+    )
+
+    rf2 = rf2[(rf2.active == 1) & rf2.refsetId.isin(list(refset_ids))]
+
+    return {
+        refset_ids[refset_id]: members.referencedComponentId.to_numpy()
+        for refset_id, members in rf2.groupby("refsetId")
+    }
+
+
+def _release_files(path: str) -> List[Tuple[pd.Timestamp, List[str]]]:
+    # RF2 files grouped by the release date at the end of their name
+
+    releases = {}
+    for file in sorted(glob.glob(os.path.join(path, "*.txt"))):
+        match = re.search(r"_(\d{8})\.txt$", file)
+        if match is None:
+            print(f"Skipping {file} as the release date is not in the file name.")
+            continue
+        releases.setdefault(pd.Timestamp(match.group(1)), []).append(file)
+
+    return sorted(releases.items())
+
+
+@lru_cache(maxsize=1)
+def load_store() -> RefsetStore:
+    """Load the bundled refsets and any releases in `SNOMED_REFSETS_PATH`.
+
+    Returns:
+        RefsetStore: Store with a release for the bundled refsets and each release date
+            of the RF2 files
+    """
+
+    bundled = _bundled_refsets()
+
+    store = RefsetStore()
+    store.add_release(
+        bundled_release, {name: refset["members"] for name, refset in bundled.items()}
+    )
+
+    load_dotenv(find_dotenv(usecwd=True))
+    path = os.environ.get(releases_env_var)
+
+    if path:
+        refset_ids = {refset["refset_id"]: name for name, refset in bundled.items()}
+
+        for release_date, files in _release_files(path):
+            refsets = {}
+            for file in files:
+                refsets.update(read_rf2_refset(file, refset_ids))
+            store.add_release(release_date, refsets)
+
+    return store
+
+
+def refset_check(
+    name: str, dates: Optional[pd.Series] = None, allow: Iterable = (0,)
+) -> pa.Check:
+    """Pandera check that codes are members of a refset.
+
+    Args:
+        name (str): Refset name e.g. `edcomorb`
+        dates (pd.Series, optional): Activity date of each row of the dataframe being
+            validated. Defaults to None which accepts members of any release.
+        allow (Iterable, optional): Other valid values. Defaults to 0 for missing codes.
+
+    Returns:
+        pa.Check: Check named `isin_refset`
+    """
+
+    store = load_store()
+    allow = list(allow)
+
+    release = (
+        None
+        if dates is None
+        else pd.Series(store.release_index(dates), index=dates.index)
+    )
+
+    def check(codes: pd.Series) -> pd.Series:
+        rows = None if release is None else release.reindex(codes.index).to_numpy()
+        is_member = store.is_member(name, codes, rows) | codes.isin(allow).to_numpy()
+        return pd.Series(is_member, index=codes.index)
+
+    return pa.Check(
+        check,
+        name="isin_refset",
+        error=f"isin_refset('{name}')",
+        statistics={"refset": name, "allow": allow},
+    )
@@ -0,0 +1,415 @@
+"""Synthetic extracts that pass validation, for training and for testing pipelines.
+
+Values are drawn from the reference data used by validation and feature engineering
+(`nhsdd`, `nhsdd_snomed` and `feature_maps`), with a few codes much more common
+than others as in real extracts. Repeating groups such as `diag_NN`, `opertn_NN`
+and `edinvest_NN` are filled from the first slot with a realistic number of
+codes per row, and operation dates fall within the admission.
+
+Every column is sampled for all rows at once with numpy, so that millions of rows
+are generated in seconds. A share of rows can be given an invalid value to test
+how a pipeline handles validation failures.
+"""
+
+from datetime import datetime
+from typing import Callable, Dict, Iterator, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from avoidable_admissions.data import nhsdd, nhsdd_snomed
+from avoidable_admissions.features import feature_maps
+
+# Common ICD-10 and OPCS-4 codes in addition to those in the feature mappings
+icd10_codes = ["I10X", "E119", "K529", "R69X", "A099", "N390", "I489", "E785", "R074"]
+opcs4_codes = ["W401", "H229", "K401", "O011", "Y534", "Z942", "X998", "-", "U051"]
+
+providers = {
+    "RXN": ["RXN01", "RXN02"],
+    "RXR": ["RXR10", "RXR20"],
+    "RTX": ["RTX01"],
+    "RBT": ["RBT20"],
+}
+
+#: Column and invalid value injected into admitted care data by default
+admitted_care_errors = {
+    "gender": "7",
+    "admiage": 17,
+    "diag_01": "QQQ",
+    "admitime": "25:99",
+}
+
+#: Column and invalid value injected into emergency care data by default
+emergency_care_errors = {
+    "gender": "7",
+    "activage": 17,
+    "edarrivalmode": 123,
+    "eddepttype": "9",
+}
+
+# Every minute of the day as HH:MM
+_times = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)], dtype=object)
+
+
+class _Codes:
+    # Codes with decreasing frequency so that a few codes are common.
+    # Sampling is a search of uniform random numbers in the cumulative weights.
+
+    def __init__(self, codes, dtype=object):
+        self.codes = np.asarray(list(dict.fromkeys(codes)), dtype=dtype)
+        weights = 1 / np.arange(1, len(self.codes) + 1)
+        self.cdf = np.cumsum(weights / weights.sum())
+
+    def sample(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        positions = np.searchsorted(self.cdf, rng.random(n), side="right")
+        return self.codes[np.minimum(positions, len(self.codes) - 1)]
+
+
+def _repeating_group(
+    rng: np.random.Generator, codes: _Codes, n_codes: np.ndarray, slots: int, missing
+) -> Dict[int, np.ndarray]:
+    # Slot i is filled for rows with more than i codes so that filled slots are contiguous.
+    # Only the filled rows of each slot are sampled.
+
+    n = len(n_codes)
+    dtype = codes.codes.dtype
+
+    columns = {}
+    for i in range(slots):
+        values = np.full(n, missing, dtype=dtype)
+        filled = np.flatnonzero(n_codes > i)
+        values[filled] = codes.sample(rng, len(filled))
+        columns[i + 1] = values
+
+    return columns
+
+
+def _dates(
+    rng: np.random.Generator,
+    n: int,
+    start_date: datetime,
+    end_date: datetime,
+    unit: str = "D",
+) -> np.ndarray:
+    start = np.datetime64(start_date, unit)
+    periods = int((np.datetime64(end_date, unit) - start).astype(np.int64))
+    offsets = rng.integers(0, max(periods, 1), n).astype(f"timedelta64[{unit}]")
+
+    return (start + offsets).astype("datetime64[ns]")
+
+
+def _inject_errors(
+    df: pd.DataFrame, error_rate: float, errors: dict, rng: np.random.Generator
+) -> None:
+    # Each selected row gets an invalid value in one randomly chosen column
+
+    columns = [col for col in errors if col in df.columns]
+
+    if not error_rate or not columns:
+        return
+
+    rows = np.flatnonzero(rng.random(len(df)) < error_rate)
+    chosen = rng.integers(0, len(columns), len(rows))
+
+    for i, col in enumerate(columns):
+        selected = rows[chosen == i]
+        if len(selected):
+            values = df[col].to_numpy(copy=True)
+            if isinstance(errors[col], str):
+                values = values.astype(object)
+            values[selected] = errors[col]
+            df[col] = values
+
+
+def _frame(columns: Dict[str, np.ndarray], offset: int, size: int) -> pd.DataFrame:
+    # Columns already have their final types. Passing them as Series skips type
+    # inference on object columns and copying them into a single block.
+
+    index = pd.RangeIndex(offset, offset + size)
+    series = {
+        col: pd.Series(values, index=index, dtype=values.dtype, copy=False)
+        for col, values in columns.items()
+    }
+
+    return pd.DataFrame(series, copy=False)
+
+
+def _generate(
+    build: Callable,
+    n: int,
+    chunksize: Optional[int],
+    seed: int,
+    error_rate: float,
+    errors: dict,
+    **kwargs,
+) -> Iterator[pd.DataFrame]:
+    # Each chunk has its own random generator derived from the seed so that
+    # the output is the same whether or not it is chunked into a single chunk.
+
+    seeds = np.random.SeedSequence(seed)
+    n_patients = max(1, n // 3)
+    chunksize = chunksize or max(n, 1)
+
+    for offset in range(0, max(n, 1), chunksize):
+        size = min(chunksize, n - offset)
+        rng = np.random.default_rng(seeds.spawn(1)[0])
+
+        df = build(rng, size, offset, n_patients, **kwargs)
+        _inject_errors(df, error_rate, errors, rng)
+
+        yield df
+
+
+def _providers(rng: np.random.Generator, size: int):
+    # Provider and one of its sites for each row
+
+    codes = _Codes(providers)
+    procodet = codes.sample(rng, size)
+
+    sites = np.array([s for p in codes.codes for s in providers[p]], dtype=object)
+    counts = np.array([len(providers[p]) for p in codes.codes])
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    provider = pd.Index(codes.codes).get_indexer(procodet)
+    site = starts[provider] + np.floor(rng.random(size) * counts[provider]).astype(int)
+
+    return procodet, sites[site]
+
+
+def _identifiers(rng: np.random.Generator, size: int, offset: int, n_patients: int):
+    # visit_id is unique across chunks. Patients have about three visits each.
+
+    return {
+        "visit_id": np.arange(offset, offset + size).astype(str).astype(object),
+        "patient_id": rng.integers(0, n_patients, size).astype(str).astype(object),
+    }
+
+
+def _admitted_care(
+    rng: np.random.Generator,
+    size: int,
+    offset: int,
+    n_patients: int,
+    start_date: datetime,
+    end_date: datetime,
+) -> pd.DataFrame:
+    procodet, sitetret = _providers(rng, size)
+
+    admidate = _dates(rng, size, start_date, end_date)
+    length_of_stay = rng.exponential(4, size).round()
+
+    columns = {
+        **_identifiers(rng, size, offset, n_patients),
+        "gender": _Codes(["2", "1", "9", "X"]).sample(rng, size),
+        "ethnos": _Codes(feature_maps.ethnos).sample(rng, size),
+        "procodet": procodet,
+        "sitetret": sitetret,
+        "townsend_score_quintile": rng.integers(0, 6, size),
+        "admimeth": _Codes(nhsdd.admimeth["mapping"]).sample(rng, size),
+        "admisorc": _Codes(feature_maps.admisorc).sample(rng, size),
+        "admidate": admidate,
+        "admitime": _times[rng.integers(0, 24 * 60, size)],
+        "disreadydays": rng.exponential(1, size).round(1),
+        "disdest": _Codes(feature_maps.disdest).sample(rng, size),
+        "dismeth": _Codes(feature_maps.dismeth).sample(rng, size),
+        "length_of_stay": length_of_stay,
+        "epiorder": np.ones(size, dtype=np.int64),
+        "admiage": rng.integers(18, 100, size),
+    }
+
+    diag_codes = _Codes(
+        [
+            *icd10_codes,
+            *feature_maps.admdiag_seasonal_3char,
+            *feature_maps.admdiag_seasonal_4char,
+            *feature_maps.load_apc_acsc_mapping(),
+        ]
+    )
+    n_diag = 1 + rng.poisson(3, size)
+    for i, values in _repeating_group(rng, diag_codes, n_diag, 20, None).items():
+        columns[f"diag_{i:02d}"] = values
+
+    n_opertn = rng.poisson(1, size)
+    procedures = _repeating_group(rng, _Codes(opcs4_codes), n_opertn, 12, None)
+    for i, values in procedures.items():
+        columns[f"opertn_{i:02d}"] = values
+
+    # Operations take place on a day within the stay
+    for i in procedures:
+        days = np.floor(rng.random(size) * (length_of_stay + 1)).astype(
+            "timedelta64[D]"
+        )
+        opdate = admidate + days
+        opdate[n_opertn < i] = np.datetime64("NaT")
+        columns[f"opdate_{i:02d}"] = opdate
+
+    return _frame(columns, offset, size)
+
+
+def _emergency_care(
+    rng: np.random.Generator,
+    size: int,
+    offset: int,
+    n_patients: int,
+    start_date: datetime,
+    end_date: datetime,
+) -> pd.DataFrame:
+    def snomed(refset: dict) -> np.ndarray:
+        return _Codes(refset["members"], dtype=np.int64).sample(rng, size)
+
+    procodet, edsitecode = _providers(rng, size)
+
+    columns = {
+        **_identifiers(rng, size, offset, n_patients),
+        "gender": _Codes(["2", "1", "9", "X"]).sample(rng, size),
+        "ethnos": _Codes(feature_maps.ethnos).sample(rng, size),
+        "townsend_score_quintile": rng.integers(0, 6, size),
+        "accommodationstatus": snomed(nhsdd_snomed.accommodationstatus),
+        "procodet": procodet,
+        "edsitecode": edsitecode,
+        "eddepttype": _Codes(nhsdd.eddepttype["mapping"]).sample(rng, size),
+        "edarrivalmode": snomed(nhsdd_snomed.edarrivalmode),
+        "edattendcat": _Codes(nhsdd.edattendcat["mapping"]).sample(rng, size),
+        "edattendsource": snomed(nhsdd_snomed.edattendsource),
+        "edarrivaldatetime": _dates(rng, size, start_date, end_date, unit="m"),
+        "activage": rng.integers(18, 100, size),
+        "edacuity": snomed(nhsdd_snomed.edacuity),
+        "edchiefcomplaint": snomed(nhsdd_snomed.edchiefcomplaint),
+        "edwaittime": rng.exponential(60, size).round(),
+        "timeined": rng.exponential(240, size).round(),
+        "edattenddispatch": snomed(nhsdd_snomed.edattenddispatch),
+        "edrefservice": snomed(nhsdd_snomed.edrefservice),
+        "disstatus": snomed(nhsdd_snomed.disstatus),
+    }
+
+    # Every diagnosis has a qualifier. Missing SNOMED codes are recorded as 0.
+    n_diag = 1 + rng.poisson(0.5, size)
+    groups = {
+        "edcomorb": (nhsdd_snomed.edcomorb, rng.poisson(1, size)),
+        "eddiag": (nhsdd_snomed.eddiag, n_diag),
+        "eddiagqual": (nhsdd_snomed.eddiagqual, n_diag),
+        "edinvest": (nhsdd_snomed.edinvest, rng.poisson(2, size)),
+        "edtreat": (nhsdd_snomed.edtreat, rng.poisson(1.5, size)),
+    }
+    for name, (refset, n_codes) in groups.items():
+        codes = _Codes(refset["members"], dtype=np.int64)
+        for i, values in _repeating_group(rng, codes, n_codes, 12, 0).items():
+            columns[f"{name}_{i:02d}"] = values
+
+    for i in range(1, 13):
+        columns[f"edentryseq_{i:02d}"] = np.full(size, i, dtype=np.int64)
+
+    return _frame(columns, offset, size)
+
+
+def generate_admitted_care(
+    n: int,
+    error_rate: float = 0.0,
+    errors: Optional[dict] = None,
+    chunksize: Optional[int] = None,
+    seed: int = 0,
+    start_date: datetime = datetime(2021, 11, 1),
+    end_date: datetime = datetime(2022, 11, 1),
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """Generate a synthetic admitted care extract that passes `AdmittedCareEpisodeSchema`.
+
+    Args:
+        n (int): Number of rows
+        error_rate (float, optional): Share of rows given one invalid value. Defaults to 0.
+        errors (dict, optional): Column and invalid value to choose from for each
+            failing row. Defaults to `admitted_care_errors`.
+        chunksize (int, optional): Return an iterator of dataframes with this many rows.
+            Defaults to None which returns a single dataframe.
+        seed (int, optional): Random seed. The same seed and `chunksize` give the same data.
+        start_date (datetime, optional): Earliest `admidate` (inclusive)
+        end_date (datetime, optional): Latest `admidate` (excluded)
+
+    Returns:
+        A dataframe, or an iterator of dataframes if `chunksize` is set.
+
+    ## Example
+
+    ```python
+    from avoidable_admissions.data.synthetic import generate_admitted_care
+
+    # Training extract with 1% of rows failing validation
+    df = generate_admitted_care(100_000, error_rate=0.01)
+
+    # Only invalid ages
+    df = generate_admitted_care(100_000, error_rate=0.01, errors={"admiage": 17})
+
+    # Ten million rows written a million at a time
+    for i, chunk in enumerate(generate_admitted_care(10_000_000, chunksize=1_000_000)):
+        chunk.to_parquet(f"admitted_care/part-{i:05d}.parquet")
+    ```
+    """
+
+    chunks = _generate(
+        _admitted_care,
+        n,
+        chunksize,
+        seed,
+        error_rate,
+        admitted_care_errors if errors is None else errors,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+    if chunksize:
+        return chunks
+
+    return next(chunks)
+
+
+def generate_emergency_care(
+    n: int,
+    error_rate: float = 0.0,
+    errors: Optional[dict] = None,
+    chunksize: Optional[int] = None,
+    seed: int = 0,
+    start_date: datetime = datetime(2021, 11, 1),
+    end_date: datetime = datetime(2022, 11, 1),
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """Generate a synthetic emergency care extract that passes `EmergencyCareEpisodeSchema`.
+
+    SNOMED codes are drawn from the reference sets used by validation. Empty slots
+    in repeating groups such as `edinvest_NN` are 0.
+
+    Args:
+        n (int): Number of rows
+        error_rate (float, optional): Share of rows given one invalid value. Defaults to 0.
+        errors (dict, optional): Column and invalid value to choose from for each
+            failing row. Defaults to `emergency_care_errors`.
+        chunksize (int, optional): Return an iterator of dataframes with this many rows.
+            Defaults to None which returns a single dataframe.
+        seed (int, optional): Random seed. The same seed and `chunksize` give the same data.
+        start_date (datetime, optional): Earliest `edarrivaldatetime` (inclusive)
+        end_date (datetime, optional): Latest `edarrivaldatetime` (excluded)
+
+    Returns:
+        A dataframe, or an iterator of dataframes if `chunksize` is set.
+
+    ## Example
+
+    ```python
+    from avoidable_admissions.data.synthetic import generate_emergency_care
+
+    df = generate_emergency_care(100_000, error_rate=0.01)
+    ```
+    """
+
+    chunks = _generate(
+        _emergency_care,
+        n,
+        chunksize,
+        seed,
+        error_rate,
+        emergency_care_errors if errors is None else errors,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+    if chunksize:
+        return chunks
+
+    return next(chunks)
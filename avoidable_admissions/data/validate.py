@@ -1,14 +1,17 @@
+import hashlib
+import re
 import warnings
 from datetime import datetime
-from typing import Tuple
+from typing import Iterable, Iterator, Tuple
 
 import numpy as np
 import pandas as pd
 import pandera as pa
 from pandera.typing import Series
 
-from avoidable_admissions.data import nhsdd, nhsdd_snomed
+from avoidable_admissions.data import icd10, nhsdd, opcs4, snomed_refsets
 from avoidable_admissions.features import feature_maps
+from avoidable_admissions.utils.instrumentation import instrumented
 
 
 class AdmittedCareEpisodeSchema(pa.SchemaModel):
@@ -22,6 +25,7 @@ class AdmittedCareEpisodeSchema(pa.SchemaModel):
     visit_id: Series[str] = pa.Field(nullable=False, unique=True, coerce=True)
 
     # Ensure this has been pseudonymised appropriately.
+    # See avoidable_admissions.data.pseudonymise
     patient_id: Series[str] = pa.Field(nullable=False, coerce=True)
 
     gender: Series[str] = pa.Field(
@@ -123,13 +127,13 @@ AdmittedCareEpisodeSchema: pa.DataFrameSchema = (
                 str,
                 nullable=True,
                 regex=True,
-                # Modified from https://medium.com/@manabu.torii/regex-pattern-for-icd-10-cm-codes-5763bd66e26d and includes string match for 'nan'
-                checks=pa.Check.str_matches(r'^(?i:[A-Z][0-9][0-9AB](?:[0-9A-KXZ](?:[0-9A-EXYZ](?:[0-9A-HX][0-59A-HJKMNP-S]?)?)?)?|^\bnan\b$)$')
+                checks=icd10.code_check(),
             ),
             "opertn_[0-9]{2}$": pa.Column(
                 str,
                 nullable=True,
                 regex=True,
+                checks=opcs4.code_check(),
             ),
             "opdate_[0-9]{2}$": pa.Column(
                 datetime,
@@ -164,19 +168,7 @@ AdmittedCareFeatureSchema: pa.DataFrameSchema = AdmittedCareEpisodeSchema.add_co
         ),
         "admidayofweek": pa.Column(
             nullable=True,
-            checks=[
-                pa.Check.isin(
-                    [
-                        "Monday",
-                        "Tuesday",
-                        "Wednesday",
-                        "Thursday",
-                        "Friday",
-                        "Saturday",
-                        "Sunday",
-                    ]
-                )
-            ],
+            checks=[pa.Check.isin(feature_maps.day_of_week_labels)],
         ),
         "diag_seasonal_cat": pa.Column(
             nullable=True,
@@ -205,10 +197,13 @@ AdmittedCareFeatureSchema: pa.DataFrameSchema = AdmittedCareEpisodeSchema.add_co
             ],
         ),
         "opertn_count": pa.Column(int, nullable=False, checks=[pa.Check.ge(0)]),
-        "opertn_cat": pa.Column(str, nullable=False, checks=[pa.Check.isin(['Yes', 'No', 'Missing'])]),
-        
+        "opertn_cat": pa.Column(
+            str, nullable=False, checks=[pa.Check.isin(["Yes", "No", "Missing"])]
+        ),
         "comorb_count": pa.Column(int, nullable=False, checks=[pa.Check.ge(0)]),
-        "comorb_cat": pa.Column(str, nullable=False, checks=[pa.Check.isin(['Yes', 'No', 'Missing'])]),           
+        "comorb_cat": pa.Column(
+            str, nullable=False, checks=[pa.Check.isin(["Yes", "No", "Missing"])]
+        ),
     }
 )
 
@@ -302,7 +297,6 @@ class EmergencyCareEpisodeSchema(pa.SchemaModel):
     )
     edchiefcomplaint: Series[np.int64] = pa.Field(
         description="https://www.datadictionary.nhs.uk/data_elements/emergency_care_chief_complaint__snomed_ct_.html",
-        isin=[0, *nhsdd_snomed.edchiefcomplaint["members"]],
         nullable=True,
     )
     edwaittime: Series[float] = pa.Field(
@@ -350,12 +344,7 @@ EmergencyCareEpisodeSchema: pa.DataFrameSchema = EmergencyCareEpisodeSchema.to_s
             nullable=True,
             regex=True,
             coerce=True,
-            checks=[
-                pa.Check.isin(
-                    set([0, *nhsdd_snomed.edcomorb["members"]]),
-                    ignore_na=True,
-                )
-            ],
+            checks=[snomed_refsets.refset_check("edcomorb")],
         ),
         "eddiag_[0-9]{2}$": pa.Column(
             description="https://www.datadictionary.nhs.uk/data_elements/emergency_care_diagnosis__snomed_ct_.html",
@@ -363,12 +352,7 @@ EmergencyCareEpisodeSchema: pa.DataFrameSchema = EmergencyCareEpisodeSchema.to_s
             nullable=True,
             regex=True,
             coerce=True,
-            checks=[
-                pa.Check.isin(
-                    set([0, *nhsdd_snomed.eddiag["members"]]),
-                    ignore_na=True,
-                )
-            ],
+            checks=[snomed_refsets.refset_check("eddiag")],
         ),
         "edentryseq_[0-9]{2}$": pa.Column(
             description="https://www.datadictionary.nhs.uk/data_elements/coded_clinical_entry_sequence_number.html",
@@ -391,13 +375,7 @@ EmergencyCareEpisodeSchema: pa.DataFrameSchema = EmergencyCareEpisodeSchema.to_s
             nullable=True,
             regex=True,
             coerce=True,
-            checks=[
-                # TODO: Does this need to test against featuremaps?
-                pa.Check.isin(
-                    set([0, *nhsdd_snomed.edinvest["members"]]),
-                    ignore_na=True,
-                )
-            ],
+            checks=[snomed_refsets.refset_check("edinvest")],
         ),
         "edtreat_[0-9]{2}$": pa.Column(
             description="https://www.datadictionary.nhs.uk/data_elements/emergency_care_procedure__snomed_ct_.html",
@@ -405,17 +383,17 @@ EmergencyCareEpisodeSchema: pa.DataFrameSchema = EmergencyCareEpisodeSchema.to_s
             nullable=True,
             regex=True,
             coerce=True,
-            checks=[
-                # TODO: Does this need to test against featuremaps?
-                pa.Check.isin(
-                    set([0, *nhsdd_snomed.edtreat["members"]]),
-                    ignore_na=True,
-                )
-            ],
+            checks=[snomed_refsets.refset_check("edtreat")],
         ),
     }
 )
 
+# Members of the refset in the release in force on the arrival date of each row.
+# See _refset_props.
+EmergencyCareEpisodeSchema = EmergencyCareEpisodeSchema.update_columns(
+    {"edchiefcomplaint": {"checks": [snomed_refsets.refset_check("edchiefcomplaint")]}}
+)
+
 # Picks up columns not in schema
 EmergencyCareEpisodeSchema.strict = True
 
@@ -438,19 +416,7 @@ EmergencyCareFeatureSchema: pa.DataFrameSchema = EmergencyCareEpisodeSchema.add_
         "edarrival_dayofweek": pa.Column(
             str,
             nullable=True,
-            checks=[
-                pa.Check.isin(
-                    [
-                        "Monday",
-                        "Tuesday",
-                        "Wednesday",
-                        "Thursday",
-                        "Friday",
-                        "Saturday",
-                        "Sunday",
-                    ]
-                )
-            ],
+            checks=[pa.Check.isin(feature_maps.day_of_week_labels)],
         ),
         "edarrival_hourofday": pa.Column(
             int, nullable=True, checks=[pa.Check.ge(0), pa.Check.le(23)]
@@ -458,17 +424,17 @@ EmergencyCareFeatureSchema: pa.DataFrameSchema = EmergencyCareEpisodeSchema.add_
         "accommodationstatus_cat": pa.Column(
             str,
             nullable=True,
-            checks=[pa.Check.isin(set(feature_maps.accommodationstatus.values()))],
+            checks=[pa.Check.isin(feature_maps.accommodationstatus.categories())],
         ),
         "edarrivalmode_cat": pa.Column(
             str,
             nullable=True,
-            checks=[pa.Check.isin(set(feature_maps.edarrivalmode.values()))],
+            checks=[pa.Check.isin(feature_maps.edarrivalmode.categories())],
         ),
         "edattendsource_cat": pa.Column(
             str,
             nullable=True,
-            checks=[pa.Check.isin(set(feature_maps.edattendsource.values()))],
+            checks=[pa.Check.isin(feature_maps.edattendsource.categories())],
         ),
         "edacuity_cat": pa.Column(
             str,
@@ -478,7 +444,7 @@ EmergencyCareFeatureSchema: pa.DataFrameSchema = EmergencyCareEpisodeSchema.add_
         "disstatus_cat": pa.Column(
             str,
             nullable=True,
-            checks=[pa.Check.isin(set(feature_maps.disstatus.values()))],
+            checks=[pa.Check.isin(feature_maps.disstatus.categories())],
         ),
         # Ensures at least _01 is present
         "edinvest_01_cat": pa.Column(str, nullable=True),
@@ -486,19 +452,19 @@ EmergencyCareFeatureSchema: pa.DataFrameSchema = EmergencyCareEpisodeSchema.add_
         "edinvest_[0-9]{2}_cat": pa.Column(
             str,
             nullable=True,
-            checks=[pa.Check.isin(set(feature_maps.edinvest.values()))],
+            checks=[pa.Check.isin(feature_maps.edinvest.categories())],
             regex=True,
         ),
         "edtreat_[0-9]{2}_cat": pa.Column(
             str,
             nullable=True,
-            checks=[pa.Check.isin(set(feature_maps.edtreat.values()))],
+            checks=[pa.Check.isin(feature_maps.edtreat.categories())],
             regex=True,
         ),
         "eddiag_seasonal_cat": pa.Column(
             str,
             nullable=True,
-            checks=[pa.Check.isin(set(feature_maps.eddiag_seasonal.values()))],
+            checks=[pa.Check.isin(feature_maps.eddiag_seasonal.categories())],
         ),
         "eddiagqual_01_cat": pa.Column(
             str,
@@ -508,12 +474,12 @@ EmergencyCareFeatureSchema: pa.DataFrameSchema = EmergencyCareEpisodeSchema.add_
         "edattenddispatch_cat": pa.Column(
             str,
             nullable=True,
-            checks=[pa.Check.isin(set(feature_maps.edattenddispatch.values()))],
+            checks=[pa.Check.isin(feature_maps.edattenddispatch.categories())],
         ),
         "edrefservice_cat": pa.Column(
             str,
             nullable=True,
-            checks=[pa.Check.isin(set(feature_maps.edrefservice.values()))],
+            checks=[pa.Check.isin(feature_maps.edrefservice.categories())],
         ),
         "eddiag_01_acsc": pa.Column(
             # nullable=True,
@@ -524,6 +490,10 @@ EmergencyCareFeatureSchema: pa.DataFrameSchema = EmergencyCareEpisodeSchema.add_
                 )
             ],
         ),
+        "edcomorb_count": pa.Column(int, nullable=False, checks=[pa.Check.ge(0)]),
+        "edcomorb_cat": pa.Column(
+            str, nullable=False, checks=[pa.Check.isin(["Yes", "No", "Missing"])]
+        ),
         "edchiefcomplaint_cat": pa.Column(
             # nullable=True,
             checks=[
@@ -540,6 +510,67 @@ EmergencyCareFeatureSchema: pa.DataFrameSchema = EmergencyCareEpisodeSchema.add_
 EmergencyCareFeatureSchema.strict = True
 
 
+def _column_props(schema: pa.DataFrameSchema, **kwargs) -> dict:
+    # Column properties to update from the study dates, ignore_cols and update_cols
+    # keyword arguments of validate_dataframe. Shared with the Polars backend.
+
+    start_date = kwargs.get("start_date", datetime(2021, 11, 1))
+    end_date = kwargs.get("end_date", datetime(2022, 11, 1))
+
+    date_checks = [
+        pa.Check.ge(start_date),
+        pa.Check.lt(end_date),
+    ]
+
+    if schema.name.startswith("AdmittedCare"):
+        cohort_date_col = "admidate"
+    elif schema.name.startswith("EmergencyCare"):
+        cohort_date_col = "edarrivaldatetime"
+
+    updated_column_props = {}
+
+    updated_column_props[cohort_date_col] = {"checks": date_checks}
+
+    # New feature - allow user to ignore checks on some columns
+    ignore_cols = kwargs.get("ignore_cols", [])
+
+    update_cols = kwargs.get("update_cols", {})
+
+    blank_props = {
+        "dtype": None,
+        "checks": [],
+        "nullable": False,
+        "unique": False,
+        "coerce": False,
+        "required": True,
+    }
+
+    for col in ignore_cols:
+        updated_column_props[col] = blank_props
+
+    updated_column_props.update(update_cols)
+
+    return updated_column_props
+
+
+def _is_dask_dataframe(df) -> bool:
+    # Checked by module name so that dask is only imported if it is used
+
+    return type(df).__module__.split(".")[0] == "dask" and hasattr(df, "npartitions")
+
+
+def _schema_label(df: pd.DataFrame, schema: pa.DataFrameSchema, **kwargs) -> str:
+    # Feature schemas share the name of their Episode schema so look them up by identity
+
+    schemas = {
+        id(AdmittedCareFeatureSchema): "AdmittedCareFeatureSchema",
+        id(EmergencyCareFeatureSchema): "EmergencyCareFeatureSchema",
+    }
+
+    return schemas.get(id(schema), schema.name)
+
+
+@instrumented(detail=_schema_label)
 def validate_dataframe(
     df: pd.DataFrame, schema: pa.DataFrameSchema, **kwargs
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
@@ -576,6 +607,10 @@ def validate_dataframe(
         end_date (datetime): Study end date (excluded)
         ignore_cols (list): Columns to ignore during validation checks.
         update_cols (dict[str:dict]): Dictionary of column:properties to update schema.
+        validation_token (str): Token from a previous validation against the matching
+            Episode schema. Only used with Feature schema. See _Delta validation_ below.
+        error_sink (ErrorSink): Write failure cases to a file instead of returning them.
+            See _Error sink_ below.
 
     Returns:
         _Good_ and _Bad_ dataframes. See example below.
@@ -678,55 +713,117 @@ def validate_dataframe(
     )
     ```
 
+    ### SNOMED refset releases
 
-    """
+    Codes in `edchiefcomplaint`, `edcomorb_NN`, `eddiag_NN`, `edinvest_NN` and
+    `edtreat_NN` are checked against the members of the refset in the SNOMED CT
+    release in force on the `edarrivaldatetime` of each row. Only the 2019-10-01
+    release is bundled. See [avoidable_admissions.data.snomed_refsets][] to add
+    later releases.
 
-    df_errors = pd.DataFrame()
+    ### Delta validation of feature columns
 
-    # todo: document this behaviour to warn user that index will be dropped.
-    # alternatively find a way to set a unique key for each row - important for merging errors
-    df = df.copy().reset_index(drop=True)
+    `AdmittedCareFeatureSchema` and `EmergencyCareFeatureSchema` include every
+    rule from the corresponding Episode schema. Re-running these on data that
+    has already passed the first validation step is slow, especially the
+    ICD-10 regex and SNOMED refset checks.
 
-    start_date = kwargs.get("start_date", datetime(2021, 11, 1))
-    end_date = kwargs.get("end_date", datetime(2022, 11, 1))
+    Every _good_ dataframe returned by this function carries a validation token in
+    `good.attrs["validation_token"]`. Passing this token back as `validation_token`
+    when validating the output of feature engineering will check the generated
+    feature columns only. The Episode columns are still required to be present
+    but their values are not checked again.
 
-    date_checks = [
-        pa.Check.ge(start_date),
-        pa.Check.lt(end_date),
-    ]
+    The token is a fingerprint of the dataset type and the values of the Episode
+    columns of the validated rows. If any Episode value has changed since, or rows
+    have been added or removed, the token does not match the dataframe being
+    validated. A message is printed and the full schema is used instead.
 
-    if schema.name.startswith("AdmittedCare"):
-        cohort_date_col = "admidate"
-    elif schema.name.startswith("EmergencyCare"):
-        cohort_date_col = "edarrivaldatetime"
+    ```python
+    good, bad = validate_dataframe(df, AdmittedCareEpisodeSchema)
 
-    updated_column_props = {}
+    df_features = build_admitted_care_features(good)
 
-    updated_column_props[cohort_date_col] = {"checks": date_checks}
+    good_f, bad_f = validate_dataframe(
+        df_features,
+        AdmittedCareFeatureSchema,
+        validation_token=good.attrs["validation_token"],
+    )
+    ```
 
-    # New feature - allow user to ignore checks on some columns
-    ignore_cols = kwargs.get("ignore_cols", [])
+    ### Arrow strings
 
-    update_cols = kwargs.get("update_cols", {})
+    String columns may be held as `string[pyarrow]`, for instance by reading data with
+    `read_dataset(..., string_storage="pyarrow")`. This uses much less memory than Python
+    strings for code columns such as `diag_NN`, `opertn_NN` and `patient_id`.
+    These columns are validated against the same rules with identical results.
 
-    blank_props = {
-        "dtype": None,
-        "checks": [],
-        "nullable": False,
-        "unique": False,
-        "coerce": False,
-        "required": True,
-    }
+    ### Error sink
 
-    for col in ignore_cols:
-        updated_column_props[col] = blank_props
+    On poor quality data the _bad_ dataframe can be larger than the _good_ one.
+    Pass an error sink to append failure cases to a Parquet, CSV or JSONL file instead.
+    The second dataframe returned is then a count of failure cases by column and check.
 
-    updated_column_props.update(update_cols)
+    ```python
+    from avoidable_admissions.data.error_sink import error_sink
+
+    with error_sink("../data/interim/admitted_care_errors.parquet") as sink:
+        good, counts = validate_dataframe(df, AdmittedCareEpisodeSchema, error_sink=sink)
+    ```
+
+    ### Dask dataframes
+
+    A partitioned Dask dataframe is validated one partition at a time with the same
+    rules, and lazy _good_ and _bad_ Dask dataframes are returned.
+    Uniqueness checks apply across all partitions.
+    See [avoidable_admissions.data.validate_dask.validate_dataframe][].
+
+    ```python
+    import dask
+    import dask.dataframe as dd
+
+    df = dd.read_parquet("../data/interim/admitted_care/*.parquet")
+    good, bad = validate_dataframe(df, AdmittedCareEpisodeSchema)
+
+    with dask.config.set(scheduler="processes"):
+        good, bad = dask.persist(good, bad)
+    ```
+
+    See [avoidable_admissions.data.validate.validate_chunks][] to validate large extracts.
+    """
+
+    if _is_dask_dataframe(df):
+        from avoidable_admissions.data import validate_dask
+
+        return validate_dask.validate_dataframe(df, schema, **kwargs)
+
+    df_errors = pd.DataFrame()
+
+    # todo: document this behaviour to warn user that index will be dropped.
+    # alternatively find a way to set a unique key for each row - important for merging errors
+    # reset_index returns a new dataframe so the input is never modified
+    df = df.reset_index(drop=True)
+
+    updated_column_props = _column_props(schema, **kwargs)
+
+    # Columns held as Arrow strings keep their dtype unless the user has changed it
+    for col, props in _arrow_string_props(df, schema).items():
+        updated_column_props[col] = {**props, **updated_column_props.get(col, {})}
+
+    # SNOMED codes are checked against the refset release of each row unless the
+    # user has changed the checks
+    for col, props in _refset_props(df, schema).items():
+        updated_column_props[col] = {**props, **updated_column_props.get(col, {})}
 
     # If a column in ignore_cols is not present in schema, this will raise
     # a SchemaInitError with name of column causing the error.
     schema = schema.update_columns(updated_column_props)
 
+    validation_token = kwargs.get("validation_token")
+
+    if validation_token is not None:
+        schema = _delta_schema(df, schema, validation_token)
+
     try:
         # Capture all errors
         # https://pandera.readthedocs.io/en/stable/lazy_validation.html
@@ -767,9 +864,233 @@ def validate_dataframe(
         df_errors = df.copy()
 
     finally:
+        df.attrs["validation_token"] = get_validation_token(df, schema)
+
+        error_sink = kwargs.get("error_sink")
+        if error_sink is not None:
+            # Only counts of failure cases are kept in memory
+            df_errors = error_sink.write(df_errors)
+
         return df, df_errors
 
 
+def validate_chunks(
+    chunks: Iterable[pd.DataFrame], schema: pa.DataFrameSchema, error_sink, **kwargs
+) -> Iterator[pd.DataFrame]:
+    """Validate an extract chunk by chunk, writing failure cases of every chunk to an error sink.
+
+    Memory use is bounded by the chunk size regardless of how much of the data fails validation.
+    Use [avoidable_admissions.data.make_dataset.read_dataset][] with `chunksize`
+    to read the chunks.
+
+    Uniqueness checks such as on `visit_id` apply within each chunk only.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): Chunks of the extract
+        schema (pa.DataFrameSchema): Pandera schema to validate against
+        error_sink (ErrorSink): Sink from [avoidable_admissions.data.error_sink.error_sink][]
+        kwargs: Passed to [avoidable_admissions.data.validate.validate_dataframe][]
+
+    Yields:
+        _Good_ rows of each chunk
+
+    ## Example
+
+    ```python
+    from avoidable_admissions.data.error_sink import error_sink
+    from avoidable_admissions.data.make_dataset import read_dataset
+
+    chunks = read_dataset(
+        "../data/raw/admitted_care.csv", AdmittedCareEpisodeSchema, chunksize=500_000
+    )
+
+    with error_sink("../data/interim/admitted_care_errors.parquet") as sink:
+        good = pd.concat(validate_chunks(chunks, AdmittedCareEpisodeSchema, sink))
+
+    print(sink.summary())
+    ```
+    """
+
+    for chunk in chunks:
+        good, _ = validate_dataframe(chunk, schema, error_sink=error_sink, **kwargs)
+        yield good
+
+
+def _schema_column_matches(key: str, column: pa.Column, columns: pd.Index) -> list:
+    # Dataframe columns validated by a schema column. Regex keys may match several.
+
+    if column.regex:
+        return list(columns[columns.str.match(key)])
+
+    return [key] if key in columns else []
+
+
+def _arrow_check(check: pa.Check) -> pa.Check:
+    # pandera passes a compiled regex to Series.str.match which Arrow strings do not accept.
+    # Apply the same pattern as a string. All other checks work unchanged on Arrow strings.
+
+    if check.name != "str_matches":
+        return check
+
+    pattern = check.statistics["pattern"]
+    pattern = getattr(pattern, "pattern", pattern)
+
+    return pa.Check(
+        lambda s: s.str.match(pattern, na=False),
+        name=check.name,
+        error=check.error,
+        ignore_na=check.ignore_na,
+    )
+
+
+def _arrow_string_props(df: pd.DataFrame, schema: pa.DataFrameSchema) -> dict:
+    # Schema column properties to validate `string[pyarrow]` columns with identical rules
+
+    props = {}
+
+    for key, column in schema.columns.items():
+        if str(column.dtype) != "str":
+            continue
+
+        dtypes = {df[c].dtype for c in _schema_column_matches(key, column, df.columns)}
+
+        if len(dtypes) != 1:
+            continue
+
+        dtype = dtypes.pop()
+
+        if isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow":
+            props[key] = {
+                "dtype": dtype,
+                "checks": [_arrow_check(c) for c in column.checks],
+            }
+
+    return props
+
+
+def _refset_props(df: pd.DataFrame, schema: pa.DataFrameSchema) -> dict:
+    # Schema column properties to check SNOMED codes against the refset release in
+    # force on the arrival date of each row. Without dates, codes in any release pass.
+
+    if "edarrivaldatetime" not in df.columns:
+        return {}
+
+    # Parsed once for all refset columns
+    dates = df.edarrivaldatetime
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, errors="coerce")
+
+    props = {}
+
+    for key, column in schema.columns.items():
+        if not any(c.name == "isin_refset" for c in column.checks):
+            continue
+
+        props[key] = {
+            "checks": [
+                snomed_refsets.refset_check(
+                    c.statistics["refset"], dates, c.statistics["allow"]
+                )
+                if c.name == "isin_refset"
+                else c
+                for c in column.checks
+            ]
+        }
+
+    return props
+
+
+def _episode_schema(schema: pa.DataFrameSchema) -> pa.DataFrameSchema:
+    # Feature schema are built with `add_columns` and keep the Episode schema name
+
+    if schema.name.startswith("AdmittedCare"):
+        return AdmittedCareEpisodeSchema
+    elif schema.name.startswith("EmergencyCare"):
+        return EmergencyCareEpisodeSchema
+
+
+def _episode_columns(columns: Iterable[str], schema: pa.DataFrameSchema) -> list:
+    # Columns of a dataframe that are in the Episode schema, including regex columns
+    # e.g. diag_01 for diag_[0-9]{2}$
+
+    episode_schema = _episode_schema(schema)
+
+    return sorted(
+        col
+        for col in columns
+        if any(
+            re.match(key, col) if column.regex else key == col
+            for key, column in episode_schema.columns.items()
+        )
+    )
+
+
+def get_validation_token(df: pd.DataFrame, schema: pa.DataFrameSchema) -> str:
+    """Fingerprint of the Episode column values of a dataframe that has been validated
+    against a schema.
+
+    This is set in `good.attrs["validation_token"]` by
+    [avoidable_admissions.data.validate.validate_dataframe][]
+    and can be passed back as `validation_token` to skip Episode checks when
+    validating features.
+
+    Args:
+        df (pd.DataFrame): Dataframe that has passed validation
+        schema (pa.DataFrameSchema): Schema used for validation
+
+    Returns:
+        str: Hex digest identifying the dataset type and the validated values of
+            every Episode column.
+    """
+
+    token = hashlib.sha1(_episode_schema(schema).name.encode())
+    token.update(str(len(df)).encode())
+
+    columns = _episode_columns(df.columns, schema)
+    token.update(",".join(columns).encode())
+
+    if columns:
+        values = pd.util.hash_pandas_object(df[columns], index=False)
+        token.update(values.values.tobytes())
+
+    return token.hexdigest()
+
+
+def _delta_schema(
+    df: pd.DataFrame, schema: pa.DataFrameSchema, validation_token: str
+) -> pa.DataFrameSchema:
+    # Turn off all checks on Episode columns if the caller has a matching token.
+    # Episode columns remain required so missing or additional columns are still reported.
+
+    episode_schema = _episode_schema(schema)
+
+    derived_cols = set(schema.columns) - set(episode_schema.columns)
+
+    if not derived_cols:
+        # This is an Episode schema. Nothing to skip.
+        return schema
+
+    if validation_token != get_validation_token(df, schema):
+        print(
+            "Validation token does not match this dataframe. "
+            "All columns will be validated."
+        )
+        return schema
+
+    presence_only_props = {
+        "dtype": None,
+        "checks": [],
+        "nullable": True,
+        "unique": False,
+        "coerce": False,
+        "required": True,
+    }
+
+    return schema.update_columns(
+        {col: presence_only_props for col in episode_schema.columns}
+    )
+
+
 def validate_admitted_care_data(
     df: pd.DataFrame, **kwargs
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
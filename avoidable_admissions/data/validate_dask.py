@@ -0,0 +1,191 @@
+"""Validate partitioned Dask dataframes.
+
+[avoidable_admissions.data.validate.validate_dataframe][] passes Dask dataframes
+to this module. Each partition is validated with the pandas function, so the rules
+are identical, and only a few partitions are held in memory at a time.
+
+Uniqueness checks such as on `visit_id` are applied across all partitions.
+The study date window is a check on each row, so it is the same for every partition.
+
+Requires `dask`. Install with `pip install avoidable_admissions[dask]`.
+"""
+
+import contextlib
+import io
+from typing import Dict, List, Tuple
+
+import pandas as pd
+import pandera as pa
+
+try:
+    import dask
+    import dask.dataframe as dd
+except ImportError as ex:
+    raise ImportError(
+        "Dask dataframes require dask. "
+        "Install with `pip install avoidable_admissions[dask]`."
+    ) from ex
+
+from avoidable_admissions.data import validate
+
+failure_columns = [
+    "schema_context",
+    "column",
+    "check",
+    "check_number",
+    "failure_case",
+    "index",
+]
+
+
+def _unique_columns(
+    schema: pa.DataFrameSchema, columns: pd.Index, **kwargs
+) -> Dict[str, List[str]]:
+    # Dataframe columns that must be unique once the user's column updates are applied,
+    # by schema column
+
+    schema = schema.update_columns(validate._column_props(schema, **kwargs))
+
+    return {
+        key: validate._schema_column_matches(key, column, columns)
+        for key, column in schema.columns.items()
+        if column.unique
+    }
+
+
+def _duplicate_failures(
+    part: pd.DataFrame, duplicates: Dict[str, pd.Index]
+) -> pd.DataFrame:
+    # Failure cases for values that appear more than once in the whole dataframe,
+    # in the format of pandera failure cases
+
+    failures = []
+
+    for col, values in duplicates.items():
+        failed = part[col][part[col].isin(values)]
+        failures.append(
+            pd.DataFrame(
+                {
+                    "schema_context": "Column",
+                    "column": col,
+                    "check": "field_uniqueness",
+                    "check_number": None,
+                    "failure_case": failed.values,
+                    "index": failed.index,
+                }
+            )
+        )
+
+    return pd.concat(failures, ignore_index=True)
+
+
+def _validate_partition(
+    part: pd.DataFrame,
+    duplicates: Dict[str, pd.Series],
+    schema: pa.DataFrameSchema,
+    partition: int,
+    kwargs: dict,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # Validate one partition with the pandas function, then apply the uniqueness
+    # checks with the duplicate values found across all partitions
+
+    duplicates = {col: counts.index for col, counts in duplicates.items()}
+
+    # validate_dataframe numbers rows from 0, so keep the labels to restore them
+    labels = part.index
+    part = part.reset_index(drop=True)
+
+    # Each partition prints its own summary which is not useful with many partitions
+    with contextlib.redirect_stdout(io.StringIO()):
+        good, bad = validate.validate_dataframe(part, schema, **kwargs)
+
+    if duplicates:
+        failures = _duplicate_failures(part, duplicates)
+        if not failures.empty:
+            failures = part.merge(
+                failures, how="right", left_index=True, right_on="index"
+            )
+            bad = pd.concat([bad, failures], ignore_index=True)
+            good = good[~good.index.isin(failures["index"])]
+
+    bad = bad.reindex(columns=[*part.columns, *failure_columns])
+
+    if partition > 0:
+        # Column errors are the same in every partition so are kept from the first one
+        bad = bad[bad["index"].notna()]
+
+    bad = bad.reset_index(drop=True)
+    bad[failure_columns] = bad[failure_columns].astype(object)
+    rows = bad["index"].notna()
+    bad.loc[rows, "index"] = labels[bad.loc[rows, "index"].astype(int)]
+
+    good.index = labels[good.index]
+    good.attrs.clear()
+
+    return good, bad
+
+
+def validate_dataframe(
+    df: "dd.DataFrame", schema: pa.DataFrameSchema, **kwargs
+) -> Tuple["dd.DataFrame", "dd.DataFrame"]:
+    """Validate a Dask dataframe partition by partition.
+
+    Called by [avoidable_admissions.data.validate.validate_dataframe][] for Dask
+    dataframes, and supports the same `start_date`, `end_date`, `ignore_cols` and
+    `update_cols` keyword arguments. `validation_token` and `error_sink` are not supported.
+
+    Values of unique columns are counted across all partitions first, so duplicate
+    `visit_id`s fail validation even if they are in different partitions.
+    Summaries of failure cases are not printed. Use the _bad_ dataframe instead.
+
+    Args:
+        df (dd.DataFrame): Data to validate
+        schema (pa.DataFrameSchema): Pandera schema to validate against
+        kwargs: See [avoidable_admissions.data.validate.validate_dataframe][]
+
+    Returns:
+        Lazy _good_ and _bad_ Dask dataframes. Rows keep their index in `df` and the
+            `index` column of _bad_ is the index of the failing row. Compute both
+            together, for instance with `dask.compute(good, bad)` or `dask.persist`,
+            so that each partition is read and validated only once.
+    """
+
+    unsupported = {"validation_token", "error_sink"} & set(kwargs)
+    if unsupported:
+        raise ValueError(
+            f"{sorted(unsupported)} not supported for Dask dataframes. "
+            "Validate each partition with pandas to use these."
+        )
+
+    unique = _unique_columns(schema, df.columns, **kwargs)
+
+    # Partitions are validated without uniqueness checks which are applied across
+    # all partitions with the counts of each value instead
+    update_cols = dict(kwargs.get("update_cols", {}))
+    for key in unique:
+        update_cols[key] = {**update_cols.get(key, {}), "unique": False}
+    kwargs = {**kwargs, "update_cols": update_cols}
+
+    # Only values counted more than once are sent to each partition, rather than
+    # one count per row of the whole dataset for visit_id
+    duplicates = {}
+    for columns in unique.values():
+        for col in columns:
+            counts = df[col].value_counts(dropna=True)
+            duplicates[col] = counts[counts > 1]
+
+    parts = df.to_delayed()
+    results = [
+        dask.delayed(_validate_partition, nout=2)(part, duplicates, schema, i, kwargs)
+        for i, part in enumerate(parts)
+    ]
+
+    good_meta = df._meta
+    bad_meta = pd.DataFrame(columns=[*df.columns, *failure_columns]).astype(
+        {**df.dtypes.to_dict(), **{col: object for col in failure_columns}}
+    )
+
+    good = dd.from_delayed([g for g, _ in results], meta=good_meta, verify_meta=False)
+    bad = dd.from_delayed([b for _, b in results], meta=bad_meta, verify_meta=False)
+
+    return good, bad
@@ -0,0 +1,409 @@
+"""Validate data with Polars using the same schemas as `validate_dataframe`.
+
+Every rule in `AdmittedCareEpisodeSchema`, `EmergencyCareFeatureSchema` and the other
+schemas in [avoidable_admissions.data.validate][] is translated into a Polars
+expression. All expressions are evaluated in a single lazy query, so that Polars
+runs them on all cores and reads each column only once.
+
+Rows that pass or fail validation are the same as with `validate_dataframe`,
+and failure cases are described with the same `schema_context`, `column` and
+`check` values. Custom checks that cannot be translated are run with pandera
+on the values of their column.
+
+Requires `polars`. Install with `pip install avoidable_admissions[polars]`.
+"""
+
+import re
+import warnings
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+import pandera as pa
+
+try:
+    import polars as pl
+except ImportError as ex:
+    raise ImportError(
+        "The Polars backend requires polars. "
+        "Install with `pip install avoidable_admissions[polars]`."
+    ) from ex
+
+from avoidable_admissions.data import snomed_refsets
+from avoidable_admissions.data.validate import _column_props
+from avoidable_admissions.features.build_features_polars import release_index
+
+failure_columns = [
+    "schema_context",
+    "column",
+    "check",
+    "check_number",
+    "failure_case",
+    "index",
+]
+
+_dtypes = {
+    "str": pl.String,
+    "int64": pl.Int64,
+    "float64": pl.Float64,
+    "datetime64[ns]": pl.Datetime,
+}
+
+
+def _literal(value):
+    # Polars compares datetime columns with Python datetimes
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def _pattern(value) -> str:
+    return getattr(value, "pattern", value)
+
+
+# Expressions that are True where a value passes a built-in pandera check
+_checks = {
+    "isin": lambda c, s: c.is_in(list(s["allowed_values"])),
+    "notin": lambda c, s: ~c.is_in(list(s["forbidden_values"])),
+    "equal_to": lambda c, s: c == _literal(s["value"]),
+    "not_equal_to": lambda c, s: c != _literal(s["value"]),
+    "greater_than": lambda c, s: c > _literal(s["min_value"]),
+    "greater_than_or_equal_to": lambda c, s: c >= _literal(s["min_value"]),
+    "less_than": lambda c, s: c < _literal(s["max_value"]),
+    "less_than_or_equal_to": lambda c, s: c <= _literal(s["max_value"]),
+    "in_range": lambda c, s: (
+        (c >= _literal(s["min_value"]) if s["include_min"] else c > s["min_value"])
+        & (c <= _literal(s["max_value"]) if s["include_max"] else c < s["max_value"])
+    ),
+    # pandas str.match is anchored at the start only, as is re.match
+    "str_matches": lambda c, s: c.str.contains(f"^(?:{_pattern(s['pattern'])})"),
+    "str_contains": lambda c, s: c.str.contains(_pattern(s["pattern"])),
+    "str_startswith": lambda c, s: c.str.starts_with(s["string"]),
+    "str_endswith": lambda c, s: c.str.ends_with(s["string"]),
+}
+
+
+def _dtype_matches(expected: str, actual: pl.DataType) -> bool:
+    target = _dtypes.get(expected)
+
+    if target is pl.Datetime:
+        return isinstance(actual, pl.Datetime) and actual.time_zone is None
+
+    return target is not None and actual == target
+
+
+def _coerce(col: str, expected: str, actual: pl.DataType) -> Tuple[pl.Expr, pl.Expr]:
+    # Coerced values and an expression that is True where a value could not be coerced
+
+    target = _dtypes[expected]
+    value = pl.col(col)
+
+    if target is pl.Datetime and actual == pl.String:
+        coerced = value.str.to_datetime(strict=False)
+    else:
+        coerced = value.cast(target, strict=False)
+
+    return coerced, value.is_not_null() & coerced.is_null()
+
+
+def _pandera_check(check: pa.Check) -> Callable[["pl.Series"], "pl.Series"]:
+    # Checks that are not built in are run by pandera on the values of the column
+
+    def run(series: pl.Series) -> pl.Series:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            output = check(series.to_pandas()).check_output
+        return pl.Series(output.to_numpy(dtype=bool))
+
+    return run
+
+
+def _match_columns(
+    schema: pa.DataFrameSchema, columns: List[str]
+) -> Tuple[Dict[str, List[Tuple[str, pa.Column]]], List[dict]]:
+    # Schema columns validating each dataframe column, and failures for schema
+    # columns that are missing. Named and regex columns may both apply to a column.
+
+    matched = {col: [] for col in columns}
+    failures = []
+
+    for key, column in schema.columns.items():
+        if column.regex:
+            names = [c for c in columns if re.match(key, c)]
+        else:
+            names = [key] if key in matched else []
+
+        if not names and column.required:
+            if column.regex:
+                failures.append(
+                    {
+                        "schema_context": "Column",
+                        "column": key,
+                        "check": f"no_regex_column_match('{key}')",
+                        "failure_case": key,
+                    }
+                )
+            else:
+                failures.append(
+                    {
+                        "schema_context": "DataFrameSchema",
+                        "column": None,
+                        "check": "column_in_dataframe",
+                        "failure_case": key,
+                    }
+                )
+
+        for name in names:
+            matched[name].append((key, column))
+
+    if schema.strict:
+        for col, columns_ in matched.items():
+            if not columns_:
+                failures.append(
+                    {
+                        "schema_context": "DataFrameSchema",
+                        "column": None,
+                        "check": "column_in_schema",
+                        "failure_case": col,
+                    }
+                )
+
+    return matched, failures
+
+
+def _refset_release(dtypes: Dict[str, pl.DataType]) -> Optional[pl.Expr]:
+    # Release of the SNOMED refsets in force on the arrival date of each row, as in
+    # _refset_props. Without dates, codes in any release pass.
+
+    if "edarrivaldatetime" not in dtypes:
+        return None
+
+    dates = pl.col("edarrivaldatetime")
+    dtype = dtypes["edarrivaldatetime"]
+
+    if dtype == pl.String:
+        dates = dates.str.to_datetime(strict=False)
+    elif isinstance(dtype, pl.Datetime):
+        if dtype.time_zone is not None:
+            dates = dates.dt.replace_time_zone(None)
+    else:
+        dates = dates.cast(pl.Datetime("ns"), strict=False)
+
+    return release_index(dates)
+
+
+def _isin_refset(
+    value: pl.Expr, statistics: dict, release: Optional[pl.Expr]
+) -> pl.Expr:
+    # As snomed_refsets.refset_check, with the members of the release of each row
+
+    store = snomed_refsets.load_store()
+    name = statistics["refset"]
+
+    allowed = value.is_in(statistics["allow"])
+
+    if release is None or store.n_releases == 1:
+        return allowed | value.is_in(store.members(name).tolist())
+
+    is_member = None
+    for r in range(store.n_releases):
+        in_release = value.is_in(store.members(name, r).tolist())
+        if is_member is None:
+            is_member = pl.when(release == r).then(in_release)
+        else:
+            is_member = is_member.when(release == r).then(in_release)
+
+    return allowed | is_member.otherwise(False)
+
+
+def _failure_exprs(
+    col: str,
+    column: pa.Column,
+    actual: pl.DataType,
+    release: Optional[pl.Expr] = None,
+) -> Tuple[List[Tuple[str, Optional[int], pl.Expr, pl.Expr]], List[dict]]:
+    # Row level failure expressions for one dataframe column and one schema column,
+    # as (check, check_number, failed, failure case), and column level failures.
+    # Refset checks use the release of each row if given.
+
+    expected = str(column.dtype) if column.dtype is not None else None
+
+    value = pl.col(col)
+    exprs = []
+    failures = []
+
+    if expected is not None and not _dtype_matches(expected, actual):
+        if column.coerce and expected in _dtypes:
+            value, failed = _coerce(col, expected, actual)
+            actual = _dtypes[expected]
+            exprs.append(
+                (
+                    f"coerce_dtype('{expected}')",
+                    None,
+                    failed,
+                    pl.col(col).cast(pl.String),
+                )
+            )
+        else:
+            # Checks are not run on a column of the wrong type
+            failures.append(
+                {
+                    "schema_context": "Column",
+                    "column": col,
+                    "check": f"dtype('{expected}')",
+                    "failure_case": str(actual),
+                }
+            )
+            return exprs, failures
+
+    is_null = value.is_null()
+    if actual in (pl.Float32, pl.Float64):
+        # pandas treats NaN as missing
+        is_null = is_null | value.is_nan()
+
+    if not column.nullable:
+        exprs.append(("not_nullable", None, is_null, pl.lit(None, dtype=pl.String)))
+
+    if column.unique:
+        exprs.append(("field_uniqueness", None, value.is_duplicated(), value))
+
+    for number, check in enumerate(column.checks):
+        translate = _checks.get(check.name)
+
+        if check.name == "isin_refset":
+            passed = _isin_refset(value, check.statistics, release)
+        elif translate is not None:
+            passed = translate(value, check.statistics)
+        else:
+            passed = value.map_batches(_pandera_check(check), return_dtype=pl.Boolean)
+
+        # Checks on missing values pass unless ignore_na is False
+        failed = ~passed.fill_null(not check.ignore_na)
+        if check.ignore_na:
+            failed = failed & ~is_null
+
+        exprs.append((check.error or check.name, number, failed, value))
+
+    return exprs, failures
+
+
+def _print_summary(name: str, failures: pl.DataFrame) -> None:
+    counts = (
+        failures.group_by(["schema_context", "column", "check"], maintain_order=True)
+        .len("n_failure_cases")
+        .to_pandas()
+    )
+
+    print(f"Schema {name}: A total of {len(counts)} schema errors were found.")
+    print()
+    print(counts.to_string(index=False))
+
+
+def validate_dataframe(
+    df: Union["pl.DataFrame", "pl.LazyFrame", pd.DataFrame],
+    schema: pa.DataFrameSchema,
+    **kwargs,
+) -> Tuple["pl.DataFrame", "pl.DataFrame"]:
+    """Validate data against a schema with Polars.
+
+    Applies the same rules as [avoidable_admissions.data.validate.validate_dataframe][]
+    and supports the same `start_date`, `end_date`, `ignore_cols` and `update_cols`
+    keyword arguments. Delta validation with a `validation_token` is not supported
+    and the whole schema is always checked.
+
+    Columns should have the Polars types that correspond to the schema:
+    `String` for `str`, `Int64` for `int64`, `Float64` for `float64` and `Datetime`
+    for `datetime64[ns]`. Columns with `coerce=True` in the schema, such as `visit_id`
+    and the SNOMED code columns, are cast before checks are applied.
+
+    Args:
+        df (pl.DataFrame | pl.LazyFrame | pd.DataFrame): Data to validate.
+            A pandas dataframe is converted with `pl.from_pandas`.
+        schema (pa.DataFrameSchema): Pandera schema to validate against
+        kwargs: See [avoidable_admissions.data.validate.validate_dataframe][]
+
+    Returns:
+        _Good_ and _Bad_ Polars dataframes. The _bad_ dataframe has one row per failure
+            case with the columns of the failing row, `schema_context`, `column`, `check`,
+            `check_number`, `failure_case` (as a string) and `index` (the row number).
+            If a column is missing, extra or of the wrong type, no rows pass validation.
+
+    ## Example
+
+    ```python
+    import polars as pl
+
+    from avoidable_admissions.data.validate import AdmittedCareEpisodeSchema
+    from avoidable_admissions.data.validate_polars import validate_dataframe
+
+    df = pl.read_parquet("../data/interim/admitted_care.parquet")
+    good, bad = validate_dataframe(df, AdmittedCareEpisodeSchema)
+    ```
+    """
+
+    if isinstance(df, pd.DataFrame):
+        df = pl.from_pandas(df)
+
+    lf = df.lazy()
+    dtypes = lf.collect_schema()
+
+    schema = schema.update_columns(_column_props(schema, **kwargs))
+
+    matched, column_failures = _match_columns(schema, list(dtypes.names()))
+
+    rows = lf.with_row_index("index")
+    row_failures = []
+
+    release = _refset_release(dtypes)
+
+    for col, columns in matched.items():
+        for _, column in columns:
+            exprs, failures = _failure_exprs(col, column, dtypes[col], release)
+            column_failures.extend(failures)
+
+            for check, number, failed, failure_case in exprs:
+                row_failures.append(
+                    rows.filter(failed).select(
+                        pl.lit("Column").alias("schema_context"),
+                        pl.lit(col).alias("column"),
+                        pl.lit(check).alias("check"),
+                        pl.lit(number, dtype=pl.Int64).alias("check_number"),
+                        failure_case.cast(pl.String).alias("failure_case"),
+                        pl.col("index").cast(pl.Int64),
+                    )
+                )
+
+    failure_schema = {
+        "schema_context": pl.String,
+        "column": pl.String,
+        "check": pl.String,
+        "check_number": pl.Int64,
+        "failure_case": pl.String,
+        "index": pl.Int64,
+    }
+
+    column_failures = pl.LazyFrame(
+        [[f.get(col) for col in failure_columns] for f in column_failures],
+        schema=failure_schema,
+        orient="row",
+    )
+    failures_lf = pl.concat([column_failures, *row_failures], how="vertical")
+
+    # Failure cases of every check are computed in one query which Polars runs in
+    # parallel, sharing the scan of the data with the query for the rows
+    failures, data = pl.collect_all([failures_lf, rows])
+
+    bad = failures.join(data, on="index", how="left").select(
+        [*dtypes.names(), *failure_columns]
+    )
+
+    if failures.is_empty():
+        good = data
+    elif failures["index"].has_nulls():
+        _print_summary(schema.name, failures)
+        print("No data will pass validation due to column error. See output above.")
+        good = data.head(0)
+    else:
+        _print_summary(schema.name, failures)
+        good = data.filter(~pl.col("index").is_in(failures["index"].unique()))
+
+    return good.drop("index"), bad
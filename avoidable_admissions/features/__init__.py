@@ -1,11 +1,13 @@
 from avoidable_admissions.features import (admitted_care_features,
-                                           build_features,
+                                           build_features, classifiers,
                                            emergency_care_features,
-                                           feature_maps)
+                                           feature_maps, kernels)
 
 __all__ = [
     "build_features",
+    "classifiers",
     "admitted_care_features",
     "emergency_care_features",
     "feature_maps",
+    "kernels",
 ]
@@ -1,21 +1,22 @@
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
 
-from avoidable_admissions.features import feature_maps
+from avoidable_admissions.features import feature_maps, kernels
+from avoidable_admissions.features.classifiers import ICD10Classifier, OPCS4Classifier
+from avoidable_admissions.utils.instrumentation import instrumented
 
 
+@instrumented()
 def _age(df: pd.DataFrame) -> pd.DataFrame:
 
-    age_labels = feature_maps.age_labels
-    age_bins = feature_maps.age_bins
-
-    df["admiage_cat"] = pd.cut(
-        df.admiage, bins=age_bins, labels=age_labels, right=False
-    )
+    df["admiage_cat"] = kernels.age_band(df.admiage)
 
     return df
 
 
+@instrumented()
 def _gender(df: pd.DataFrame) -> pd.DataFrame:
 
     df["gender_cat"] = df.gender.replace(feature_maps.gender)
@@ -23,56 +24,53 @@ def _gender(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumented()
 def _ethnos(df: pd.DataFrame) -> pd.DataFrame:
 
     df["ethnos_cat"] = df.ethnos.replace(feature_maps.ethnos)
     return df
 
 
+@instrumented()
 def _admisorc(df: pd.DataFrame) -> pd.DataFrame:
 
     df["admisorc_cat"] = df.admisorc.replace(feature_maps.admisorc)
     return df
 
 
+@instrumented()
 def _admidate(df: pd.DataFrame) -> pd.DataFrame:
 
-    df.admidate = pd.to_datetime(df.admidate)
-    # %A returns the full name of the day of week
-    # An alternative approach to be do `df.admidate.dt.dayofweek` and map to day names
+    df.admidate = kernels.parse_datetime(df.admidate)
+    # Map the integer day of week to day names instead of formatting each date with strftime
 
-    df["admidayofweek"] = df.admidate.dt.strftime("%A")
+    df["admidayofweek"] = kernels.day_of_week(df.admidate)
 
     return df
 
 
-def _diag_seasonal(df: pd.DataFrame) -> pd.DataFrame:
+@lru_cache(maxsize=1)
+def _diag_seasonal_classifier() -> ICD10Classifier:
+
+    # 4 char ICD10 codes are exact matches.
+    # Remaining codes are matched on the first 3 characters.
 
-    replacement_3char = feature_maps.admdiag_seasonal_3char
-    replacement_4char = feature_maps.admdiag_seasonal_4char
+    return ICD10Classifier(
+        feature_maps.admdiag_seasonal_4char, feature_maps.admdiag_seasonal_3char
+    )
 
-    # The allowed categories are unique values in both replacement dicts
-    x = set(feature_maps.admdiag_seasonal_3char.values())
-    y = set(feature_maps.admdiag_seasonal_4char.values())
-    allowed_categories = x.union(y)
 
-    # First replace all 4 char ICD10 codes as they should be exact matches
-    # Then slice the remaining codes to get first 3 characters and replace using the 3char mapping
-    # Finally, if the end values are not in the 2 allowed categories, replace with nan.
+@instrumented()
+def _diag_seasonal(df: pd.DataFrame) -> pd.DataFrame:
 
-    df["diag_seasonal_cat"] = (
-        df.diag_01.replace(replacement_4char).str.slice(0, 3).replace(replacement_3char)
-    )
+    # Codes that are in neither mapping are assigned "-"
 
-    # If the final values are not in allowed_categories, replace with "-".
-    df.diag_seasonal_cat = df.diag_seasonal_cat.where(
-        df.diag_seasonal_cat.isin(allowed_categories),
-        "-",
-    )
+    df["diag_seasonal_cat"] = _diag_seasonal_classifier().classify(df.diag_01)
 
     return df
 
 
+@instrumented()
 def _length_of_stay(df: pd.DataFrame) -> pd.DataFrame:
 
     # Validate length of stay so that there are no negative values.
@@ -85,6 +83,7 @@ def _length_of_stay(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumented()
 def _disdest(df: pd.DataFrame) -> pd.DataFrame:
 
     df["disdest_cat"] = df.disdest.replace(feature_maps.disdest)
@@ -92,6 +91,7 @@ def _disdest(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumented()
 def _dismeth(df: pd.DataFrame) -> pd.DataFrame:
 
     df["dismeth_cat"] = df.dismeth.replace(feature_maps.dismeth)
@@ -99,19 +99,31 @@ def _dismeth(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@lru_cache(maxsize=1)
+def _acsc_classifier() -> ICD10Classifier:
+
+    # ACSC codes are exact matches only
+
+    return ICD10Classifier(feature_maps.load_apc_acsc_mapping())
+
+
+@instrumented()
 def _acsc_code(df: pd.DataFrame) -> pd.DataFrame:
 
     # TODO: This section needs manual review of a good sample size to ensure it works
 
-    acsc_mapping = feature_maps.load_apc_acsc_mapping()
-    df["diag_01_acsc"] = df.diag_01.replace(acsc_mapping)
-    df.diag_01_acsc = df.diag_01_acsc.where(
-        df.diag_01_acsc.isin(set(acsc_mapping.values())), "-"
-    )
+    df["diag_01_acsc"] = _acsc_classifier().classify(df.diag_01)
 
     return df
 
 
+@lru_cache(maxsize=1)
+def _procedure_classifier() -> OPCS4Classifier:
+
+    return OPCS4Classifier()
+
+
+@instrumented()
 def _procedures(df: pd.DataFrame) -> pd.DataFrame:
     """Using primary and all secondary procedure codes, categorise as follows to determine
     whether a patient had any procedures or not:
@@ -129,17 +141,17 @@ def _procedures(df: pd.DataFrame) -> pd.DataFrame:
     # TODO: Clarify how the X99* codes need to be dealt with. These codes do not appear in LTH data.
 
     # 1. Filter all operation columns (01-12).
-    # 2. Use regex to replace X998, X999 and O, Y and Z codes (these indicate anatomy, site or method of operation  )
-    # 3. Count number of non-null values across each row
+    # 2. Look up codes in the OPCS-4 reference to exclude X998, X999, O, Y and Z codes
+    #    (these indicate anatomy, site or method of operation) and invalid codes.
+    #    Each distinct code across all columns is only looked up once.
+    # 3. Count number of valid codes across each row
 
     # opertn_count should be >=0
     """
     # TODO: Instead of replacing invalid codes with nan, should we count only valid OPCS codes
 
-    df["opertn_count"] = (
+    df["opertn_count"] = _procedure_classifier().count_valid(
         df.filter(regex="opertn_[0-1][0-9]$")
-        .replace({"X99[8-9]|[OYZ][0-9]+|\-": np.nan}, regex=True)
-        .count(axis=1)
     )
 
     rules = {
@@ -155,14 +167,20 @@ def _procedures(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumented()
 def _comorbidities(df: pd.DataFrame) -> pd.DataFrame:
-    diag_cols = [f"diag_{i:02d}" for i in range(2, 21)]
-    df["comorb_count"] = df[diag_cols].count(axis=1)
-    df["comorb_cat"] = df["comorb_count"].apply(lambda x: "Yes" if x > 0 else "No")
+
+    # diag_01 is the primary diagnosis. All secondary diagnoses present are counted.
+
+    df["comorb_count"] = kernels.count_repeating_group(
+        df, "diag_[0-9]{2}$", exclude=["diag_01"]
+    )
+    df["comorb_cat"] = kernels.yes_no(df["comorb_count"])
 
     return df
 
 
+@instrumented()
 def build_all(df: pd.DataFrame) -> pd.DataFrame:
 
     df = (
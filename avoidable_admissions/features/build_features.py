@@ -1,5 +1,6 @@
 import pandas as pd
 
+from avoidable_admissions.data.validate import _is_dask_dataframe
 from avoidable_admissions.features import (admitted_care_features,
                                            emergency_care_features)
 
@@ -43,8 +44,16 @@ def build_admitted_care_features(df: pd.DataFrame) -> pd.DataFrame:
     ```
 
     See [Analysis Pipeline][data-analysis-pipeline] for more information.
+
+    A partitioned Dask dataframe returns a lazy Dask dataframe with features built
+    for each partition.
     """
 
+    if _is_dask_dataframe(df):
+        from avoidable_admissions.features import build_features_dask
+
+        return build_features_dask.build_admitted_care_features(df)
+
     df = admitted_care_features.build_all(df)
 
     return df
@@ -52,6 +61,11 @@ def build_admitted_care_features(df: pd.DataFrame) -> pd.DataFrame:
 
 def build_emergency_care_features(df: pd.DataFrame) -> pd.DataFrame:
 
+    if _is_dask_dataframe(df):
+        from avoidable_admissions.features import build_features_dask
+
+        return build_features_dask.build_emergency_care_features(df)
+
     df = emergency_care_features.build_all(df)
 
     return df
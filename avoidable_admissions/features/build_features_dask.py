@@ -0,0 +1,59 @@
+"""Build admitted care and emergency care features for partitioned Dask dataframes.
+
+The `build_*_features` functions in [avoidable_admissions.features.build_features][]
+pass Dask dataframes to this module. Features are built for each partition with
+the pandas functions, as every feature depends on the values of a single row only.
+
+Requires `dask`. Install with `pip install avoidable_admissions[dask]`.
+"""
+
+import contextlib
+import io
+from typing import Callable
+
+try:
+    import dask.dataframe as dd
+except ImportError as ex:
+    raise ImportError(
+        "Dask dataframes require dask. "
+        "Install with `pip install avoidable_admissions[dask]`."
+    ) from ex
+
+from avoidable_admissions.features import (
+    admitted_care_features,
+    emergency_care_features,
+)
+
+
+def _map_partitions(df: "dd.DataFrame", build: Callable) -> "dd.DataFrame":
+    # Output columns and types are found by building features for no rows
+    with contextlib.redirect_stdout(io.StringIO()):
+        meta = build(df._meta.copy())
+
+    return df.map_partitions(build, meta=meta)
+
+
+def build_admitted_care_features(df: "dd.DataFrame") -> "dd.DataFrame":
+    """Generate admitted care features for every partition of a Dask dataframe.
+
+    Args:
+        df (dd.DataFrame): Data that has passed the first validation step
+
+    Returns:
+        dd.DataFrame: Lazy dataframe with additional feature columns
+    """
+
+    return _map_partitions(df, admitted_care_features.build_all)
+
+
+def build_emergency_care_features(df: "dd.DataFrame") -> "dd.DataFrame":
+    """Generate emergency care features for every partition of a Dask dataframe.
+
+    Args:
+        df (dd.DataFrame): Data that has passed the first validation step
+
+    Returns:
+        dd.DataFrame: Lazy dataframe with additional feature columns
+    """
+
+    return _map_partitions(df, emergency_care_features.build_all)
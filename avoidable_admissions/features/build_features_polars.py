@@ -0,0 +1,394 @@
+"""Build admitted care and emergency care features with Polars.
+
+Every feature in [avoidable_admissions.features.build_features][] is written as a
+Polars expression using the same mappings from `feature_maps`. All features are
+added in a single lazy query, so Polars evaluates independent features in parallel
+and reads each column only once.
+
+The output has the same columns in the same order and the same values as the pandas
+functions. Categorical features such as `admiage_cat` and `admidayofweek` are
+returned as strings.
+
+Requires `polars`. Install with `pip install avoidable_admissions[polars]`.
+"""
+
+import re
+from typing import Dict, List, Optional, Union
+
+try:
+    import polars as pl
+except ImportError as ex:
+    raise ImportError(
+        "The Polars backend requires polars. "
+        "Install with `pip install avoidable_admissions[polars]`."
+    ) from ex
+
+from avoidable_admissions.data import opcs4, snomed_refsets
+from avoidable_admissions.features import feature_maps
+from avoidable_admissions.features.classifiers import _normalise_icd10
+from avoidable_admissions.utils.instrumentation import instrumented
+
+Frame = Union["pl.DataFrame", "pl.LazyFrame"]
+
+
+def _matching(columns: List[str], pattern: str, exclude=()) -> List[str]:
+    # Same columns as `df.filter(regex=pattern)` which searches anywhere in the name
+
+    return [c for c in columns if re.search(pattern, c) and c not in set(exclude)]
+
+
+def age_band(age: pl.Expr) -> pl.Expr:
+    """Age band from `feature_maps.age_labels`, as `kernels.age_band`.
+
+    Missing and out of range ages are null.
+    """
+
+    labels = {
+        age: feature_maps.age_labels[code]
+        for age, code in enumerate(feature_maps.age_band_codes)
+        if code >= 0
+    }
+
+    # Fractional ages are truncated. Negative ages are excluded before truncation.
+    whole_years = pl.when(age >= 0).then(age.cast(pl.Int64, strict=False))
+
+    return whole_years.replace_strict(labels, default=None, return_dtype=pl.String)
+
+
+def release_index(dates: pl.Expr) -> pl.Expr:
+    """Release of the SNOMED CT refsets in force on each date, as
+    `snomed_refsets.RefsetStore.release_index`.
+
+    Dates before the first release use the first release.
+    Missing dates use the latest release.
+    """
+
+    store = snomed_refsets.load_store()
+    order = sorted(range(store.n_releases), key=lambda r: store.release_dates[r])
+
+    release = pl.when(dates.is_null()).then(pl.lit(order[-1]))
+    for r in reversed(order[1:]):
+        start = store.release_dates[r].to_pydatetime()
+        release = release.when(dates >= start).then(pl.lit(r))
+
+    return release.otherwise(pl.lit(order[0]))
+
+
+def replace_values(
+    data: pl.Expr,
+    replacements: dict,
+    other: str = "ERROR:Unmapped - Not In Refset",
+    dates: Optional[pl.Expr] = None,
+) -> pl.Expr:
+    """Mapped value, or `other` for values and missing values not in `replacements`.
+
+    As `emergency_care_features.replace_values`. Maps of refset codes use the
+    release in force on `dates` if there is more than one release.
+    """
+
+    if (
+        dates is not None
+        and isinstance(replacements, feature_maps.RefsetMap)
+        and len(replacements.releases) > 1
+    ):
+        release = release_index(dates)
+
+        mapped = None
+        for r, mapping in enumerate(replacements.releases):
+            value = replace_values(data, mapping, other)
+            if mapped is None:
+                mapped = pl.when(release == r).then(value)
+            else:
+                mapped = mapped.when(release == r).then(value)
+
+        return mapped.otherwise(pl.lit(other))
+
+    mapping = {k: str(v) for k, v in replacements.items()}
+
+    return data.replace_strict(mapping, default=other, return_dtype=pl.String)
+
+
+def classify_icd10(
+    codes: pl.Expr,
+    mapping: Dict[str, str],
+    mapping_3char: Optional[Dict[str, str]] = None,
+    default: str = "-",
+) -> pl.Expr:
+    """ICD-10 category with a 3 character fallback, as `ICD10Classifier.classify`."""
+
+    index = {_normalise_icd10(k): v for k, v in mapping.items()}
+    index_3char = {_normalise_icd10(k): v for k, v in (mapping_3char or {}).items()}
+
+    normalised = (
+        codes.cast(pl.String)
+        .str.strip_chars()
+        .str.to_uppercase()
+        .str.replace_all(".", "", literal=True)
+    )
+
+    exact = normalised.replace_strict(index, default=None, return_dtype=pl.String)
+    fallback = normalised.str.slice(0, 3).replace_strict(
+        index_3char, default=default, return_dtype=pl.String
+    )
+
+    return exact.fill_null(fallback).fill_null(default)
+
+
+def count_recorded(columns: List[str], missing_values=()) -> pl.Expr:
+    """Number of columns with a recorded value in each row, as `kernels.count_repeating_group`."""
+
+    if not columns:
+        return pl.lit(0, dtype=pl.Int64)
+
+    recorded = []
+    for col in columns:
+        value = pl.col(col)
+        is_recorded = value.is_not_null()
+        if missing_values:
+            is_recorded = is_recorded & ~value.is_in(list(missing_values)).fill_null(
+                False
+            )
+        recorded.append(is_recorded.cast(pl.Int64))
+
+    return pl.sum_horizontal(recorded)
+
+
+def is_procedure(codes: pl.Expr) -> pl.Expr:
+    """True for codes counted as procedures, as `OPCS4Classifier`.
+
+    Codes must be in a chapter of procedures in `opcs4.load_chapters()`, not in
+    `opcs4.excluded_codes`, and in the full code list if one is set.
+    """
+
+    chapters = opcs4.load_chapters()
+    reference = opcs4.load_codes()
+
+    code = (
+        codes.cast(pl.String)
+        .str.strip_chars()
+        .str.to_uppercase()
+        .str.replace_all(".", "", literal=True)
+    )
+
+    procedure = (
+        code.str.contains(opcs4.code_pattern)
+        & code.str.slice(0, 1).is_in(chapters.index[chapters.procedure].tolist())
+        & ~code.is_in(opcs4.excluded_codes)
+    )
+
+    if reference is not None:
+        procedure = procedure & code.is_in(reference.tolist())
+
+    return procedure.fill_null(False)
+
+
+def yes_no(counts: pl.Expr) -> pl.Expr:
+    """ "Yes" if greater than zero else "No", as `kernels.yes_no`."""
+
+    return pl.when(counts > 0).then(pl.lit("Yes")).otherwise(pl.lit("No"))
+
+
+def day_of_week(dates: pl.Expr) -> pl.Expr:
+    """Name of the day of week from `feature_maps.day_of_week_labels`."""
+
+    # Polars numbers days from 1 for Monday
+    days = {i + 1: day for i, day in enumerate(feature_maps.day_of_week_labels)}
+
+    return dates.dt.weekday().replace_strict(days, default=None, return_dtype=pl.String)
+
+
+def _parse_dates(col: str, dtype: pl.DataType) -> Optional[pl.Expr]:
+    # Dates that are still strings are parsed, as `kernels.parse_datetime`
+
+    if dtype == pl.String:
+        return pl.col(col).str.to_datetime(strict=False)
+
+    return None
+
+
+def _admitted_care_exprs(columns: List[str]) -> List[pl.Expr]:
+    # One expression per feature column, in the order added by build_all
+
+    length_of_stay = pl.col("length_of_stay")
+
+    opertn_count = pl.sum_horizontal(
+        pl.lit(0, dtype=pl.Int64),
+        *[
+            is_procedure(pl.col(c)).cast(pl.Int64)
+            for c in _matching(columns, "opertn_[0-1][0-9]$")
+        ],
+    )
+
+    comorb_count = count_recorded(
+        _matching(columns, "diag_[0-9]{2}$", exclude=["diag_01"])
+    )
+
+    return [
+        age_band(pl.col("admiage")).alias("admiage_cat"),
+        pl.col("gender").replace(feature_maps.gender).alias("gender_cat"),
+        pl.col("ethnos").replace(feature_maps.ethnos).alias("ethnos_cat"),
+        pl.col("admisorc").replace(feature_maps.admisorc).alias("admisorc_cat"),
+        day_of_week(pl.col("admidate")).alias("admidayofweek"),
+        classify_icd10(
+            pl.col("diag_01"),
+            feature_maps.admdiag_seasonal_4char,
+            feature_maps.admdiag_seasonal_3char,
+        ).alias("diag_seasonal_cat"),
+        # pd.cut with bins of (-inf, 1] and (1, inf]. NaN is not in either bin.
+        pl.when(length_of_stay.is_nan())
+        .then(None)
+        .when(length_of_stay <= 1)
+        .then(pl.lit("<2 days"))
+        .when(length_of_stay > 1)
+        .then(pl.lit(">=2 days"))
+        .alias("length_of_stay_cat"),
+        pl.col("disdest").replace(feature_maps.disdest).alias("disdest_cat"),
+        pl.col("dismeth").replace(feature_maps.dismeth).alias("dismeth_cat"),
+        classify_icd10(pl.col("diag_01"), feature_maps.load_apc_acsc_mapping()).alias(
+            "diag_01_acsc"
+        ),
+        opertn_count.alias("opertn_count"),
+        yes_no(pl.col("opertn_count")).alias("opertn_cat"),
+        comorb_count.alias("comorb_count"),
+        yes_no(pl.col("comorb_count")).alias("comorb_cat"),
+    ]
+
+
+def _emergency_care_exprs(columns: List[str]) -> List[pl.Expr]:
+    # One expression per feature column, in the order added by build_all
+
+    arrival = pl.col("edarrivaldatetime")
+
+    edinvest = [
+        replace_values(pl.col(c), feature_maps.edinvest, "Urgent", arrival).alias(
+            c + "_cat"
+        )
+        for c in _matching(columns, "edinvest_[0-9]{2}$")
+    ]
+    edtreat = [
+        replace_values(pl.col(c), feature_maps.edtreat, "Urgent", arrival).alias(
+            c + "_cat"
+        )
+        for c in _matching(columns, "edtreat_[0-9]{2}$")
+    ]
+
+    edcomorb_count = count_recorded(
+        _matching(columns, "edcomorb_[0-9]{2}$"), missing_values=[0]
+    )
+
+    return [
+        age_band(pl.col("activage")).alias("activage_cat"),
+        replace_values(
+            pl.col("accommodationstatus"),
+            feature_maps.accommodationstatus,
+            dates=arrival,
+        ).alias("accommodationstatus_cat"),
+        replace_values(pl.col("eddiag_01"), feature_maps.load_ed_acsc_mapping()).alias(
+            "eddiag_01_acsc"
+        ),
+        replace_values(
+            pl.col("edchiefcomplaint"), feature_maps.load_ed_cc_mapping()
+        ).alias("edchiefcomplaint_cat"),
+        replace_values(
+            pl.col("disstatus"), feature_maps.disstatus, dates=arrival
+        ).alias("disstatus_cat"),
+        replace_values(pl.col("edacuity"), feature_maps.edacuity).alias("edacuity_cat"),
+        replace_values(
+            pl.col("edarrivalmode"), feature_maps.edarrivalmode, dates=arrival
+        ).alias("edarrivalmode_cat"),
+        day_of_week(arrival).alias("edarrival_dayofweek"),
+        arrival.dt.hour().cast(pl.Int64).alias("edarrival_hourofday"),
+        replace_values(
+            pl.col("edattenddispatch"), feature_maps.edattenddispatch, dates=arrival
+        ).alias("edattenddispatch_cat"),
+        replace_values(
+            pl.col("edattendsource"), feature_maps.edattendsource, dates=arrival
+        ).alias("edattendsource_cat"),
+        edcomorb_count.alias("edcomorb_count"),
+        yes_no(pl.col("edcomorb_count")).alias("edcomorb_cat"),
+        replace_values(
+            pl.col("eddiag_01"), feature_maps.eddiag_seasonal, dates=arrival
+        ).alias("eddiag_seasonal_cat"),
+        replace_values(pl.col("eddiagqual_01"), feature_maps.eddiagqual).alias(
+            "eddiagqual_01_cat"
+        ),
+        *edinvest,
+        replace_values(
+            pl.col("edrefservice"), feature_maps.edrefservice, "Other", arrival
+        ).alias("edrefservice_cat"),
+        *edtreat,
+        replace_values(pl.col("ethnos"), feature_maps.ethnos).alias("ethnos_cat"),
+        replace_values(pl.col("gender").cast(pl.String), feature_maps.gender).alias(
+            "gender_cat"
+        ),
+    ]
+
+
+def _build(df: Frame, date_col: str, exprs) -> Frame:
+    lf = df.lazy()
+    schema = lf.collect_schema()
+
+    parsed = _parse_dates(date_col, schema[date_col])
+    if parsed is not None:
+        lf = lf.with_columns(parsed)
+
+    # Counts are used by the yes/no features so they are added in a second step
+    features = exprs(schema.names())
+    counts = [e for e in features if e.meta.output_name().endswith("_count")]
+    others = [e for e in features if not e.meta.output_name().endswith("_count")]
+    order = [e.meta.output_name() for e in features]
+
+    lf = lf.with_columns(counts).with_columns(others)
+    lf = lf.select([*schema.names(), *order])
+
+    return lf if isinstance(df, pl.LazyFrame) else lf.collect()
+
+
+@instrumented()
+def build_admitted_care_features(df: Frame) -> Frame:
+    """Generate admitted care features with Polars.
+
+    Same features as [avoidable_admissions.features.build_features.build_admitted_care_features][].
+
+    Args:
+        df (pl.DataFrame | pl.LazyFrame): Data that has passed the first validation step
+
+    Returns:
+        Data with additional feature columns. A LazyFrame is returned for a LazyFrame,
+            so that features can be combined with other lazy steps before collecting.
+
+    ## Example
+
+    ```python
+    from avoidable_admissions.data.validate import (
+        AdmittedCareEpisodeSchema,
+        AdmittedCareFeatureSchema,
+    )
+    from avoidable_admissions.data.validate_polars import validate_dataframe
+    from avoidable_admissions.features.build_features_polars import (
+        build_admitted_care_features,
+    )
+
+    good, bad = validate_dataframe(df, AdmittedCareEpisodeSchema)
+    df_features = build_admitted_care_features(good)
+    good_f, bad_f = validate_dataframe(df_features, AdmittedCareFeatureSchema)
+    ```
+    """
+
+    return _build(df, "admidate", _admitted_care_exprs)
+
+
+@instrumented()
+def build_emergency_care_features(df: Frame) -> Frame:
+    """Generate emergency care features with Polars.
+
+    Same features as [avoidable_admissions.features.build_features.build_emergency_care_features][].
+
+    Args:
+        df (pl.DataFrame | pl.LazyFrame): Data that has passed the first validation step
+
+    Returns:
+        Data with additional feature columns. A LazyFrame is returned for a LazyFrame.
+    """
+
+    return _build(df, "edarrivaldatetime", _emergency_care_exprs)
@@ -0,0 +1,228 @@
+"""Classifiers that map clinical codes to feature categories.
+
+Each classifier builds an index over its mapping once. Codes in a column are
+deduplicated, each distinct code is classified once and the results are
+broadcast back to every row. Extracts typically contain a few thousand distinct
+codes over millions of rows, so this is much faster than `Series.replace`.
+"""
+
+import re
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from avoidable_admissions.data import opcs4
+
+
+def _normalise_icd10(code: str) -> str:
+    # ICD-10 codes may be recorded with a dot and in lower case e.g. j45.0
+    return code.strip().upper().replace(".", "")
+
+
+class ICD10Classifier:
+    """Map ICD-10 codes to categories using an exact code index with a 3 character fallback.
+
+    A code is first looked up in `mapping` as is, typically a 4 character code
+    such as `U071`. If there is no match, the 3 character category (e.g. `J45`)
+    is looked up in `mapping_3char`. Codes that match neither are assigned `default`.
+
+    Codes are normalised to upper case without dots before lookup.
+
+    Args:
+        mapping (dict): Exact code to category mapping
+        mapping_3char (dict, optional): 3 character code to category mapping
+            used when there is no exact match. Defaults to None.
+        default (str, optional): Category for unmatched and missing codes. Defaults to "-".
+
+    ## Example
+
+    ```python
+    classifier = ICD10Classifier(
+        feature_maps.admdiag_seasonal_4char,
+        feature_maps.admdiag_seasonal_3char,
+    )
+    df["diag_seasonal_cat"] = classifier.classify(df.diag_01)
+    ```
+    """
+
+    def __init__(
+        self,
+        mapping: Dict[str, str],
+        mapping_3char: Optional[Dict[str, str]] = None,
+        default: str = "-",
+    ):
+        self.index = {_normalise_icd10(k): v for k, v in mapping.items()}
+        self.index_3char = {
+            _normalise_icd10(k): v for k, v in (mapping_3char or {}).items()
+        }
+        self.default = default
+
+    def classify_codes(self, codes: np.ndarray) -> np.ndarray:
+        """Classify an array of distinct, non-missing codes.
+
+        Args:
+            codes (np.ndarray): ICD-10 codes
+
+        Returns:
+            np.ndarray: Category for each code
+        """
+
+        categories = np.empty(len(codes), dtype=object)
+
+        for i, code in enumerate(codes):
+            code = _normalise_icd10(str(code))
+            category = self.index.get(code)
+            if category is None:
+                category = self.index_3char.get(code[:3], self.default)
+            categories[i] = category
+
+        return categories
+
+    def classify(self, codes: pd.Series) -> pd.Series:
+        """Classify a column of ICD-10 codes.
+
+        Args:
+            codes (pd.Series): ICD-10 codes. Missing values are assigned `default`.
+
+        Returns:
+            pd.Series: Category for each row with the same index as `codes`
+        """
+
+        positions, uniques = pd.factorize(codes)
+
+        # factorize sets missing values to -1 which picks `default` from the end
+        categories = np.append(self.classify_codes(np.asarray(uniques)), self.default)
+
+        return pd.Series(categories[positions], index=codes.index, name=codes.name)
+
+
+class OPCS4Classifier:
+    """Tag OPCS-4 procedure codes across a block of `opertn_NN` columns.
+
+    Each distinct code across all columns is looked up once in the OPCS-4 reference
+    with [avoidable_admissions.data.opcs4.lookup][] and tagged as one of:
+
+    - `VALID`: a procedure code
+    - `EXCLUDED`: not counted as a procedure. These are X998, X999, subsidiary
+        site and method codes (O, Y and Z chapters), `-` for no procedure, codes
+        that are not in the reference, and codes matching `exclude`.
+    - `MISSING`: missing value
+
+    Tags are then broadcast back to a 2 dimensional array with one row per episode.
+
+    Args:
+        exclude (str, optional): Regular expression for further codes that are not
+            counted as procedures. A code is excluded if the pattern matches anywhere
+            in the code in upper case without a dot. Defaults to None.
+        reference (pd.Index, optional): Full list of valid OPCS-4 codes.
+            Defaults to [avoidable_admissions.data.opcs4.load_codes][].
+
+    ## Example
+
+    ```python
+    classifier = OPCS4Classifier()
+    df["opertn_count"] = classifier.count_valid(df.filter(regex="opertn_[0-9]{2}$"))
+    ```
+    """
+
+    VALID = 1
+    EXCLUDED = 0
+    MISSING = -1
+
+    def __init__(
+        self, exclude: Optional[str] = None, reference: Optional[pd.Index] = None
+    ):
+        self.exclude = re.compile(exclude) if exclude else None
+        self.reference = reference
+
+    def code_status(self, codes: np.ndarray) -> np.ndarray:
+        """Tag an array of distinct, non-missing codes as `VALID` or `EXCLUDED`.
+
+        Args:
+            codes (np.ndarray): OPCS-4 codes
+
+        Returns:
+            np.ndarray: int8 array of tags
+        """
+
+        return self._code_status(codes, opcs4.lookup(codes, self.reference))
+
+    def _code_status(self, codes: np.ndarray, found: pd.DataFrame) -> np.ndarray:
+        # Tags from the reference lookup of the same codes
+
+        procedure = found["procedure"].to_numpy(dtype=bool)
+
+        if self.exclude is not None:
+            procedure &= np.array(
+                [not self.exclude.search(code) for code in found["code"]], dtype=bool
+            )
+
+        return np.where(procedure, self.VALID, self.EXCLUDED).astype(np.int8)
+
+    def factorize(self, procedures: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Deduplicate codes across all columns.
+
+        Args:
+            procedures (pd.DataFrame): One column per procedure e.g. `opertn_01` to `opertn_12`
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Position of each cell in the distinct codes
+                (-1 for missing values) with the same shape as `procedures`, and the distinct codes.
+        """
+
+        values = procedures.to_numpy(dtype=object)
+        positions, uniques = pd.factorize(values.ravel())
+
+        return positions.reshape(values.shape), np.asarray(uniques, dtype=object)
+
+    def status(self, procedures: pd.DataFrame) -> np.ndarray:
+        """Tag every cell in a block of procedure columns.
+
+        Args:
+            procedures (pd.DataFrame): One column per procedure
+
+        Returns:
+            np.ndarray: int8 array of tags with the same shape as `procedures`
+        """
+
+        positions, uniques = self.factorize(procedures)
+        status = np.append(self.code_status(uniques), np.int8(self.MISSING))
+
+        return status[positions]
+
+    def count_valid(self, procedures: pd.DataFrame) -> np.ndarray:
+        """Count valid procedure codes in each row.
+
+        Args:
+            procedures (pd.DataFrame): One column per procedure
+
+        Returns:
+            np.ndarray: int64 count per row
+        """
+
+        return (self.status(procedures) == self.VALID).sum(axis=1, dtype=np.int64)
+
+    def chapter(self, procedures: pd.DataFrame) -> np.ndarray:
+        """OPCS-4 chapter (first character) of every valid code.
+
+        Args:
+            procedures (pd.DataFrame): One column per procedure
+
+        Returns:
+            np.ndarray: Object array with the same shape as `procedures`.
+                Excluded and missing codes are `None`.
+        """
+
+        positions, uniques = self.factorize(procedures)
+        found = opcs4.lookup(uniques, self.reference)
+        status = self._code_status(uniques, found)
+
+        chapters = np.append(
+            np.where(
+                status == self.VALID, found["chapter"].to_numpy(dtype=object), None
+            ),
+            None,
+        )
+
+        return chapters[positions]
@@ -1,12 +1,20 @@
 import numpy as np
 import pandas as pd
 
-from avoidable_admissions.features import feature_maps
+from avoidable_admissions.features import feature_maps, kernels
+from avoidable_admissions.utils.instrumentation import instrumented
 
 
 def replace_values(
-    data: pd.Series, replacements: dict, other: str = "ERROR:Unmapped - Not In Refset"
+    data: pd.Series,
+    replacements: dict,
+    other: str = "ERROR:Unmapped - Not In Refset",
+    dates: pd.Series = None,
 ) -> pd.Series:
+    # Maps of refset codes use the release in force on the arrival date of each row
+    if dates is not None and isinstance(replacements, feature_maps.RefsetMap):
+        return replacements.replace(data, dates, other)
+
     # if value is in replacements, keep the value, else use `other` for all others
     # then use replacements to assign the other categories
 
@@ -17,16 +25,15 @@ def replace_values(
     return data_cat
 
 
+@instrumented()
 def _age(df: pd.DataFrame) -> pd.DataFrame:
 
-    age_labels = feature_maps.age_labels
-    age_bins = feature_maps.age_bins
-    df["activage_cat"] = pd.cut(df.activage, bins=age_bins, labels=age_labels, right=False)
-    df["activage_cat"] = df["activage_cat"].astype(str)
+    df["activage_cat"] = kernels.age_band(df.activage)
 
     return df
 
 
+@instrumented()
 def _gender(df: pd.DataFrame) -> pd.DataFrame:
 
     df["gender_cat"] = replace_values(df.gender.astype(str), feature_maps.gender)
@@ -34,6 +41,7 @@ def _gender(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumented()
 def _ethnos(df: pd.DataFrame) -> pd.DataFrame:
 
     df["ethnos_cat"] = replace_values(df.ethnos, feature_maps.ethnos)
@@ -41,42 +49,53 @@ def _ethnos(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumented()
 def _accommodationstatus(df: pd.DataFrame) -> pd.DataFrame:
 
     df["accommodationstatus_cat"] = replace_values(
-        df.accommodationstatus, feature_maps.accommodationstatus
+        df.accommodationstatus,
+        feature_maps.accommodationstatus,
+        dates=df.get("edarrivaldatetime"),
     )
 
     return df
 
 
+@instrumented()
 def _edarrivaldatetime(df: pd.DataFrame) -> pd.DataFrame:
 
-    df.edarrivaldatetime = pd.to_datetime(df.edarrivaldatetime)
-    df["edarrival_dayofweek"] = df.edarrivaldatetime.dt.strftime("%A")
-    df["edarrival_hourofday"] = df.edarrivaldatetime.dt.hour
+    df.edarrivaldatetime = kernels.parse_datetime(df.edarrivaldatetime)
+    df["edarrival_dayofweek"] = kernels.day_of_week(df.edarrivaldatetime)
+    df["edarrival_hourofday"] = kernels.hour_of_day(df.edarrivaldatetime)
 
     return df
 
 
+@instrumented()
 def _edarivalemode(df: pd.DataFrame) -> pd.DataFrame:
 
     df["edarrivalmode_cat"] = replace_values(
-        df.edarrivalmode, feature_maps.edarrivalmode
+        df.edarrivalmode,
+        feature_maps.edarrivalmode,
+        dates=df.get("edarrivaldatetime"),
     )
 
     return df
 
 
+@instrumented()
 def _edattendsource(df: pd.DataFrame) -> pd.DataFrame:
 
     df["edattendsource_cat"] = replace_values(
-        df.edattendsource, feature_maps.edattendsource
+        df.edattendsource,
+        feature_maps.edattendsource,
+        dates=df.get("edarrivaldatetime"),
     )
 
     return df
 
 
+@instrumented()
 def _edacuity(df: pd.DataFrame) -> pd.DataFrame:
 
     df["edacuity_cat"] = replace_values(df.edacuity, feature_maps.edacuity)
@@ -84,58 +103,71 @@ def _edacuity(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumented()
 def _edinvest(df: pd.DataFrame) -> pd.DataFrame:
 
     cols = df.filter(regex="edinvest_[0-9]{2}$").columns
     replacements = feature_maps.edinvest
+    dates = df.get("edarrivaldatetime")
 
     for col in cols:
 
-        df[col + "_cat"] = replace_values(df[col], replacements, "Urgent")
+        df[col + "_cat"] = replace_values(df[col], replacements, "Urgent", dates)
 
     return df
 
 
+@instrumented()
 def _edtreat(df: pd.DataFrame) -> pd.DataFrame:
 
     cols = df.filter(regex="edtreat_[0-9]{2}$").columns
     replacements = feature_maps.edtreat
+    dates = df.get("edarrivaldatetime")
     for col in cols:
 
-        df[col + "_cat"] = replace_values(df[col], replacements, "Urgent")
+        df[col + "_cat"] = replace_values(df[col], replacements, "Urgent", dates)
 
     return df
 
 
+@instrumented()
 def _eddiag_seasonal(df: pd.DataFrame) -> pd.DataFrame:
     # Only use first diagnosis recorded (eddiag_01) to record seasonal diagnosis
 
     df["eddiag_seasonal_cat"] = replace_values(
-        df.eddiag_01, feature_maps.eddiag_seasonal
+        df.eddiag_01, feature_maps.eddiag_seasonal, dates=df.get("edarrivaldatetime")
     )
 
     return df
 
 
+@instrumented()
 def _edattenddispatch(df: pd.DataFrame) -> pd.DataFrame:
     # Discharge Destination
 
     df["edattenddispatch_cat"] = replace_values(
-        df.edattenddispatch, feature_maps.edattenddispatch
+        df.edattenddispatch,
+        feature_maps.edattenddispatch,
+        dates=df.get("edarrivaldatetime"),
     )
 
     return df
 
 
+@instrumented()
 def _edrefservice(df: pd.DataFrame) -> pd.DataFrame:
 
     df["edrefservice_cat"] = replace_values(
-        df.edrefservice, feature_maps.edrefservice, "Other"
+        df.edrefservice,
+        feature_maps.edrefservice,
+        "Other",
+        dates=df.get("edarrivaldatetime"),
     )
 
     return df
 
 
+@instrumented()
 def _eddiagqual(df: pd.DataFrame) -> pd.DataFrame:
     # Only applicable to eddiag_01
 
@@ -144,6 +176,7 @@ def _eddiagqual(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumented()
 def _acsc_code(df: pd.DataFrame) -> pd.DataFrame:
 
     # TODO: This section needs manual review of a good sample size to ensure it works
@@ -154,12 +187,30 @@ def _acsc_code(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumented()
 def _disstatus(df: pd.DataFrame) -> pd.DataFrame:
 
-    df["disstatus_cat"] = replace_values(df.disstatus, feature_maps.disstatus)
+    df["disstatus_cat"] = replace_values(
+        df.disstatus, feature_maps.disstatus, dates=df.get("edarrivaldatetime")
+    )
 
     return df
 
+
+@instrumented()
+def _edcomorb(df: pd.DataFrame) -> pd.DataFrame:
+
+    # Missing SNOMED codes are filled with 0 before validation
+
+    df["edcomorb_count"] = kernels.count_repeating_group(
+        df, "edcomorb_[0-9]{2}$", missing_values=[0]
+    )
+    df["edcomorb_cat"] = kernels.yes_no(df["edcomorb_count"])
+
+    return df
+
+
+@instrumented()
 def _cc_code(df: pd.DataFrame) -> pd.DataFrame:
 
     # TODO: This section needs manual review of a good sample size to ensure it works
@@ -170,7 +221,7 @@ def _cc_code(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-
+@instrumented()
 def build_all(df: pd.DataFrame) -> pd.DataFrame:
 
     df = (
@@ -184,6 +235,7 @@ def build_all(df: pd.DataFrame) -> pd.DataFrame:
         .pipe(_edarrivaldatetime)
         .pipe(_edattenddispatch)
         .pipe(_edattendsource)
+        .pipe(_edcomorb)
         .pipe(_eddiag_seasonal)
         .pipe(_eddiagqual)
         .pipe(_edinvest)
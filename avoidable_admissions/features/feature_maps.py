@@ -5,10 +5,7 @@ import numpy as np
 import pandas as pd
 import os.path
 
-from avoidable_admissions.data import nhsdd_snomed
-
-# to prevent accidentally removing nhsdd_snomed import which is used in eval
-_ = nhsdd_snomed.__doc__
+from avoidable_admissions.data import nhsdd_snomed, snomed_hierarchy, snomed_refsets
 
 age_labels = [
     "18-19",
@@ -30,6 +27,23 @@ age_labels = [
 
 age_bins = age_bins = [17, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 80, 85, 130]
 
+# Position in age_labels for every whole year of age from 0 to the last age_bin.
+# Equivalent to `pd.cut(age, bins=age_bins, right=False).codes` with -1 for ages outside age_bins.
+_ages = np.arange(age_bins[-1] + 1)
+age_band_codes = np.searchsorted(age_bins, _ages, side="right") - 1
+age_band_codes[(_ages < age_bins[0]) | (_ages >= age_bins[-1])] = -1
+
+# Index is the day of week as returned by `Series.dt.dayofweek`
+day_of_week_labels = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
 gender = {
     "1": "Male",
     "2": "Female",
@@ -157,28 +171,69 @@ dismeth = {
 }
 
 
-def generate_map(name: str, feature_r: dict) -> dict:
+class RefsetMap(dict):
+    """Map of SNOMED codes to categories for each release of the refset.
 
-    # First generate a reverse map as snomed_code:category
+    As a dict, codes that are a member of the refset in any release are mapped
+    to their category, as before releases were tracked.
+    Use `replace` to map each row with the release in force on its activity date.
+    """
 
-    feature = {
-        snomed_code: category
-        for category, snomed_list in feature_r.items()
-        for snomed_code in snomed_list
-    }
+    def __init__(self, name: str, union: dict, releases: list):
+        super().__init__(union)
+        self.name = name
+        self.releases = releases
 
-    # Get the members of the refset from nhsdd_snomed
-    # This file has been automatically generated from the Ontology Server
-    refset_members = eval(f"nhsdd_snomed.{name}['members']")
+    def categories(self) -> set:
+        """All values that the map may assign in any release."""
+
+        return set(self.values()).union(*(r.values() for r in self.releases))
+
+    def replace(self, data: pd.Series, dates: pd.Series, other: str) -> pd.Series:
+        """Map codes with the release of the refset in force on each date.
+
+        Each distinct pair of code and release is mapped once.
+
+        Args:
+            data (pd.Series): SNOMED codes
+            dates (pd.Series): Activity date of each row e.g. `edarrivaldatetime`
+            other (str): Value for codes that are not in the map, and missing codes
+
+        Returns:
+            pd.Series: Category of each code
+        """
+
+        release = snomed_refsets.load_store().release_index(dates)
+
+        positions, uniques = pd.factorize(data)
+        n_releases = len(self.releases)
+
+        # Missing codes have a negative pair
+        pairs = positions.astype(np.int64) * n_releases + release
+        distinct, inverse = np.unique(pairs, return_inverse=True)
+
+        values = np.array(
+            [
+                self.releases[p % n_releases].get(uniques[p // n_releases], other)
+                if p >= 0
+                else other
+                for p in distinct
+            ],
+            dtype=object,
+        )
+
+        return pd.Series(values[inverse], index=data.index, name=data.name).astype(str)
 
-    # Create a set of all snomed codes in feature
-    feature_members = feature.keys()
+
+def _release_map(feature: dict, codes: list, refset_members: set) -> dict:
+
+    feature = dict(feature)
 
     # Unmapped codes are the codes in the refset that are not in feature
     # For each code in refset that is not in feature, set to 'unmapped'
 
-    for i in refset_members:
-        if i not in feature_members:
+    for i in codes:
+        if i in refset_members and i not in feature:
             feature[i] = "ERROR:Unmapped - In Refset"
 
     # For codes that appear in the mapping but not in the refset
@@ -198,6 +253,38 @@ def generate_map(name: str, feature_r: dict) -> dict:
     return feature
 
 
+def generate_map(name: str, feature_r: dict) -> RefsetMap:
+
+    # First generate a reverse map as snomed_code:category
+
+    feature = {
+        snomed_code: category
+        for category, snomed_list in feature_r.items()
+        for snomed_code in snomed_list
+    }
+
+    # Descendants of mapped codes take their category if the hierarchy is available
+    feature = snomed_hierarchy.extend_map(feature)
+
+    # Get the members of the refset in each release, starting with nhsdd_snomed
+    # which has been automatically generated from the Ontology Server
+    store = snomed_refsets.load_store()
+
+    # Codes of all releases in the order of nhsdd_snomed then later releases,
+    # so that the order of the map does not depend on the releases loaded
+    codes = [*getattr(nhsdd_snomed, name)["members"], *store.members(name).tolist()]
+    codes = list(dict.fromkeys(codes))
+
+    union = _release_map(feature, codes, set(codes))
+
+    releases = [
+        _release_map(feature, codes, set(store.members(name, release).tolist()))
+        for release in range(store.n_releases)
+    ]
+
+    return RefsetMap(name, union, releases)
+
+
 ##############################################################################
 # accommodationstatus
 ##############################################################################
@@ -544,13 +631,15 @@ def load_ed_acsc_mapping() -> Dict[str, str]:
     acsc.columns = acsc.columns.str.strip()
     acsc.columns = acsc.columns.str.lower().str.replace("[^a-z0-9]+", "_", regex=True)
     acsc_mapping = acsc.set_index("snomed_code").aec_clinical_conditions.to_dict()
+    acsc_mapping = snomed_hierarchy.extend_map(acsc_mapping)
 
     # Set ERROR codes to allow validation to pass after feature engineering
     # TODO: Tidy this up
 
-    # Get the members of the refset from nhsdd_snomed
-    # This file has been automatically generated from the Ontology Server
-    refset_members = nhsdd_snomed.eddiag["members"]
+    # Get the members of the refset in any release, starting with nhsdd_snomed
+    # which has been automatically generated from the Ontology Server
+    refset_members = snomed_refsets.load_store().members("eddiag")
+    refset_members = set(refset_members.tolist())
 
     # Create a set of all snomed codes in feature
     feature_members = acsc_mapping.keys()
@@ -597,13 +686,15 @@ def load_ed_cc_mapping() -> Dict[str, str]:
     cc.columns = cc.columns.str.strip()
     cc.columns = cc.columns.str.lower().str.replace("[^a-z0-9]+", "_", regex=True)
     cc_mapping = cc.set_index("snomed_code").chief_complain_category.to_dict()
+    cc_mapping = snomed_hierarchy.extend_map(cc_mapping)
 
     # Set ERROR codes to allow validation to pass after feature engineering
     # TODO: Tidy this up
 
-    # Get the members of the refset from nhsdd_snomed
-    # This file has been automatically generated from the Ontology Server
-    refset_members = nhsdd_snomed.edchiefcomplaint["members"]
+    # Get the members of the refset in any release, starting with nhsdd_snomed
+    # which has been automatically generated from the Ontology Server
+    refset_members = snomed_refsets.load_store().members("edchiefcomplaint")
+    refset_members = set(refset_members.tolist())
 
     # Create a set of all snomed codes in feature
     feature_members = cc_mapping.keys()
@@ -0,0 +1,319 @@
+"""Incremental refresh of a feature store.
+
+Each refresh of the extract mostly contains rows that have not changed since the
+last run. A hash of every source row is stored alongside the features so that only
+new or changed `visit_id`s are validated, built and merged into the store.
+
+`visit_id` must be a stable identifier from the source system for this to work.
+Do not use the row number of the extract.
+
+Requires `pyarrow`. Install with `pip install avoidable_admissions[arrow]`.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+import avoidable_admissions
+from avoidable_admissions.data import feature_store, icd10, opcs4, snomed_refsets
+from avoidable_admissions.data.validate import (
+    AdmittedCareEpisodeSchema,
+    AdmittedCareFeatureSchema,
+    EmergencyCareEpisodeSchema,
+    EmergencyCareFeatureSchema,
+    validate_dataframe,
+)
+from avoidable_admissions.features import build_features, feature_maps
+
+HASHES_FILE = "_row_hashes.parquet"
+MANIFEST_FILE = "_manifest.json"
+
+
+def _is_admitted_care(df: pd.DataFrame) -> bool:
+    return feature_store._cohort_date_col(df.columns) == "admidate"
+
+
+def _codes_version(codes: Optional[pd.Index]) -> Optional[str]:
+    # Reference code lists can be large so only their hash is kept
+
+    if codes is None:
+        return None
+
+    return hashlib.sha1("\n".join(codes).encode()).hexdigest()
+
+
+def mapping_version(admitted_care: bool) -> str:
+    """Fingerprint of the package version and every mapping and reference used to
+    validate data and build features.
+
+    A change in this value means stored features may be out of date
+    and triggers a full rebuild.
+
+    Args:
+        admitted_care (bool): True for admitted care, False for emergency care
+
+    Returns:
+        str: Hex digest
+    """
+
+    mappings = {
+        name: value.tolist() if isinstance(value, np.ndarray) else value
+        for name, value in sorted(vars(feature_maps).items())
+        if not name.startswith("_") and isinstance(value, (dict, list, np.ndarray))
+    }
+
+    # Maps of refset codes differ by release, which the union map does not show
+    for name, value in mappings.items():
+        if isinstance(value, feature_maps.RefsetMap):
+            mappings[name] = {"union": dict(value), "releases": value.releases}
+
+    if admitted_care:
+        mappings["apc_acsc"] = feature_maps.load_apc_acsc_mapping()
+        # Code lists set by ICD10_CODES_PATH and OPCS4_CODES_PATH change which rows
+        # pass validation and which codes count in opertn_count
+        mappings["icd10_codes"] = _codes_version(icd10.load_codes())
+        mappings["opcs4_codes"] = _codes_version(opcs4.load_codes())
+        mappings["opcs4_chapters"] = opcs4.load_chapters().to_csv()
+    else:
+        mappings["ed_acsc"] = feature_maps.load_ed_acsc_mapping()
+        mappings["ed_cc"] = feature_maps.load_ed_cc_mapping()
+        mappings["snomed_refsets"] = snomed_refsets.load_store().fingerprint()
+
+    version = hashlib.sha1(avoidable_admissions.__version__.encode())
+    version.update(json.dumps(mappings, sort_keys=True, default=str).encode())
+
+    return version.hexdigest()
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """Hash of every row using all columns in a fixed order.
+
+    Args:
+        df (pd.DataFrame): Source data before feature engineering
+
+    Returns:
+        np.ndarray: uint64 hash per row
+    """
+
+    return pd.util.hash_pandas_object(df[sorted(df.columns)], index=False).to_numpy()
+
+
+def _read_manifest(path: str) -> dict:
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _clear_store(path: str, force: bool) -> None:
+    # Remove the partitions, hashes and manifest of a store before a rebuild.
+    # Other files in path are never removed.
+
+    has_manifest = os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+    if os.path.isdir(path) and os.listdir(path) and not has_manifest and not force:
+        raise ValueError(
+            f"{path} is not empty and is not a feature store written by "
+            "update_features. Check the path, or pass force=True to replace the "
+            "features in it."
+        )
+
+    for partition in glob.glob(os.path.join(path, "period=*")):
+        shutil.rmtree(partition)
+
+    for file in (HASHES_FILE, MANIFEST_FILE):
+        if os.path.isfile(os.path.join(path, file)):
+            os.remove(os.path.join(path, file))
+
+
+def _read_hashes(path: str) -> pd.DataFrame:
+    try:
+        return pd.read_parquet(os.path.join(path, HASHES_FILE))
+    except FileNotFoundError:
+        return pd.DataFrame(
+            {
+                "visit_id": pd.Series(dtype=str),
+                "row_hash": pd.Series(dtype=np.uint64),
+                "period": pd.Series(dtype=str),
+                "procodet": pd.Series(dtype=str),
+            }
+        )
+
+
+def _merge_into_store(path: str, features: pd.DataFrame, stale: pd.DataFrame) -> None:
+    # Rewrite only the partitions that receive new rows or lose stale rows
+
+    date_col = feature_store._cohort_date_col(features.columns)
+
+    partitions = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "period": feature_store._period(features[date_col]),
+                    "procodet": features["procodet"].astype(str).to_numpy(),
+                }
+            ),
+            stale[["period", "procodet"]],
+        ]
+    ).drop_duplicates()
+
+    if partitions.empty:
+        return
+
+    existing = pd.DataFrame()
+
+    if os.path.isdir(path) and feature_store._dataset(path).files:
+        existing = feature_store.read_features(
+            path,
+            filter=ds.field("period").isin(list(partitions.period.unique()))
+            & ds.field("procodet").isin(list(partitions.procodet.unique())),
+        )
+        existing = existing[~existing.visit_id.isin(stale.visit_id)]
+
+    merged = pd.concat([existing, features], ignore_index=True)
+
+    # Partitions left with no rows are not rewritten so remove them here
+    remaining = set(
+        zip(feature_store._period(merged[date_col]), merged["procodet"].astype(str))
+    )
+    for period, procodet in partitions.itertuples(index=False):
+        if (period, procodet) not in remaining:
+            shutil.rmtree(
+                os.path.join(path, f"period={period}", f"procodet={procodet}"),
+                ignore_errors=True,
+            )
+
+    if not merged.empty:
+        feature_store.write_features(merged, path)
+
+
+def update_features(
+    df: pd.DataFrame, path: str, force: bool = False, **kwargs
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Validate and build features for new or changed rows only and merge them into the feature store.
+
+    1. Rows are hashed and compared with hashes stored by the previous run using `visit_id`.
+    2. New and changed rows are validated against the Episode schema, features are built
+        and validated against the Feature schema.
+    3. Rows that pass are merged into the store at `path`, replacing earlier versions.
+
+    Rows that fail validation are not stored and are checked again on the next run.
+    Rows not present in `df` are left in the store.
+
+    If the package version or any mapping in `feature_maps` has changed since the
+    last run, or `force` is True, the store is rebuilt from `df`. A rebuild removes
+    the `period=*` partitions, row hashes and manifest in `path` and leaves other
+    files in place.
+
+    Args:
+        df (pd.DataFrame): Admitted care or emergency care data as used for the first validation step
+        path (str): Root directory of the feature store. A `ValueError` is raised if
+            it holds files but was not written by `update_features`, unless `force`
+            is True.
+        force (bool, optional): Rebuild the store from `df`, including a store written
+            by [avoidable_admissions.data.feature_store.write_features][].
+            Defaults to False.
+        kwargs: Passed to [avoidable_admissions.data.validate.validate_dataframe][]
+            for both validation steps e.g. `start_date`, `end_date`
+
+    Returns:
+        _Good_ features that were added or updated, and _bad_ rows from both validation steps.
+
+    ## Example
+
+    ```python
+    from avoidable_admissions.features.incremental import update_features
+
+    good_f, bad = update_features(df, "../data/processed/admitted_care")
+    ```
+    """
+
+    admitted_care = _is_admitted_care(df)
+
+    if admitted_care:
+        episode_schema, feature_schema = (
+            AdmittedCareEpisodeSchema,
+            AdmittedCareFeatureSchema,
+        )
+        build = build_features.build_admitted_care_features
+    else:
+        episode_schema, feature_schema = (
+            EmergencyCareEpisodeSchema,
+            EmergencyCareFeatureSchema,
+        )
+        build = build_features.build_emergency_care_features
+
+    version = mapping_version(admitted_care)
+
+    if force or _read_manifest(path).get("mapping_version") != version:
+        _clear_store(path, force)
+        print("Rebuilding all features in", path)
+
+    stored = _read_hashes(path)
+
+    hashes = pd.DataFrame(
+        {"visit_id": df["visit_id"].astype(str).to_numpy(), "row_hash": row_hashes(df)}
+    )
+
+    # Nullable integers keep the full 64 bit hash for visit_ids not seen before
+    stored_hash = hashes.visit_id.map(
+        stored.set_index("visit_id").row_hash.astype("UInt64")
+    ).astype("UInt64")
+    is_changed = (hashes.row_hash != stored_hash).fillna(True).to_numpy(dtype=bool)
+
+    print(
+        f"{is_changed.sum()} new or changed rows out of {len(df)}."
+        f" {len(df) - is_changed.sum()} rows are unchanged."
+    )
+
+    good, bad = validate_dataframe(df[is_changed], episode_schema, **kwargs)
+
+    features = build(good)
+
+    good_f, bad_f = validate_dataframe(
+        features,
+        feature_schema,
+        validation_token=good.attrs["validation_token"],
+        **kwargs,
+    )
+
+    changed_ids = set(hashes.visit_id[is_changed])
+    stale = stored[stored.visit_id.isin(changed_ids)]
+
+    _merge_into_store(path, good_f, stale)
+
+    date_col = feature_store._cohort_date_col(good_f.columns)
+    stored_ids = good_f["visit_id"].astype(str)
+
+    new_hashes = pd.DataFrame(
+        {
+            "visit_id": stored_ids.to_numpy(),
+            "row_hash": hashes.set_index("visit_id")
+            .row_hash.loc[stored_ids]
+            .to_numpy(),
+            "period": feature_store._period(good_f[date_col]),
+            "procodet": good_f["procodet"].astype(str).to_numpy(),
+        }
+    )
+
+    os.makedirs(path, exist_ok=True)
+
+    pd.concat(
+        [stored[~stored.visit_id.isin(changed_ids)], new_hashes], ignore_index=True
+    ).to_parquet(os.path.join(path, HASHES_FILE), index=False)
+
+    with open(os.path.join(path, MANIFEST_FILE), "wt") as f:
+        json.dump(
+            {"mapping_version": version, "updated": datetime.now().isoformat()}, f
+        )
+
+    return good_f, pd.concat([bad, bad_f], ignore_index=True)
@@ -0,0 +1,221 @@
+"""Vectorised building blocks shared by admitted care and emergency care features."""
+
+import re
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from avoidable_admissions.features import feature_maps
+
+
+def age_band(age: pd.Series) -> pd.Series:
+    """Assign ages to the bands defined in `feature_maps.age_labels`.
+
+    Ages are whole years so banding is a single lookup into
+    `feature_maps.age_band_codes` instead of a binary search per value.
+    Fractional ages are truncated which gives the same band as `pd.cut`
+    as all bin edges are whole numbers.
+
+    Args:
+        age (pd.Series): Age in years. May contain missing values.
+
+    Returns:
+        pd.Series: Ordered categorical of age bands.
+            Missing and out of range ages are returned as `NaN`.
+    """
+
+    band_codes = feature_maps.age_band_codes
+
+    values = age.to_numpy(dtype=float, na_value=np.nan)
+
+    # NaN compares False so missing values are excluded here
+    in_range = (values >= 0) & (values < len(band_codes))
+
+    positions = np.zeros(len(values), dtype=np.intp)
+    positions[in_range] = values[in_range].astype(np.intp)
+
+    codes = np.where(in_range, band_codes[positions], -1)
+
+    bands = pd.Categorical.from_codes(
+        codes, categories=feature_maps.age_labels, ordered=True
+    )
+
+    return pd.Series(bands, index=age.index, name=age.name)
+
+
+def count_repeating_group(
+    df: pd.DataFrame,
+    pattern: str,
+    exclude: Iterable[str] = (),
+    valid: Optional[str] = None,
+    missing_values: Iterable = (),
+) -> np.ndarray:
+    """Count recorded codes in a repeating group of columns such as `diag_NN`.
+
+    Works on whichever columns matching `pattern` are present.
+    Each distinct value across the group is checked once and the result is
+    broadcast back to every cell before counting across each row.
+
+    Args:
+        df (pd.DataFrame): Dataframe containing the repeating group
+        pattern (str): Regular expression for column names e.g. `"diag_[0-9]{2}$"`
+        exclude (Iterable[str], optional): Columns matching `pattern` to leave out e.g. `["diag_01"]`
+        valid (str, optional): Only count codes matching this regular expression
+            e.g. `icd10.code_pattern`. The text `nan` of missing values in columns
+            cast with `astype(str)` is not counted even if it matches.
+            Defaults to None which counts all recorded codes.
+        missing_values (Iterable, optional): Values other than `NaN` that denote missing data
+            e.g. `[0]` for SNOMED codes.
+
+    Returns:
+        np.ndarray: int64 count per row
+    """
+
+    cols = [c for c in df.filter(regex=pattern).columns if c not in set(exclude)]
+
+    if not cols:
+        return np.zeros(len(df), dtype=np.int64)
+
+    values = df[cols].to_numpy()
+    positions, uniques = pd.factorize(values.ravel())
+
+    counted = ~pd.Series(uniques).isin(list(missing_values)).to_numpy()
+
+    if valid is not None:
+        matcher = re.compile(valid)
+        counted &= np.array(
+            [
+                bool(matcher.match(str(code))) and str(code).strip().lower() != "nan"
+                for code in uniques
+            ],
+            dtype=bool,
+        )
+
+    # factorize sets missing values to -1 which picks False from the end
+    counted = np.append(counted, False)[positions.reshape(values.shape)]
+
+    return counted.sum(axis=1, dtype=np.int64)
+
+
+def yes_no(counts: np.ndarray) -> np.ndarray:
+    """Categorise counts as "Yes" if greater than zero else "No"."""
+
+    return np.where(np.asarray(counts) > 0, "Yes", "No").astype(object)
+
+
+def parse_datetime(
+    values: pd.Series, format: Optional[str] = None, dayfirst: bool = False, **kwargs
+) -> pd.Series:
+    """Convert a column to datetime, parsing each distinct value only once.
+
+    Dates in an extract repeat heavily, so parsing the distinct values and
+    broadcasting the result is much faster than parsing every row.
+    Columns that are already datetime are returned unchanged.
+
+    Args:
+        values (pd.Series): Dates or datetimes as strings
+        format (str, optional): `strftime` format e.g. `"%d/%m/%Y"`.
+            Setting this avoids format inference. Defaults to None.
+        dayfirst (bool, optional): Passed to `pd.to_datetime`. Defaults to False.
+        kwargs: Other keyword arguments passed to `pd.to_datetime` e.g. `utc=True`
+
+    Returns:
+        pd.Series: datetime64 Series with the same index as `values`
+    """
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+
+    positions, uniques = pd.factorize(values)
+
+    parsed = pd.to_datetime(
+        pd.Index(uniques, dtype=object), format=format, dayfirst=dayfirst, **kwargs
+    )
+
+    # factorize sets missing values to -1 which take fills with NaT
+    parsed = parsed.take(positions, allow_fill=True, fill_value=pd.NaT)
+
+    return pd.Series(parsed, index=values.index, name=values.name)
+
+
+def parse_datetime_columns(
+    df: pd.DataFrame,
+    columns: List[str],
+    format: Optional[str] = None,
+    dayfirst: bool = False,
+    **kwargs,
+) -> pd.DataFrame:
+    """Convert several date columns e.g. `opdate_NN` in place, parsing each distinct value once across all of them.
+
+    Args:
+        df (pd.DataFrame): Dataframe to update
+        columns (List[str]): Columns to convert
+        format (str, optional): `strftime` format. Defaults to None.
+        dayfirst (bool, optional): Passed to `pd.to_datetime`. Defaults to False.
+        kwargs: Other keyword arguments passed to `pd.to_datetime`
+
+    Returns:
+        pd.DataFrame: `df` with converted columns
+
+    ## Example
+
+    ```python
+    opdate_cols = df.filter(regex="opdate_[0-9]{2}$").columns
+    df = parse_datetime_columns(df, opdate_cols, dayfirst=True)
+    ```
+    """
+
+    columns = [c for c in columns if not pd.api.types.is_datetime64_any_dtype(df[c])]
+
+    if not columns:
+        return df
+
+    values = df[columns].to_numpy(dtype=object)
+    stacked = pd.Series(values.ravel(order="F"))
+    parsed = parse_datetime(stacked, format=format, dayfirst=dayfirst, **kwargs)
+
+    for i, col in enumerate(columns):
+        df[col] = parsed.iloc[i * len(df) : (i + 1) * len(df)].set_axis(df.index)
+
+    return df
+
+
+def day_of_week(dates: pd.Series) -> pd.Series:
+    """Name of the day of week as a categorical from `feature_maps.day_of_week_labels`.
+
+    Uses the integer day of week instead of formatting every timestamp with `strftime`.
+
+    Args:
+        dates (pd.Series): datetime64 Series
+
+    Returns:
+        pd.Series: Ordered categorical. Missing dates are returned as `NaN`.
+    """
+
+    codes = dates.dt.dayofweek.to_numpy(dtype=float, na_value=np.nan)
+    codes = np.nan_to_num(codes, nan=-1).astype(np.int8)
+
+    days = pd.Categorical.from_codes(
+        codes, categories=feature_maps.day_of_week_labels, ordered=True
+    )
+
+    return pd.Series(days, index=dates.index, name=dates.name)
+
+
+def hour_of_day(dates: pd.Series) -> pd.Series:
+    """Hour of day (0-23) as int64, or float64 if there are missing dates.
+
+    Args:
+        dates (pd.Series): datetime64 Series
+
+    Returns:
+        pd.Series: Hour of day
+    """
+
+    hours = dates.dt.hour
+
+    if hours.hasnans:
+        return hours.astype(float)
+
+    return hours.astype(np.int64)
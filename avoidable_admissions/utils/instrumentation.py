@@ -0,0 +1,243 @@
+"""Opt-in timing and memory instrumentation of validation and feature engineering.
+
+Records wall time, CPU time, rows per second and peak memory of every call to
+`validate_dataframe` and of every stage of the admitted care and emergency care
+`build_all` pipelines.
+
+Instrumentation is off by default. Instrumented functions then call straight through
+after a single check, so there is no measurable cost. Enable it for a block of code
+with the `profile` context manager:
+
+```python
+from avoidable_admissions.utils import instrumentation
+
+with instrumentation.profile() as prof:
+    good, bad = validate_dataframe(df, AdmittedCareEpisodeSchema)
+    df_features = build_admitted_care_features(good)
+
+prof.to_frame()
+```
+
+or for a whole run by setting the `AVOIDABLE_ADMISSIONS_PROFILE` environment variable
+before the package is imported. If its value ends in `.json`, records are written to
+that file when Python exits. Otherwise use `instrumentation.records()`.
+
+Peak memory is measured with `tracemalloc`, which slows down the code being measured.
+Pass `memory=False` to `profile` to record times only.
+"""
+
+import atexit
+import functools
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional
+
+import pandas as pd
+
+env_var = "AVOIDABLE_ADMISSIONS_PROFILE"
+
+
+class Profile:
+    """Measurements recorded while instrumentation is enabled.
+
+    Each record has `name`, `detail`, `depth` (nesting level of the call), `rows`,
+    `wall_seconds`, `cpu_seconds`, `rows_per_second`, `peak_memory_mb` and `started`.
+    """
+
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self.records: List[dict] = []
+        self._stack: List[dict] = []
+
+    def to_frame(self) -> pd.DataFrame:
+        """Records as a dataframe with one row per instrumented call."""
+
+        return pd.DataFrame(
+            self.records,
+            columns=[
+                "name",
+                "detail",
+                "depth",
+                "rows",
+                "wall_seconds",
+                "cpu_seconds",
+                "rows_per_second",
+                "peak_memory_mb",
+                "started",
+            ],
+        )
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        """Records as JSON, optionally written to `path`."""
+
+        text = json.dumps(self.records, indent=2, default=str)
+
+        if path is not None:
+            with open(path, "wt") as f:
+                f.write(text)
+
+        return text
+
+
+# Profile that is recording, or None when instrumentation is disabled
+_active: Optional[Profile] = None
+
+
+def enabled() -> bool:
+    """True if instrumentation is recording."""
+
+    return _active is not None
+
+
+def records() -> List[dict]:
+    """Records of the active profile, or an empty list if instrumentation is disabled."""
+
+    return _active.records if _active is not None else []
+
+
+def _start_memory(profile: Profile) -> bool:
+    # Returns True if tracing was started here and should be stopped by the caller
+
+    if profile.memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        return True
+
+    return False
+
+
+@contextmanager
+def profile(memory: bool = True) -> Iterator[Profile]:
+    """Enable instrumentation for the duration of the block.
+
+    Args:
+        memory (bool, optional): Record peak memory with `tracemalloc`. Defaults to True.
+
+    Yields:
+        Profile: Measurements recorded in the block
+    """
+
+    global _active
+
+    previous = _active
+    _active = Profile(memory=memory)
+    started_tracing = _start_memory(_active)
+
+    try:
+        yield _active
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _active = previous
+
+
+def _reset_peak() -> None:
+    # reset_peak is only available from Python 3.9. Peaks are then since tracing started.
+
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+
+
+def _measure(
+    profile: Profile, name: str, detail: Optional[str], rows, func, args, kwargs
+):
+    stack = profile._stack
+    tracing = profile.memory and tracemalloc.is_tracing()
+
+    frame = {"peak": 0, "start": 0}
+
+    if tracing:
+        # The parent's peak so far is kept before resetting the peak for this call
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        frame["start"] = current
+        _reset_peak()
+
+    stack.append(frame)
+
+    started = datetime.now()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+
+    try:
+        return func(*args, **kwargs)
+    finally:
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+
+        stack.pop()
+
+        peak_memory_mb = None
+
+        if tracing:
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            peak_memory_mb = (peak - frame["start"]) / 2**20
+
+        profile.records.append(
+            {
+                "name": name,
+                "detail": detail,
+                "depth": len(stack),
+                "rows": rows,
+                "wall_seconds": wall,
+                "cpu_seconds": cpu,
+                "rows_per_second": rows / wall if rows is not None and wall else None,
+                "peak_memory_mb": peak_memory_mb,
+                "started": started.isoformat(),
+            }
+        )
+
+
+def instrumented(
+    name: Optional[str] = None, detail: Optional[Callable[..., str]] = None
+) -> Callable:
+    """Decorator to record measurements of every call to a function when enabled.
+
+    The number of rows is taken from the first argument if it is a dataframe.
+
+    Args:
+        name (str, optional): Name of the record. Defaults to `module.function`.
+        detail (Callable, optional): Called with the function arguments to describe
+            the call e.g. the name of the schema.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        label = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+
+            rows = len(args[0]) if args and isinstance(args[0], pd.DataFrame) else None
+            description = detail(*args, **kwargs) if detail is not None else None
+
+            return _measure(_active, label, description, rows, func, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _enable_from_environment() -> None:
+    global _active
+
+    value = os.environ.get(env_var)
+
+    if not value or value.lower() in {"0", "false", "no"}:
+        return
+
+    _active = Profile()
+    _start_memory(_active)
+
+    if value.lower().endswith(".json"):
+        atexit.register(_active.to_json, value)
+
+
+_enable_from_environment()
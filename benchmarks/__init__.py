@@ -0,0 +1,5 @@
+"""Throughput benchmarks for pipeline stages.
+
+Run a benchmark as a module from the repository root e.g.
+`python -m benchmarks.pseudonymise`.
+"""
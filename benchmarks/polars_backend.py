@@ -0,0 +1,104 @@
+"""Compare the speed of the Polars and pandas backends.
+
+    python -m benchmarks.polars_backend --rows 100000 --error-rate 0.01
+
+Synthetic extracts with invalid values are validated, used to build features and
+validated again with both backends, and the time taken by each step is printed.
+That both backends give the same results is checked by
+`tests/test_polars_conformance.py`.
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+import pandas as pd
+import polars as pl
+
+from avoidable_admissions.data import validate, validate_polars
+from avoidable_admissions.data.synthetic import (
+    generate_admitted_care,
+    generate_emergency_care,
+)
+from avoidable_admissions.features import build_features, build_features_polars
+
+datasets = {
+    "admitted": (
+        generate_admitted_care,
+        validate.AdmittedCareEpisodeSchema,
+        validate.AdmittedCareFeatureSchema,
+        build_features.build_admitted_care_features,
+        build_features_polars.build_admitted_care_features,
+    ),
+    "emergency": (
+        generate_emergency_care,
+        validate.EmergencyCareEpisodeSchema,
+        validate.EmergencyCareFeatureSchema,
+        build_features.build_emergency_care_features,
+        build_features_polars.build_emergency_care_features,
+    ),
+}
+
+
+def _timed(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        return result, time.perf_counter() - start
+
+
+def run(dataset: str, rows: int, error_rate: float, seed: int = 0) -> pd.DataFrame:
+    """Time each step with both backends on a synthetic extract.
+
+    Args:
+        dataset (str): `admitted` or `emergency`
+        rows (int): Number of rows
+        error_rate (float): Share of rows with an invalid value
+        seed (int, optional): Random seed
+
+    Returns:
+        pd.DataFrame: Seconds taken by each step with each backend
+    """
+
+    generate, episode, feature, build, build_pl = datasets[dataset]
+
+    df = generate(rows, error_rate=error_rate, seed=seed)
+    df_pl = pl.from_pandas(df)
+
+    timings = []
+
+    validated, seconds = _timed(validate.validate_dataframe, df, episode)
+    validated_pl, seconds_pl = _timed(
+        validate_polars.validate_dataframe, df_pl, episode
+    )
+    timings.append(("validate", seconds, seconds_pl))
+
+    features, seconds = _timed(build, validated[0])
+    features_pl, seconds_pl = _timed(build_pl, validated_pl[0])
+    timings.append(("build", seconds, seconds_pl))
+
+    _, seconds = _timed(validate.validate_dataframe, features, feature)
+    _, seconds_pl = _timed(validate_polars.validate_dataframe, features_pl, feature)
+    timings.append(("validate_features", seconds, seconds_pl))
+
+    timings = pd.DataFrame(timings, columns=["step", "pandas", "polars"])
+    timings.insert(0, "dataset", dataset)
+    timings["speedup"] = timings.pandas / timings.polars
+
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    timings = pd.concat(
+        [run(d, args.rows, args.error_rate, args.seed) for d in datasets],
+        ignore_index=True,
+    )
+
+    print(timings.round(3).to_string(index=False))
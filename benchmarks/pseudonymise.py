@@ -0,0 +1,65 @@
+"""Throughput of patient_id pseudonymisation.
+
+Compares the CRC32 mapping previously used in the site notebooks with
+`avoidable_admissions.data.pseudonymise.pseudonymise` on synthetic identifiers.
+
+    python -m benchmarks.pseudonymise --rows 1000000 --distinct 0.3 --n-jobs 4
+
+Using several processes only helps with millions of distinct identifiers
+and more than one CPU.
+"""
+
+import argparse
+import os
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from avoidable_admissions.data.pseudonymise import pseudonymise
+
+
+def patient_ids(rows: int, distinct: float, seed: int = 42) -> pd.Series:
+    # Each patient appears on average 1 / distinct times
+    rng = np.random.default_rng(seed)
+    n_patients = max(1, int(rows * distinct))
+
+    return pd.Series(rng.integers(0, n_patients, rows) + 10**9).astype(str)
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run(rows: int, distinct: float, n_jobs: int) -> pd.DataFrame:
+    ids = patient_ids(rows, distinct)
+    key = "benchmark-key"
+
+    _, t_crc = _timed(
+        lambda s: s.astype(str).map(lambda cid: zlib.crc32(bytes(cid, "utf-8"))), ids
+    )
+    _, t_single = _timed(pseudonymise, ids, key)
+    _, t_multi = _timed(pseudonymise, ids, key, n_jobs=n_jobs)
+
+    return pd.DataFrame(
+        {
+            "method": ["crc32 map", "blake2b", f"blake2b n_jobs={n_jobs}"],
+            "seconds": [t_crc, t_single, t_multi],
+            "rows_per_second": [rows / t for t in (t_crc, t_single, t_multi)],
+        }
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument(
+        "--distinct", type=float, default=0.3, help="Distinct patients per row"
+    )
+    parser.add_argument("--n-jobs", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print(run(args.rows, args.distinct, args.n_jobs).to_string(index=False))
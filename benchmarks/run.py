@@ -0,0 +1,267 @@
+"""Time validation and feature engineering on synthetic extracts of increasing size.
+
+    python -m benchmarks.run --sizes 10000 100000 1000000
+    python -m benchmarks.run --sizes 10000 100000 --compare benchmarks/results/<baseline>.json
+
+Results are saved as JSON in `benchmarks/results/` with the git commit and package
+versions, so that runs before and after a change can be compared.
+10,000,000 rows needs tens of GB of memory for admitted care.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import pandas as pd
+import pandera
+
+import avoidable_admissions
+from avoidable_admissions.data.synthetic import (
+    generate_admitted_care,
+    generate_emergency_care,
+)
+from avoidable_admissions.data.validate import (
+    AdmittedCareEpisodeSchema,
+    AdmittedCareFeatureSchema,
+    EmergencyCareEpisodeSchema,
+    EmergencyCareFeatureSchema,
+    validate_dataframe,
+)
+from avoidable_admissions.features.build_features import (
+    build_admitted_care_features,
+    build_emergency_care_features,
+)
+
+results_dir = os.path.join(os.path.dirname(__file__), "results")
+
+datasets = {
+    "admitted": (
+        generate_admitted_care,
+        AdmittedCareEpisodeSchema,
+        AdmittedCareFeatureSchema,
+        build_admitted_care_features,
+    ),
+    "emergency": (
+        generate_emergency_care,
+        EmergencyCareEpisodeSchema,
+        EmergencyCareFeatureSchema,
+        build_emergency_care_features,
+    ),
+}
+
+
+def _timed(func, *args, **kwargs):
+    # Validation prints a summary of errors which is not needed here
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        return result, time.perf_counter() - start
+
+
+def import_time() -> Optional[float]:
+    """Seconds to import the package in a new interpreter, or None if the import fails.
+
+    This includes downloading the ACSC mappings which happens at import.
+    """
+
+    code = (
+        "import time; start = time.perf_counter(); import avoidable_admissions; "
+        "print(time.perf_counter() - start)"
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True
+    )
+
+    if process.returncode != 0:
+        return None
+
+    return float(process.stdout.strip().splitlines()[-1])
+
+
+def run(
+    sizes: List[int], error_rate: float = 0.01, dataset_names: List[str] = None
+) -> List[dict]:
+    """Time each stage of the pipeline for each dataset and size.
+
+    Args:
+        sizes (List[int]): Numbers of rows
+        error_rate (float, optional): Share of rows that fail validation
+        dataset_names (List[str], optional): `admitted` and/or `emergency`
+
+    Returns:
+        List[dict]: One record per benchmark, dataset and size
+    """
+
+    records = [
+        {"benchmark": "import", "dataset": None, "rows": None, "seconds": import_time()}
+    ]
+
+    for name in dataset_names or list(datasets):
+        generate, episode_schema, feature_schema, build = datasets[name]
+
+        for n in sizes:
+            df, seconds = _timed(generate, n, error_rate=error_rate)
+            records.append(
+                {
+                    "benchmark": "generate",
+                    "dataset": name,
+                    "rows": n,
+                    "seconds": seconds,
+                }
+            )
+
+            (good, _), seconds = _timed(validate_dataframe, df, episode_schema)
+            records.append(
+                {
+                    "benchmark": "validate",
+                    "dataset": name,
+                    "rows": n,
+                    "seconds": seconds,
+                }
+            )
+            del df
+
+            features, seconds = _timed(build, good)
+            records.append(
+                {"benchmark": "build", "dataset": name, "rows": n, "seconds": seconds}
+            )
+
+            _, seconds = _timed(validate_dataframe, features, feature_schema)
+            records.append(
+                {
+                    "benchmark": "validate_features",
+                    "dataset": name,
+                    "rows": n,
+                    "seconds": seconds,
+                }
+            )
+
+            _, seconds = _timed(
+                validate_dataframe,
+                features,
+                feature_schema,
+                validation_token=good.attrs["validation_token"],
+            )
+            records.append(
+                {
+                    "benchmark": "validate_features_delta",
+                    "dataset": name,
+                    "rows": n,
+                    "seconds": seconds,
+                }
+            )
+
+            print(f"{name} {n} rows done", file=sys.stderr)
+
+    for record in records:
+        record["rows_per_second"] = (
+            record["rows"] / record["seconds"]
+            if record["rows"] and record["seconds"]
+            else None
+        )
+
+    return records
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(records: List[dict], path: Optional[str] = None) -> str:
+    """Save results with the environment they were measured in.
+
+    Args:
+        records (List[dict]): Output of `run`
+        path (str, optional): Defaults to `benchmarks/results/<timestamp>-<commit>.json`
+
+    Returns:
+        str: Path of the saved file
+    """
+
+    commit = _git_commit()
+
+    if path is None:
+        os.makedirs(results_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(results_dir, f"{stamp}-{commit or 'unknown'}.json")
+
+    content = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": commit,
+        "avoidable_admissions": avoidable_admissions.__version__,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "pandera": pandera.__version__,
+        "machine": platform.platform(),
+        "results": records,
+    }
+
+    with open(path, "wt") as f:
+        json.dump(content, f, indent=2)
+
+    return path
+
+
+def compare(baseline: str, records: List[dict], threshold: float = 1.2) -> pd.DataFrame:
+    """Compare results with a saved baseline.
+
+    Args:
+        baseline (str): Path of a file saved by `save`
+        records (List[dict]): Output of `run`
+        threshold (float, optional): Ratio of current to baseline time reported as a regression
+
+    Returns:
+        pd.DataFrame: Baseline and current seconds, their ratio and a `regression` flag
+    """
+
+    with open(baseline) as f:
+        before = pd.DataFrame(json.load(f)["results"])
+
+    after = pd.DataFrame(records)
+
+    keys = ["benchmark", "dataset", "rows"]
+    merged = before[keys + ["seconds"]].merge(
+        after[keys + ["seconds"]], on=keys, suffixes=("_baseline", "_current")
+    )
+    merged["ratio"] = merged.seconds_current / merged.seconds_baseline
+    merged["regression"] = merged.ratio > threshold
+
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--datasets", nargs="+", choices=list(datasets))
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--output", help="Path of results file")
+    parser.add_argument("--compare", help="Baseline results file to compare with")
+    args = parser.parse_args()
+
+    records = run(args.sizes, args.error_rate, args.datasets)
+    path = save(records, args.output)
+
+    print(pd.DataFrame(records).to_string(index=False))
+    print("Results saved to", path)
+
+    if args.compare:
+        comparison = compare(args.compare, records)
+        print(comparison.to_string(index=False))
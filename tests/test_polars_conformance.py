@@ -0,0 +1,186 @@
+"""The Polars backend gives the same results as pandas.
+
+Synthetic extracts with invalid values are validated, used to build features and
+validated again with both backends. Rows passing validation, failure cases and
+feature values must be the same.
+
+`test_multiple_refset_releases` runs these tests again in a new process with a
+synthetic second release of the SNOMED CT refsets in `SNOMED_REFSETS_PATH`, in which
+some codes have left their refset, as refset maps are built on import.
+"""
+
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+pl = pytest.importorskip("polars")
+
+from avoidable_admissions.data import (  # noqa: E402
+    nhsdd_snomed,
+    snomed_refsets,
+    validate,
+    validate_polars,
+)
+from avoidable_admissions.data.synthetic import (  # noqa: E402
+    generate_admitted_care,
+    generate_emergency_care,
+)
+from avoidable_admissions.features import (  # noqa: E402
+    build_features,
+    build_features_polars,
+)
+
+rows = 3000
+error_rate = 0.05
+
+datasets = {
+    "admitted": (
+        generate_admitted_care,
+        validate.AdmittedCareEpisodeSchema,
+        validate.AdmittedCareFeatureSchema,
+        build_features.build_admitted_care_features,
+        build_features_polars.build_admitted_care_features,
+    ),
+    "emergency": (
+        generate_emergency_care,
+        validate.EmergencyCareEpisodeSchema,
+        validate.EmergencyCareFeatureSchema,
+        build_features.build_emergency_care_features,
+        build_features_polars.build_emergency_care_features,
+    ),
+}
+
+
+def _failures(bad) -> set:
+    keys = ["column", "check", "index"]
+
+    if isinstance(bad, pl.DataFrame):
+        bad = bad.select(keys).to_pandas()
+
+    if bad.empty:
+        # pandas returns a dataframe without columns if there are no failures
+        return set()
+
+    return set(bad[keys].astype(str).itertuples(index=False, name=None))
+
+
+def _comparable(df: pd.DataFrame) -> pd.DataFrame:
+    # Categorical features are strings in Polars
+    return df.reset_index(drop=True).apply(
+        lambda s: s.astype(object).where(s.notna(), None)
+        if isinstance(s.dtype, pd.CategoricalDtype)
+        else s
+    )
+
+
+def assert_same_validation(pandas_result, polars_result, step: str) -> None:
+    good, bad = pandas_result
+    good_pl, bad_pl = polars_result
+
+    assert (
+        good.visit_id.tolist() == good_pl["visit_id"].to_list()
+    ), f"{step}: different rows passed validation"
+    assert _failures(bad) == _failures(bad_pl), f"{step}: different failure cases"
+
+
+def write_release(
+    directory: str, release_date: str = "20220501", drop_every: int = 3
+) -> str:
+    # RF2 simple refset snapshot of a later release of the bundled refsets, in which
+    # every drop_every-th member of each refset is inactive. The release date is
+    # within the default range of the synthetic data.
+
+    store = snomed_refsets.load_store()
+
+    rf2 = pd.DataFrame(
+        [
+            (getattr(nhsdd_snomed, name)["refset_id"], code, int(i % drop_every != 0))
+            for name in store.refsets
+            for i, code in enumerate(store.members(name, 0).tolist())
+        ],
+        columns=["refsetId", "referencedComponentId", "active"],
+    )
+    rf2.insert(0, "id", range(len(rf2)))
+    rf2.insert(1, "effectiveTime", release_date)
+    rf2.insert(3, "moduleId", 999000011000000103)
+
+    path = os.path.join(
+        directory, f"der2_Refset_SimpleSnapshot_GB1000000_{release_date}.txt"
+    )
+    rf2[
+        [
+            "id",
+            "effectiveTime",
+            "active",
+            "moduleId",
+            "refsetId",
+            "referencedComponentId",
+        ]
+    ].to_csv(path, sep="\t", index=False)
+
+    return path
+
+
+@pytest.fixture(scope="module", params=list(datasets))
+def results(request):
+    # Each step with both backends, shared by the tests of one dataset
+
+    generate, episode, feature, build, build_pl = datasets[request.param]
+
+    df = generate(rows, error_rate=error_rate, seed=0)
+
+    validated = validate.validate_dataframe(df, episode)
+    validated_pl = validate_polars.validate_dataframe(pl.from_pandas(df), episode)
+
+    features = build(validated[0])
+    features_pl = build_pl(validated_pl[0])
+
+    return {
+        "dataset": request.param,
+        "validated": (validated, validated_pl),
+        "features": (features, features_pl),
+        "validated_features": (
+            validate.validate_dataframe(features, feature),
+            validate_polars.validate_dataframe(features_pl, feature),
+        ),
+    }
+
+
+def test_episode_validation(results):
+    assert_same_validation(*results["validated"], f"{results['dataset']} episodes")
+
+
+def test_features(results):
+    features, features_pl = results["features"]
+
+    pd.testing.assert_frame_equal(
+        _comparable(features),
+        features_pl.to_pandas(),
+        check_dtype=False,
+        obj=f"{results['dataset']} features",
+    )
+
+
+def test_feature_validation(results):
+    assert_same_validation(
+        *results["validated_features"], f"{results['dataset']} features"
+    )
+
+
+def test_multiple_refset_releases(tmp_path):
+    if snomed_refsets.load_store().n_releases > 1:
+        pytest.skip("The other tests already run with several refset releases")
+
+    write_release(str(tmp_path))
+
+    result = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", __file__],
+        env={**os.environ, snomed_refsets.releases_env_var: str(tmp_path)},
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stdout[-5000:]